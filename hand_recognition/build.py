@@ -5,7 +5,7 @@ from random import shuffle
 
 import datatypes as dt
 from data_utils import save_data,save_all
-from cardlib import encode,decode,winner,hand_rank,rank
+from cardlib import encode,decode,winner,hand_rank,rank,batch_winners,encode_cards
 from card_utils import to_2d,suits_to_str,convert_numpy_to_rust,convert_numpy_to_2d,to_52_vector,swap_suits
 from create_hands import straight_flushes,quads,full_houses,flushes,straights,trips,two_pairs,one_pairs,high_cards,hero_5_cards,sort_hand
 
@@ -43,23 +43,21 @@ class CardDataset(object):
         """
         Generates X = (i,13,2) y = [-1,0,1]
         """
-        X,y = [],[]
+        X,flat_cards = [],[]
         for i in range(iterations):
             cards = np.random.choice(self.deck,13,replace=False)
-            rust_cards = convert_numpy_to_rust(cards)
-            encoded_cards = [encode(c) for c in rust_cards]
-            hand1 = encoded_cards[:4]
-            hand2 = encoded_cards[4:8]
-            board = encoded_cards[8:]
-            result = winner(hand1,hand2,board)
+            flat_cards.append(cards)
             if encoding == '2d':
                 cards2d = convert_numpy_to_2d(cards)
                 X.append(cards2d)
             else:
                 X.append(cards)
-            y.append(result)
+        # Same rank,suit layout as convert_numpy_to_rust. Encoded in one table lookup, all showdowns in one evaluator call
+        flat_cards = np.stack(flat_cards)
+        encoded = encode_cards(np.stack((flat_cards % 13 + 2,flat_cards // 13 + 1),axis=-1))
+        y = batch_winners(encoded[:,:4],encoded[:,4:8],encoded[:,8:]).astype(np.int64)
         X = np.stack(X)
-        y = np.stack(y)[:,None]
+        y = y[:,None]
         return X,y
 
     def build_10card(self,iterations,encoding):
@@ -71,8 +69,8 @@ class CardDataset(object):
             category = np.random.choice(np.arange(9))
             hand1 = self.create_handtypes(category)
             hand2 = self.create_handtypes(category)
-            encoded_hand1 = [encode(c) for c in hand1]
-            encoded_hand2 = [encode(c) for c in hand2]
+            encoded_hand1 = encode_cards(hand1).tolist()
+            encoded_hand2 = encode_cards(hand2).tolist()
             hand1_rank = rank(encoded_hand1)
             hand2_rank = rank(encoded_hand2)
             if hand1_rank > hand2_rank:
@@ -146,8 +144,8 @@ class CardDataset(object):
         board = np.concatenate([initial_cards[2:],extra_cards_2d[2:]],axis=0)
         assert(False not in [(s[1]  > dt.SUITS.LOW-1 and s[1] < dt.SUITS.HIGH) == True for s in hand]),f'hand outside range {hand}'
         assert(False not in [(s[1]  > dt.SUITS.LOW-1 and s[1] < dt.SUITS.HIGH) == True for s in board]),f'board outside range {board}'
-        en_hand = [encode(c) for c in hand]
-        en_board = [encode(c) for c in board]
+        en_hand = encode_cards(hand).tolist()
+        en_board = encode_cards(board).tolist()
         hand_strength = hand_rank(en_hand,en_board)
         hand_type = CardDataset.find_strength(hand_strength)
         while hand_type != category:
@@ -157,8 +155,8 @@ class CardDataset(object):
             board = np.concatenate([initial_cards[2:],extra_cards_2d[2:]],axis=0)
             assert(False not in [(s[1]  > dt.SUITS.LOW-1 and s[1] < dt.SUITS.HIGH) == True for s in hand]),f'hand outside range {hand}'
             assert(False not in [(s[1]  > dt.SUITS.LOW-1 and s[1] < dt.SUITS.HIGH) == True for s in board]),f'board outside range {board}'
-            en_hand = [encode(c) for c in hand]
-            en_board = [encode(c) for c in board]
+            en_hand = encode_cards(hand).tolist()
+            en_board = encode_cards(board).tolist()
             hand_strength = hand_rank(en_hand,en_board)
             hand_type = CardDataset.find_strength(hand_strength)
         return hand,board,hand_strength
@@ -210,9 +208,9 @@ class CardDataset(object):
                 available_cards = list(set(self.deck) - set(flat_card_vector))
                 flat_vil_hand = np.random.choice(available_cards,4,replace=False)
                 vil_hand = np.array(to_2d(flat_vil_hand))
-                en_hand = [encode(c) for c in hero_hand]
-                en_vil = [encode(c) for c in vil_hand]
-                en_board = [encode(c) for c in board]
+                en_hand = encode_cards(hero_hand).tolist()
+                en_vil = encode_cards(vil_hand).tolist()
+                en_board = encode_cards(board).tolist()
                 result = winner(en_hand,en_vil,en_board)
                 # hand + board at all stages. Shuffle cards so its more difficult for network
                 np.random.shuffle(hero_hand)
@@ -1,4 +1,5 @@
 import ctypes
+import numpy as np
 from os import path
 from sys import platform, argv
 
@@ -24,6 +25,30 @@ def encode(card):
         suitnum = {'s': 1, 'h': 2,'d': 3,'c': 4}.get(card[1], 0)
     return lib.encode(ctypes.c_byte(card[0] - 2), ctypes.c_byte(suitnum - 1))
 
+# [rank,suit] -> cactus kev encoding, built once from rusteval's DECK table. Suits 1-4 in the same
+# order as encode (s,h,d,c). Suit 0 gets the suit bit below spades like encode gives it.
+# Rank 0 stays 0 so zero padded cards encode to 0
+def build_encoding_table():
+    deck = np.empty(52,dtype=np.dtype(ctypes.c_long))
+    lib.deck_table(pointer(deck))
+    table = np.zeros((15,5),dtype=np.int64)
+    table[((deck >> 8) & 0xF) + 2,SUIT_NUMBERS[(deck >> 12) & 0xF]] = deck
+    table[2:,0] = (table[2:,1] & ~0xF000) | 0x800
+    return table
+
+# (encoded >> 12) & 0xF -> suit 1-4
+SUIT_NUMBERS = np.array([0,1,2,0,3,0,0,0,4])
+
+# vectorized encode: (...,2) array of numeric [rank,suit] -> (...) array of encoded cards
+def encode_cards(cards):
+    cards = np.asarray(cards,dtype=np.int64)
+    return ENCODING_TABLE[cards[...,0],cards[...,1]]
+
+# vectorized decode: (...) array of encoded cards -> (...,2) array of numeric [rank,suit]
+def decode_cards(encoded):
+    encoded = np.asarray(encoded,dtype=np.int64)
+    return np.stack((((encoded >> 8) & 0xF) + 2,SUIT_NUMBERS[(encoded >> 12) & 0xF]),axis=-1)
+
 # takes a cactus kev encoded card and returns a list like [2,'s']
 def decode(encoded):
     rank = ((encoded >> 8) & 0xF) + 2
@@ -46,10 +71,48 @@ def hand_rank(hand, board):
 
 def holdem_hand_rank(hand, board):
     return lib.holdem_hand_with_board_rank(long_array(hand), long_array(board))
+# Batched versions: take (N,4) or (N,2) hands and (N,5) boards of encoded cards as numpy arrays (any integer dtype)
+# and cross into rust once. Return (N,) int32 arrays
+def batch_hand_ranks(hands, boards):
+    hands,boards = long_buffer(hands,4),long_buffer(boards,5)
+    ranks = np.empty(len(hands),dtype=np.int32)
+    lib.hand_board_ranks(pointer(hands), pointer(boards), len(hands), pointer(ranks, ctypes.c_int))
+    return ranks
+
+def batch_holdem_hand_ranks(hands, boards):
+    hands,boards = long_buffer(hands,2),long_buffer(boards,5)
+    ranks = np.empty(len(hands),dtype=np.int32)
+    lib.holdem_hand_board_ranks(pointer(hands), pointer(boards), len(hands), pointer(ranks, ctypes.c_int))
+    return ranks
+
+# 1 for hands1 wins, -1 for hands2 wins, 0 for tie on every row
+def batch_winners(hands1, hands2, boards):
+    hands1,hands2,boards = long_buffer(hands1,4),long_buffer(hands2,4),long_buffer(boards,5)
+    results = np.empty(len(hands1),dtype=np.int32)
+    lib.winners(pointer(hands1), pointer(hands2), pointer(boards), len(hands1), pointer(results, ctypes.c_int))
+    return results
+
+def batch_holdem_winners(hands1, hands2, boards):
+    hands1,hands2,boards = long_buffer(hands1,2),long_buffer(hands2,2),long_buffer(boards,5)
+    results = np.empty(len(hands1),dtype=np.int32)
+    lib.holdem_winners(pointer(hands1), pointer(hands2), pointer(boards), len(hands1), pointer(results, ctypes.c_int))
+    return results
+
+# contiguous (N,width) c_long copy of arr, no copy if it already is one
+def long_buffer(arr, width):
+    arr = np.ascontiguousarray(arr, dtype=np.dtype(ctypes.c_long))
+    assert arr.ndim == 2 and arr.shape[1] == width, f'expected (N,{width}) cards, got {arr.shape}'
+    return arr
+
+def pointer(arr, ctype=ctypes.c_long):
+    return arr.ctypes.data_as(ctypes.POINTER(ctype))
+
 # for converting an array to a c array for passing to rust
 def long_array(arr):
     return (ctypes.c_long * len(arr))(*arr)
 
+ENCODING_TABLE = build_encoding_table()
+
 def rank(hand):
     return lib.rank(*hand)
 
@@ -1,15 +1,130 @@
+import os
+import queue
+import atexit
+import threading
+import time
 from pymongo import MongoClient
 import numpy as np
 import torch
 import datatypes as pdt
 
+"""
+Shared Mongo persistence. Each process holds one pooled client (mongo_client) and one BufferedWriter per
+collection (collection_writer), writers batch documents into insert_many calls from a background thread.
+"""
+
+_client = None
+_client_pid = None
+_writers = {}
+_lock = threading.Lock()
+
+def mongo_client():
+    """The pooled client of this process, a forked child gets its own"""
+    global _client,_client_pid
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient('localhost', 27017,maxPoolSize=10000)
+            _client_pid = os.getpid()
+            _writers.clear()
+        return _client
+
+def collection_writer(db_name:str,collection:str):
+    """The BufferedWriter of db_name[collection] in this process"""
+    client = mongo_client()
+    with _lock:
+        if (db_name,collection) not in _writers:
+            _writers[(db_name,collection)] = BufferedWriter(client[db_name][collection])
+        return _writers[(db_name,collection)]
+
+_FLUSH = object()
+_CLOSE = object()
+
+class BufferedWriter(object):
+    """
+    Write behind buffer of a collection. A daemon thread inserts documents with insert_many(ordered=False)
+    once max_batch are buffered, flush_interval seconds after the first one or on flush. put blocks while
+    max_queue documents are waiting. flush returns once everything put before it is written and raises the
+    first insert error since the last flush. Closed (flushed) at exit.
+    """
+    def __init__(self,collection,max_batch=1000,flush_interval=1.,max_queue=50000):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(max_queue)
+        self.error = None
+        self.closed = False
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self.run,daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self,document:dict):
+        if self.closed:
+            raise ValueError('BufferedWriter is closed')
+        self.queue.put(document)
+
+    def flush(self):
+        if self.closed:
+            # close() already wrote everything and the thread is gone
+            return
+        self.queue.put(_FLUSH)
+        self.queue.join()
+        self.raise_error()
+
+    def close(self):
+        if self.closed or self.pid != os.getpid():
+            return
+        self.closed = True
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            error,self.error = self.error,None
+            raise error
+
+    def run(self):
+        batch = []
+        deadline = None
+        while True:
+            try:
+                item = self.queue.get(timeout=None if deadline is None else max(deadline - time.monotonic(),0))
+            except queue.Empty:
+                # flush_interval passed since the first buffered document
+                item = None
+            if item is not None and item is not _FLUSH and item is not _CLOSE:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.max_batch:
+                    continue
+            self.write(batch)
+            batch,deadline = [],None
+            if item is _FLUSH or item is _CLOSE:
+                self.queue.task_done()
+            if item is _CLOSE:
+                return
+
+    def write(self,batch):
+        try:
+            if batch:
+                self.collection.insert_many(batch,ordered=False)
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
 class MongoDB(object):
     def __init__(self):
         self.connect()
 
     def connect(self):
-        self.client = MongoClient('localhost', 27017,maxPoolSize=10000)
+        self.client = mongo_client()
         self.db = self.client['poker']
+        self.writer = collection_writer('poker','game_data')
 
     def store_data(self,training_data:dict,mapping:dict,training_round:int,gametype,id:int,epochs:int):
         if gametype == pdt.GameTypes.COMPLEXKUHN or gametype == pdt.GameTypes.KUHN or gametype == pdt.GameTypes.BETSIZEKUHN or gametype == pdt.GameTypes.HISTORICALKUHN:
@@ -88,10 +203,11 @@ class MongoDB(object):
                             state_json['value'] = values[step][index,actions[step]].detach().tolist()
                         else:
                             state_json['value'] = float(values[step].detach())
-                    self.db['game_data'].insert_one(state_json)
+                    self.writer.put(state_json)
 
     def get_data(self,query:dict,projection:dict):
         # print(f'query {query}, projection {projection}')
+        self.writer.flush()
         data = self.db['game_data'].find(query,projection)
         return data
 
@@ -282,9 +398,11 @@ class MongoDB(object):
         return list(data)[0]['game']
 
     def close(self):
-        self.client.close()
+        """Flushes pending writes, the client is shared by the process and stays open"""
+        self.writer.flush()
 
     def clean_db(self):
+        self.writer.flush()
         self.db['game_data'].delete_many({})
 
     def clear_collection(self,collection):
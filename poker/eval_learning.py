@@ -3,12 +3,11 @@ import torch.nn.functional as F
 import torch
 import torch.autograd.profiler as profiler
 import os
-from pymongo import MongoClient
 import numpy as np
 import sys
 import time
 
-from db import MongoDB
+from db import MongoDB,mongo_client
 from poker_env.config import Config
 import poker_env.datatypes as pdt
 from poker_env.env import Poker
@@ -24,8 +23,7 @@ def eval_batch_critic(critic,target_critic,params):
     actor_optimizer = params['actor_optimizer']
     query = {'training_round':params['training_round']}
     projection = {'state':1,'obs':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
+    db = mongo_client()['poker']
     data = db['game_data'].find(query,projection)
     trainloader = return_trajectoryloader(data)
     for i in range(params['learning_rounds']):
@@ -45,8 +43,7 @@ def eval_batch_critic(critic,target_critic,params):
 def eval_batch_actor(actor,target_actor,target_critic,params):
     query = {'training_round':0}
     projection = {'obs':1,'state':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
+    db = mongo_client()['poker']
     data = db['game_data'].find(query,projection)
     trainloader = return_trajectoryloader(data)
     for i in range(params['learning_rounds']):
@@ -65,8 +62,7 @@ def eval_batch_actor_critic(actor,critic,target_actor,target_critic,params):
     actor_optimizer = params['actor_optimizer']
     query = {'training_round':params['training_round']}
     projection = {'state':1,'obs':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
+    db = mongo_client()['poker']
     data = db['game_data'].find(query,projection)
     trainloader = return_trajectoryloader(data)
     print(f'Num Samples {len(trainloader)}')
@@ -87,8 +83,7 @@ def eval_batch_actor_critic(actor,critic,target_actor,target_critic,params):
 def eval_critic(critic,params):
     query = {'training_round':0}
     projection = {'obs':1,'state':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
+    db = mongo_client()['poker']
     data = list(db['game_data'].find(query,projection))
     print(f'Number of data points {len(data)}')
     for i in range(params['learning_rounds']):
@@ -107,8 +102,7 @@ def eval_critic(critic,params):
 def eval_actor(actor,target_actor,target_critic,params):
     query = {'training_round':0}
     projection = {'obs':1,'state':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
+    db = mongo_client()['poker']
     data = list(db['game_data'].find(query,projection))
     print(f'Number of data points {len(data)}')
     for i in range(params['learning_rounds']):
@@ -129,8 +123,7 @@ def eval_network_updates(actor,critic,target_actor,target_critic,params):
     device = params['device']
     query = {'training_round':0}
     projection = {'obs':1,'state':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
+    db = mongo_client()['poker']
     data = list(db['game_data'].find(query,projection))
     print(f'Number of data points {len(data)}')
     for i in range(params['learning_rounds']):
@@ -151,8 +144,7 @@ def eval_network_updates(actor,critic,target_actor,target_critic,params):
 def eval_combined_updates(model,params):
     query = {'training_round':0}
     projection = {'state':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
+    db = mongo_client()['poker']
     data = list(db['game_data'].find(query,projection))
     print(f'Number of data points {len(data)}')
     for i in range(params['learning_rounds']):
@@ -10,7 +10,7 @@ from train import train_combined,train_dual,train_batch,generate_trajectories,du
 from poker_env.config import Config
 import poker_env.datatypes as pdt
 from poker_env.env import Poker
-from db import MongoDB
+from trajectory_store import return_store
 from models.network_config import NetworkConfig,CriticType
 from models.networks import OmahaActor,OmahaQCritic,OmahaObsQCritic,CombinedNet
 from models.model_utils import copy_weights,hard_update,expand_conv2d
@@ -83,16 +83,39 @@ if __name__ == "__main__":
                         default=None,
                         type=str,
                         help='path to critic')
+    parser.add_argument('--expected',
+                        dest='expected',
+                        action='store_true',
+                        help='Pay allin showdowns by equity instead of a single runout')
+    parser.add_argument('--async-env',
+                        dest='async_env',
+                        action='store_true',
+                        help='Step the training hands in a worker process (AsyncPoker), no expected payoff')
     parser.add_argument('--koth',
                         dest='koth',
                         action='store_true',
                         help='Train by King of the hill')
+    parser.add_argument('--store',
+                        dest='store',
+                        default='mongo',
+                        metavar="['mongo','npy']",
+                        type=str,
+                        help='Trajectory store, mongo or sharded npy files under --store-path')
+    parser.add_argument('--store-path',
+                        dest='store_path',
+                        default='trajectories',
+                        type=str,
+                        help='Directory of the npy trajectory store')
     parser.set_defaults(koth=False)
+    parser.set_defaults(expected=False)
+    parser.set_defaults(async_env=False)
     parser.set_defaults(single=False)
     parser.set_defaults(resume=False)
     parser.set_defaults(frozen=True)
 
     args = parser.parse_args()
+    if args.async_env and args.expected:
+        parser.error('--expected is not supported with --async-env')
 
     cuda_dict = {0:'cuda:0',1:'cuda:1'}
 
@@ -116,7 +139,8 @@ if __name__ == "__main__":
         'global_mapping':config.global_mapping,
         'state_mapping':config.state_mapping,
         'obs_mapping':config.obs_mapping,
-        'shuffle':True
+        'shuffle':True,
+        'expected_payoff':args.expected
     }
     print(f'Environment Parameters: Starting street: {env_params["starting_street"]},\
         Stacksize: {env_params["stacksize"]},\
@@ -145,7 +169,12 @@ if __name__ == "__main__":
         'save_dir':os.path.join(os.getcwd(),'checkpoints/training_run'),
         'actor_path':config.agent_params['actor_path'],
         'critic_path':config.agent_params['critic_path'],
-        'baseline_path':config.baseline_path
+        'baseline_path':config.baseline_path,
+        'seed':seed,
+        'store':args.store,
+        'store_path':args.store_path,
+        'async_env':args.async_env,
+        'env_params':env_params
     }
     learning_params = {
         'training_round':0,
@@ -155,7 +184,9 @@ if __name__ == "__main__":
         'gpu1':gpu1,
         'gpu2':gpu2,
         'min_reward':-env_params['stacksize'],
-        'max_reward':env_params['pot']+env_params['stacksize']
+        'max_reward':env_params['pot']+env_params['stacksize'],
+        'store':args.store,
+        'store_path':args.store_path
     }
     validation_params = {
         'epochs':5000,
@@ -168,10 +199,10 @@ if __name__ == "__main__":
     # Clean training_run folder
     clean_folder(training_params['actor_path'])
     clean_folder(training_params['critic_path'])
-    # Clean mongo
-    mongo = MongoDB()
-    mongo.clean_db()
-    mongo.close()
+    # Clean trajectory store
+    store = return_store(training_params)
+    store.clean_db()
+    store.close()
     # Set processes
     mp.set_start_method('spawn')
     num_processes = min(mp.cpu_count(),6)
@@ -4,6 +4,7 @@ import torch.nn.functional as F
 from poker_env.datatypes import Globals,SUITS,RANKS,Action,Street,NetworkActions
 import numpy as np
 from models.model_utils import strip_padding,unspool,hardcode_handstrength
+from utils.cardlib import rank_tables
 from hashlib import md5
 
 class IdentityBlock(nn.Module):
@@ -106,9 +107,74 @@ class NetworkFunctions(object):
 #              Processing Layers               #
 ################################################
 
+class HandStrength(nn.Module):
+    """
+    Exact hand strength with rusteval's rank tables as buffers, no learned parameters.
+    Ranks all 60 unspool combinations of (B,M,18) hand + board rows with tensor gathers, the same lookups as
+    rusteval's rank(): FLUSHES when all suits match, UNIQUE5 for five distinct ranks, otherwise the rank of
+    the prime product. Combinations with padding (board not out yet) get NO_HAND.
+    """
+    NO_HAND = 7463
+    # Last rank of straight flush, quads, full house, flush, straight, trips, two pair, pair, high card
+    CLASS_BOUNDARIES = (10,166,322,1599,1609,2467,3325,6185,7462)
+    N_CLASSES = len(CLASS_BOUNDARIES)
+
+    def __init__(self):
+        super().__init__()
+        tables = rank_tables()
+        primes = [2,3,5,7,11,13,17,19,23,29,31,37,41]
+        # Indexed by rank 0-14, rank 0 is padding
+        self.register_buffer('rank_bits',torch.tensor([0,0] + [1 << i for i in range(13)]))
+        self.register_buffer('primes',torch.tensor([0,0] + primes))
+        self.register_buffer('flushes',torch.from_numpy(tables['flushes'].astype(np.int64)))
+        self.register_buffer('unique5',torch.from_numpy(tables['unique5'].astype(np.int64)))
+        self.register_buffer('products',torch.from_numpy(tables['products'].astype(np.int64)))
+        self.register_buffer('product_ranks',torch.from_numpy(tables['product_ranks'].astype(np.int64)))
+        self.register_buffer('class_boundaries',torch.tensor(self.CLASS_BOUNDARIES))
+
+    def forward(self,x):
+        """x: (B,M,18) alternating rank and suit. Returns best rank (B,M,1) and one hot hand class (B,M,9)"""
+        ranks,suits = unspool(x.long())
+        return self.strength(ranks,suits)
+
+    def strength(self,ranks,suits):
+        """(B,M,60,5) unspooled ranks and suits -> best rank (B,M,1), one hot hand class (B,M,9), all zero for NO_HAND"""
+        best = self.combination_ranks(ranks,suits).min(-1)[0]
+        hand_class = F.one_hot((best.unsqueeze(-1) > self.class_boundaries).sum(-1),self.N_CLASSES + 1)[...,:-1]
+        return best.unsqueeze(-1).float(),hand_class.float()
+
+    def combination_ranks(self,ranks,suits):
+        """(...,5) ranks and suits -> (...) ranks, 1 is a royal flush"""
+        ranks = ranks.long().to(self.flushes.device)
+        suits = suits.long().to(self.flushes.device)
+        bits = self.rank_bits[ranks]
+        index = bits[...,0] | bits[...,1] | bits[...,2] | bits[...,3] | bits[...,4]
+        flush = (suits == suits[...,:1]).all(-1)
+        unique = self.unique5[index]
+        position = self.product_position(self.primes[ranks].prod(-1))
+        result = torch.where(flush,self.flushes[index],torch.where(unique > 0,unique,self.product_ranks[position]))
+        return torch.where((ranks > 0).all(-1),result,torch.full_like(result,self.NO_HAND))
+
+    def product_position(self,products):
+        """Index of each prime product in the sorted products table, a branchless binary search (no torch.searchsorted before 1.6)"""
+        n = self.products.numel()
+        position = torch.zeros_like(products)
+        step = 1 << (n - 1).bit_length()
+        while step:
+            probe = (position + step).clamp(max=n - 1)
+            position = torch.where(self.products[probe] <= products,probe,position)
+            step >>= 1
+        return position
+
 class ProcessHandBoard(nn.Module):
     def __init__(self,params,hand_length,hidden_dims=(16,32,32),output_dims=(15360,512,127),activation_fc=F.relu):
         super().__init__()
+        # Exact rank and hand class from HandStrength instead of the learned categorical rank, same output width.
+        # Runs on the model's device as part of the forward pass, on CPU it is 15-30x slower than the rusteval FFI
+        self.exact_handstrength = params.get('exact_handstrength',False)
+        if self.exact_handstrength:
+            self.hand_strength = HandStrength()
+            output_dims = output_dims[:-1] + (output_dims[-1] - HandStrength.N_CLASSES,)
         self.output_dims = output_dims
         self.activation_fc = activation_fc
         self.hidden_dims = hidden_dims
@@ -131,7 +197,8 @@ class ProcessHandBoard(nn.Module):
         self.hidden_layers = nn.ModuleList()
         for i in range(len(self.hidden_dims)-1):
             self.hidden_layers.append(nn.Linear(self.hidden_dims[i],self.hidden_dims[i+1]))
-        self.categorical_output = nn.Linear(512,7463)
+        if not self.exact_handstrength:
+            self.categorical_output = nn.Linear(512,7463)
         self.output_layers = nn.ModuleList()
         for i in range(len(self.output_dims)-1):
             self.output_layers.append(nn.Linear(self.output_dims[i],self.output_dims[i+1]))
@@ -160,16 +227,23 @@ class ProcessHandBoard(nn.Module):
                 r = self.rank_conv(hot_ranks[i,j,:,:,:])
                 out = torch.cat((r,s),dim=-1)
                 raw_combinations.append(out)
+                if self.exact_handstrength:
+                    continue
                 # out: (b,64,16)
                 for hidden_layer in self.hidden_layers:
                     out = self.activation_fc(hidden_layer(out))
                 out = self.categorical_output(out.view(60,-1))
                 combinations.append(torch.argmax(out,dim=-1))
-            activations.append(torch.stack(combinations))
+            if not self.exact_handstrength:
+                activations.append(torch.stack(combinations))
             raw_activations.append(torch.stack(raw_combinations))
         # baseline = hardcode_handstrength(x)
-        results = torch.stack(activations)
-        best_hand = torch.min(results,dim=-1)[0].unsqueeze(-1)
+        if self.exact_handstrength:
+            best_hand,hand_class = self.hand_strength.strength(ranks,suits)
+            best_hand = torch.cat((best_hand,hand_class),dim=-1).to(self.device)
+        else:
+            results = torch.stack(activations)
+            best_hand = torch.min(results,dim=-1)[0].unsqueeze(-1)
         # print(best_hand)
         # print(baseline)
         raw_results = torch.stack(raw_activations).view(B,M,-1)
@@ -2,7 +2,8 @@ import torch, os
 import numpy as np
 from prettytable import PrettyTable
 from itertools import combinations
-from utils.cardlib import hand_rank,encode
+from utils.cardlib import batch_hand_ranks,encode_cards
+from utils.suit_isomorphism import relabel_suits
 
 def count_parameters(model):
     table = PrettyTable(["Modules", "Parameters"])
@@ -112,40 +113,27 @@ def soft_update(local,target,device,tau=1e-1):
 
 UNSPOOL_INDEX = np.array([h + b for h in combinations(range(0,4), 2) for b in combinations(range(4,9), 3)])
 
-def hardcode_handstrength(x):
-    """input shape: (b,m,18)"""
+def hardcode_handstrength(x,cache=None):
+    """
+    input shape: (b,m,18). cache: optional RankCache the ranks go through. Off by default, canonical keys
+    cost more than evaluating a batch directly
+    """
     B,M,C = x.size()
-    hands = x[:,:,:8]
-    boards = x[:,:,8:]
-    ranks = []
-    for j in range(B):
-        for i in range(M):
-            hand = [[int(hands[j,i,c]),int(hands[j,i,c+1])] for c in range(0,len(hands[j,i,:]),2)]
-            board = [[int(boards[j,i,c]),int(boards[j,i,c+1])] for c in range(0,len(boards[j,i,:]),2)]
-            hand_en = [encode(c) for c in hand]
-            board_en = [encode(c) for c in board]
-            ranks.append(torch.tensor(hand_rank(hand_en,board_en),dtype=torch.float))
-    return torch.stack(ranks).view(B,M,1)
+    cards = x.detach().cpu().long().view(B*M,9,2).numpy()
+    if cache is not None:
+        ranks = cache.ranks(cards[:,:4],cards[:,4:])
+    else:
+        en_cards = encode_cards(cards)
+        ranks = batch_hand_ranks(en_cards[:,:4],en_cards[:,4:])
+    return torch.from_numpy(ranks).float().view(B,M,1)
 
 def swap_suit_vector(cards):
     """Takes flat suit vector"""
-    cards_need_swap = cards
-    new_suit = 5
-    while cards_need_swap.shape[0] > 0:
-        suit = cards_need_swap[0]
-        cards[cards[:] == suit] = new_suit
-        new_suit += 1
-        cards_need_swap = cards[cards[:] < 5]
-    cards -= 4
-    return cards
+    return relabel_suits(cards)
 
 def swap_batch_suits(suit_vector):
-    batch,seq,c,p = suit_vector.size()
-    for b in range(batch):
-        for s in range(seq):
-            for i in range(60):
-                suit_vector[b,s,i,:] = swap_suit_vector(suit_vector[b,s,i,:])
-    return suit_vector
+    """(b,m,60,5) suits, relabeled per combination"""
+    return relabel_suits(suit_vector)
 
 def unspool(X):
     """
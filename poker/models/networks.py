@@ -333,11 +333,10 @@ class OmahaActor(Network):
         """
         state: B,M,39
         """
-        x = state
-        if not isinstance(x,torch.Tensor):
-            x = torch.tensor(x,dtype=torch.float32).to(self.device)
-            action_mask = torch.tensor(action_mask,dtype=torch.float).to(self.device)
-            betsize_mask = torch.tensor(betsize_mask,dtype=torch.float).to(self.device)
+        # as_tensor wraps float32 numpy state without copying
+        x = torch.as_tensor(state,dtype=torch.float32,device=self.device)
+        action_mask = torch.as_tensor(action_mask,dtype=torch.float,device=self.device)
+        betsize_mask = torch.as_tensor(betsize_mask,dtype=torch.float,device=self.device)
         mask = combined_masks(action_mask,betsize_mask)
         out = self.process_input(x)
         B,M,c = out.size()
@@ -446,9 +445,7 @@ class OmahaObsQCritic(Network):
         self.advantage_output = nn.Linear(params['transformer_out'],self.combined_output)
 
     def forward(self,obs):
-        x = obs
-        if not isinstance(x,torch.Tensor):
-            x = torch.tensor(x,dtype=torch.float32)#.to(self.device)
+        x = torch.as_tensor(obs,dtype=torch.float32)
         out = self.process_input(x)
         # context = self.attention(out)
         q_input = self.transformer(out)
@@ -487,9 +484,9 @@ class CombinedNet(Network):
         self.advantage_output = nn.Linear(params['transformer_out'],self.combined_output)
 
     def forward(self,state,action_mask,betsize_mask):
-        x = torch.tensor(state,dtype=torch.float32).to(self.device)
-        action_mask = torch.tensor(action_mask,dtype=torch.float).to(self.device)
-        betsize_mask = torch.tensor(betsize_mask,dtype=torch.float).to(self.device)
+        x = torch.as_tensor(state,dtype=torch.float32,device=self.device)
+        action_mask = torch.as_tensor(action_mask,dtype=torch.float,device=self.device)
+        betsize_mask = torch.as_tensor(betsize_mask,dtype=torch.float,device=self.device)
         mask = combined_masks(action_mask,betsize_mask)
         out = self.process_input(x)
         # Actor
@@ -0,0 +1,259 @@
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import poker_env.datatypes as pdt
+from poker_env.vector_env import VectorPoker
+from poker_env.data_classes import derive_seed
+
+"""
+VectorPoker split over worker processes. Each worker owns a contiguous slice of the envs and writes its outputs
+into multiprocessing.shared_memory arrays, only short commands go through the pipes.
+Same reset/step contract as VectorPoker. Returned arrays are views of the shared buffers and are overwritten
+on the next step.
+
+AsyncPoker puts the single hand Poker reset/step contract on top, so single env callers (generate_trajectories,
+tournament) run on it unchanged.
+"""
+
+RESET = 'reset'
+STEP = 'step'
+CLOSE = 'close'
+
+def buffer_specs(env,n_envs):
+    """name -> (shape,dtype) of every shared array"""
+    dtype = env.dtype
+    specs = {
+        'state':((n_envs,env.maxlen,env.state_space),dtype),
+        'action_mask':((n_envs,env.action_space),np.float64),
+        'betsize_mask':((n_envs,env.betsize_space),np.float64),
+        'done':((n_envs,),np.bool_),
+        'rewards':((n_envs,env.n_players),np.float64),
+        'current_player':((n_envs,),np.int64),
+        'rows':((n_envs,),np.int64),
+        'action_category':((n_envs,),np.int64),
+        'betsize':((n_envs,),np.int64)
+    }
+    if env.build_obs:
+        specs['obs'] = ((n_envs,env.maxlen,env.observation_space),dtype)
+    return specs
+
+def attach(names,specs):
+    """Returns the shared memory blocks and numpy views for names"""
+    blocks = {}
+    arrays = {}
+    for key,(shape,dtype) in specs.items():
+        # Workers share the parent's resource tracker under every start method, attaching registers the block
+        # again (a no-op there) and the parent's unlink unregisters it, so the parent alone owns the blocks
+        block = shared_memory.SharedMemory(name=names[key])
+        blocks[key] = block
+        arrays[key] = np.ndarray(shape,dtype=dtype,buffer=block.buf)
+    return blocks,arrays
+
+def worker(params,start,end,worker_id,names,specs,pipe):
+    blocks,arrays = attach(names,specs)
+    env = VectorPoker(params,end - start)
+    env.seed(derive_seed(params.get('seed'),worker_id))
+    try:
+        while True:
+            command = pipe.recv()
+            if command == CLOSE:
+                break
+            if command == RESET:
+                outputs = env.reset()
+            else:
+                outputs = env.step({'action_category':arrays['action_category'][start:end],'betsize':arrays['betsize'][start:end]})
+            state,obs,done,action_mask,betsize_mask = outputs
+            arrays['state'][start:end] = state
+            if obs is not None:
+                arrays['obs'][start:end] = obs
+            arrays['done'][start:end] = done
+            arrays['action_mask'][start:end] = action_mask
+            arrays['betsize_mask'][start:end] = betsize_mask
+            arrays['rewards'][start:end] = env.player_rewards()
+            arrays['current_player'][start:end] = env.current_player
+            arrays['rows'][start:end] = np.minimum(env.history_length,env.maxlen)
+            pipe.send(True)
+    finally:
+        del arrays
+        for block in blocks.values():
+            block.close()
+        pipe.close()
+
+class AsyncVectorPoker(object):
+    def __init__(self,params,n_envs,n_workers,context=None):
+        """
+        Runs n_envs hands in n_workers processes. params are the VectorPoker params.
+        context: multiprocessing start method, defaults to the platform default
+        """
+        assert n_workers >= 1 and n_envs >= n_workers
+        self.n_envs = n_envs
+        self.n_workers = n_workers
+        # Single env instance for the space sizes
+        self.dummy = VectorPoker(params,1)
+        self.specs = buffer_specs(self.dummy,n_envs)
+        self.blocks = {}
+        self.arrays = {}
+        for key,(shape,dtype) in self.specs.items():
+            block = shared_memory.SharedMemory(create=True,size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize,1))
+            self.blocks[key] = block
+            self.arrays[key] = np.ndarray(shape,dtype=dtype,buffer=block.buf)
+        names = {key:block.name for key,block in self.blocks.items()}
+        ctx = mp.get_context(context)
+        bounds = np.linspace(0,n_envs,n_workers + 1).astype(int)
+        self.pipes = []
+        self.processes = []
+        for worker_id in range(n_workers):
+            parent_pipe,child_pipe = ctx.Pipe()
+            process = ctx.Process(target=worker,args=(params,bounds[worker_id],bounds[worker_id + 1],worker_id,names,self.specs,child_pipe),daemon=True)
+            process.start()
+            child_pipe.close()
+            self.pipes.append(parent_pipe)
+            self.processes.append(process)
+        self.closed = False
+
+    def send(self,command):
+        for pipe in self.pipes:
+            pipe.send(command)
+
+    def wait(self):
+        """Blocks until every worker is done, returns state,obs,done,action_mask,betsize_mask"""
+        for pipe in self.pipes:
+            pipe.recv()
+        arrays = self.arrays
+        return arrays['state'],arrays.get('obs'),arrays['done'],arrays['action_mask'],arrays['betsize_mask']
+
+    def reset(self):
+        self.send(RESET)
+        return self.wait()
+
+    def step_async(self,inputs):
+        self.arrays['action_category'][:] = np.asarray(inputs['action_category']).reshape(self.n_envs)
+        self.arrays['betsize'][:] = np.asarray(inputs['betsize']).reshape(self.n_envs)
+        self.send(STEP)
+
+    def step_wait(self):
+        return self.wait()
+
+    def step(self,inputs):
+        """Same contract as VectorPoker.step"""
+        self.step_async(inputs)
+        return self.step_wait()
+
+    def player_rewards(self):
+        """Rewards of the hands that finished on the last step, (N,n_players). Zero for unfinished hands"""
+        return self.arrays['rewards']
+
+    @property
+    def current_player(self):
+        return self.arrays['current_player']
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for pipe in self.pipes:
+            try:
+                pipe.send(CLOSE)
+            except (BrokenPipeError,OSError):
+                pass
+        for process in self.processes:
+            process.join()
+        self.arrays = {}
+        for block in self.blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # Arrays returned by step are still referenced, the mapping goes away with them
+                pass
+            block.unlink()
+
+    def __del__(self):
+        if hasattr(self,'closed'):
+            self.close()
+
+    @property
+    def action_space(self):
+        return self.dummy.action_space
+
+    @property
+    def state_space(self):
+        return self.dummy.state_space
+
+    @property
+    def betsize_space(self):
+        return self.dummy.betsize_space
+
+    @property
+    def observation_space(self):
+        return self.dummy.observation_space
+
+class AsyncPoker(object):
+    def __init__(self,params,context=None):
+        """
+        Poker's reset/step contract over one hand of AsyncVectorPoker, the env steps in a worker process.
+        States are trimmed to the hand's history rows like Poker's and every returned array is a copy.
+        Finished hands are dealt again by the worker, reset() after a finished hand returns that deal.
+        Only one hand is in flight, for throughput step AsyncVectorPoker directly with a batched actor.
+        """
+        self.env = AsyncVectorPoker(params,1,1,context)
+        self.state_mapping = params['state_mapping']
+        self.obs_mapping = params['obs_mapping']
+        self.expected_payoff = False
+        self.outputs = None
+        self.rewards = None
+
+    def single(self,outputs):
+        """state,obs,done,action_mask,betsize_mask of the hand, states trimmed to its rows"""
+        state,obs,done,action_mask,betsize_mask = outputs
+        rows = int(self.env.arrays['rows'][0])
+        self.obs = obs[:1,-rows:].copy() if obs is not None else None
+        return state[:1,-rows:].copy(),self.obs,bool(done[0]),action_mask[0].copy(),betsize_mask[0].copy()
+
+    def reset(self):
+        if self.outputs is None or not self.outputs[2]:
+            self.outputs = self.single(self.env.reset())
+        self.rewards = None
+        state,obs,done,action_mask,betsize_mask = self.outputs
+        # The worker dealt the next hand when the last one finished
+        self.outputs = state,obs,False,action_mask,betsize_mask
+        return self.outputs
+
+    def step(self,inputs):
+        """inputs: dict with the action_category and betsize of the player to act"""
+        outputs = self.env.step({'action_category':np.asarray(inputs['action_category']).reshape(1),'betsize':np.asarray(inputs['betsize']).reshape(1)})
+        self.outputs = self.single(outputs)
+        if self.outputs[2]:
+            self.rewards = self.env.player_rewards()[0].copy()
+        return self.outputs
+
+    def observation(self):
+        return self.obs
+
+    def player_rewards(self,expected=False):
+        """Rewards of the last finished hand by position"""
+        assert not expected,'Expected payoff is disabled'
+        rewards = self.rewards if self.rewards is not None else np.zeros(self.env.dummy.n_players)
+        return {position:rewards[i] for i,position in enumerate(pdt.Globals.PLAYERS_POSITIONS_DICT[self.env.dummy.n_players])}
+
+    @property
+    def current_player(self):
+        return pdt.Globals.POSITION_INDEX[int(self.env.current_player[0])]
+
+    def close(self):
+        self.env.close()
+
+    @property
+    def action_space(self):
+        return self.env.action_space
+
+    @property
+    def state_space(self):
+        return self.env.state_space
+
+    @property
+    def betsize_space(self):
+        return self.env.betsize_space
+
+    @property
+    def observation_space(self):
+        return self.env.observation_space
@@ -1,7 +1,5 @@
 import copy
 import numpy as np
-from collections import deque
-from random import shuffle
 from poker_env.datatypes import Globals,Action,SUITS,RANKS
 
 
@@ -21,7 +19,62 @@ STATUS_DICT = {
     Status.FOLDED:3
 }
 
+STATUS_NAMES = {v:k for k,v in STATUS_DICT.items()}
+
+def pot_layers(commitments,live,dead_money=0):
+    """
+    Main pot and side pots built from each player's total commitment for the hand.
+    Returns (n_layers,) layer amounts and the (n_layers,n_players) live players eligible for each layer.
+    """
+    commitments = np.asarray(commitments,dtype=np.float64)
+    live = np.asarray(live,dtype=bool)
+    levels = np.unique(commitments[commitments > 0])
+    if levels.size == 0:
+        levels = np.zeros(1)
+    layer_amounts = np.diff(np.minimum(commitments[None,:],levels[:,None]).sum(1),prepend=0)
+    layer_amounts[0] += dead_money
+    eligible = live[None,:] & (commitments[None,:] >= levels[:,None])
+    # Layers no live player matched go back to the live players who committed the most
+    unmatched = ~eligible.any(1)
+    eligible[unmatched] = live & (commitments == commitments[live].max())
+    return layer_amounts,eligible
+
+def layer_winners(eligible,ranks):
+    """(...,n_layers,n_players) eligible players holding the lowest rank of their layer, given (...,n_players) ranks"""
+    eligible_ranks = np.where(eligible,ranks[...,None,:],np.inf)
+    return eligible & (eligible_ranks == eligible_ranks.min(-1,keepdims=True))
+
+def split_pots(commitments,live,hand_ranks,dead_money=0):
+    """
+    Awards the main pot and side pots built from each player's total commitment for the hand.
+    commitments: (n_players,) chips each player put in. live: (n_players,) bool, players that did not fold.
+    hand_ranks: (...,n_players) lower is stronger, ignored for folded players. Leading dimensions (e.g. runouts)
+    share the commitments.
+    dead_money: chips in the pot nobody committed this hand, they go to the main pot.
+    Returns (...,n_players) amounts won.
+    """
+    layer_amounts,eligible = pot_layers(commitments,live,dead_money)
+    winners = layer_winners(eligible,np.asarray(hand_ranks,dtype=np.float64))
+    return (winners / winners.sum(-1,keepdims=True) * layer_amounts[:,None]).sum(-2)
+
+def split_hilo_pots(commitments,live,hi_ranks,lo_ranks,no_low,dead_money=0):
+    """
+    split_pots for hi/lo games. Each pot goes half to its best high and half to its best low,
+    all of it to the high when none of the players eligible for it has a low (lo rank no_low).
+    """
+    layer_amounts,eligible = pot_layers(commitments,live,dead_money)
+    hi_winners = layer_winners(eligible,np.asarray(hi_ranks,dtype=np.float64))
+    lo_winners = layer_winners(eligible,np.asarray(lo_ranks,dtype=np.float64))
+    lo_winners &= (np.asarray(lo_ranks) != no_low)[None,:]
+    has_low = lo_winners.any(1)
+    hi_amounts = np.where(has_low,layer_amounts / 2,layer_amounts)
+    lo_amounts = np.where(has_low,layer_amounts / 2,0)
+    won = hi_winners / hi_winners.sum(1,keepdims=True) * hi_amounts[:,None]
+    won += lo_winners / np.maximum(lo_winners.sum(1,keepdims=True),1) * lo_amounts[:,None]
+    return won.sum(0)
+
 class PlayerIndex(object):
+    __slots__ = ('n_players','starting_street','starting_index','current_index')
     def __init__(self,n_players:int,street:int):
         """
         Class for keeping track of whose turn it is.
@@ -79,103 +132,181 @@ class PlayerIndex(object):
         return Globals.POSITION_INDEX[self.current_index]
 
 class Player(object):
-    def __init__(self,position,stack,street_total=0,status=Status,hand=None):
-        """Status: Active,Folded,Allin"""
-        self.position = position
-        self.stack = stack
-        self.street_total = street_total
-        self.status = Status.ACTIVE
-        self.hand = hand
-        self.handrank = None
-    
+    __slots__ = ('players','index','position')
+    def __init__(self,players,index):
+        """View of a single row of the Players table. Status: Active,Folded,Allin"""
+        self.players = players
+        self.index = index
+        self.position = players.initial_positions[index]
+
     def update_hand(self,hand):
         self.hand = hand
-        
+
+    @property
+    def stack(self):
+        return self.players.stacks[self.index]
+
+    @stack.setter
+    def stack(self,value):
+        self.players.stacks[self.index] = value
+
+    @property
+    def street_total(self):
+        return self.players.street_totals[self.index]
+
+    @street_total.setter
+    def street_total(self,value):
+        self.players.street_totals[self.index] = value
+
+    @property
+    def status(self):
+        return STATUS_NAMES[self.players.status[self.index]]
+
+    @status.setter
+    def status(self,status):
+        self.players.update_status(self.index + 1,status)
+
+    @property
+    def hand(self):
+        return self.players.hands[self.index].reshape(-1,2).astype(int).tolist()
+
+    @hand.setter
+    def hand(self,hand):
+        self.players.hands[self.index] = np.asarray(hand).ravel()
+
+    @property
+    def handrank(self):
+        return self.players.handranks[self.index]
+
+    @handrank.setter
+    def handrank(self,value):
+        self.players.handranks[self.index] = value
+
 class Players(object):
     def __init__(self,n_players,starting_stack,cards_per_player):
-        """Status: Active,Folded,Allin"""
+        """
+        Struct of arrays player table indexed by position id - 1.
+        table columns: position,stack,street_total,status code
+        Status: Active,Folded,Allin
+        """
         self.n_players = n_players
         self.starting_stack = starting_stack
         self.cards_per_player = cards_per_player
         self.initial_positions = Globals.PLAYERS_POSITIONS_DICT[n_players]
+        self.table = np.zeros((n_players,4))
+        self.table[:,0] = np.arange(1,n_players+1)
+        self.stacks = self.table[:,1]
+        self.street_totals = self.table[:,2]
+        self.status = self.table[:,3]
+        self.hands = np.zeros((n_players,cards_per_player*2))
+        self.totals = np.zeros(n_players)
+        self.handranks = [None] * n_players
+        self.players = {position:Player(self,i) for i,position in enumerate(self.initial_positions)}
+        # Seating order starting from each position id, following PlayerIndex.increment
+        self.orders = np.zeros((n_players+1,n_players),dtype=np.int64)
+        for position in range(1,n_players+1):
+            self.orders[position] = (np.arange(n_players) + position - 1) % n_players
+        self.others = [[i for i in range(n_players) if i != position - 1] for position in range(n_players+1)]
         self.reset()
 
     def reset(self):
-        self.players = {position:Player(position,copy.copy(self.starting_stack)) for position in self.initial_positions}
-        for player in self.players.values():
-            assert(player.status == Status.ACTIVE)
-            assert(player.stack == self.starting_stack)
-            assert(player.street_total == 0)
-    
+        self.stacks[:] = self.starting_stack
+        self.street_totals[:] = 0
+        self.totals[:] = 0
+        self.status[:] = STATUS_DICT[Status.ACTIVE]
+        self.handranks[:] = [None] * self.n_players
+        self.num_active_players = self.n_players
+        self.num_folded_players = 0
+        self.num_allin_players = 0
+
+    def recount(self):
+        """Recomputes the status counters from the status column"""
+        self.num_active_players = int((self.status == STATUS_DICT[Status.ACTIVE]).sum())
+        self.num_folded_players = int((self.status == STATUS_DICT[Status.FOLDED]).sum())
+        self.num_allin_players = int((self.status == STATUS_DICT[Status.ALLIN]).sum())
+
     def initialize_hands(self,hands):
-        for i,position in enumerate(self.initial_positions):
-            start = i*self.cards_per_player
-            end = (i+1)*self.cards_per_player
-            player_cards = hands[start:end]
-            self.players[position].update_hand(player_cards)
-    
-    def update_stack(self,amount,position:str):
+        self.hands[:] = np.asarray(hands).reshape(self.n_players,-1)
+
+    def update_stack(self,amount,position:int):
         """
         Updates player stack,street_total and status after putting money into the pot.
         """
-        assert isinstance(position,str)
-        self.players[position].stack += amount
-        self.players[position].street_total -= amount
-        if self.players[position].stack == 0:
-            self.players[position].status = Status.ALLIN
-        assert self.players[position].stack >= 0,'Player stack below zero'
+        index = position - 1
+        self.stacks[index] += amount
+        self.street_totals[index] -= amount
+        self.totals[index] -= amount
+        if self.stacks[index] == 0:
+            self.update_status(position,Status.ALLIN)
+        assert self.stacks[index] >= 0,'Player stack below zero'
 
     def reset_street_totals(self):
-        for player in self.players.values():
-            player.street_total = 0
-
-    def update_status(self,player,status):
-        self.players[player].status = status
+        self.street_totals[:] = 0
+
+    def update_status(self,position:int,status):
+        """Sets the status of position id and keeps the active,folded,allin counters in sync"""
+        index = position - 1
+        previous = self.status[index]
+        code = STATUS_DICT[status]
+        if previous == code:
+            return
+        self.count_status(previous,-1)
+        self.count_status(code,1)
+        self.status[index] = code
+
+    def count_status(self,code,amount):
+        if code == STATUS_DICT[Status.ACTIVE]:
+            self.num_active_players += amount
+        elif code == STATUS_DICT[Status.FOLDED]:
+            self.num_folded_players += amount
+        elif code == STATUS_DICT[Status.ALLIN]:
+            self.num_allin_players += amount
+
+    def is_active(self,position:int):
+        return self.status[position - 1] == STATUS_DICT[Status.ACTIVE]
 
     def info(self,player):
-        """Returns position,stack,street_total for given player"""
-        return [Globals.NAME_INDEX[self.players[player].position],self.players[player].stack,self.players[player].street_total,STATUS_DICT[self.players[player].status]]
+        """Returns position,stack,street_total,status for given player"""
+        return self.table[self.players[player].index]
+
+    def order_info(self,position:int):
+        """Returns position,stack,street_total,status for all players, in seating order starting from position id"""
+        return self.table[self.orders[position]]
 
     def hero_info(self,player):
         """Returns position,stack,hand for given player"""
-        return [Globals.NAME_INDEX[self.players[player].position],self.players[player].stack,*flatten(self.players[player].hand)]
+        index = self[player].index
+        return np.concatenate((self.table[index,:2],self.hands[index]))
 
     def observation_info(self,hero):
         """Returns position,stack,hand for all players other than hero"""
-        return flatten([[Globals.NAME_INDEX[self.players[player].position],self.players[player].stack,*flatten(self.players[player].hand)] for player in self.initial_positions if player != hero])
+        others = self.others[self[hero].index + 1]
+        return np.hstack((self.table[others,:2],self.hands[others])).ravel()
 
     def return_active_hands(self):
         hands = []
         positions = []
         for i,position in enumerate(self.initial_positions):
-            if self.players[position].status != Status.FOLDED:
+            if self.status[i] != STATUS_DICT[Status.FOLDED]:
                 hands.append(self.players[position].hand)
                 positions.append(position)
         return hands,positions
 
     def __getitem__(self,key):
-        return self.players[key]
+        if isinstance(key,str):
+            return self.players[key]
+        return self.players[self.initial_positions[key - 1]]
 
     def __len__(self):
-        return len(self.players.keys())
+        return self.n_players
 
-    @property
-    def num_active_players(self):
-        return [self.players[player].status for player in self.players if self.players[player].status == Status.ACTIVE].count(Status.ACTIVE)
-    
-    @property
-    def num_folded_players(self):
-        return [self.players[player].status for player in self.players if self.players[player].status == Status.FOLDED].count(Status.FOLDED)
-    
     @property
     def to_showdown(self):
         """Fast forwards to showdown if all players are allin"""
-        statuses = [self.players[position].status for position in self.initial_positions]
-        if Status.ACTIVE not in statuses and statuses.count(Status.ALLIN) > 1:
-            return True
-        return False
+        return self.num_active_players == 0 and self.num_allin_players > 1
 
 class LastAggression(PlayerIndex):
+    __slots__ = ('starting_action','starting_betsize','aggressive_action','aggressive_betsize')
     def __init__(self,n_players,street):
         self.n_players = n_players
         self.starting_street = street
@@ -189,7 +320,7 @@ class LastAggression(PlayerIndex):
         return [self.current_index,self.action,self.betsize]
 
     def update_aggression(self,position,action,betsize):
-        self.current_index = copy.copy(position)
+        self.current_index = position
         self.aggressive_action = action
         self.aggressive_betsize = betsize
 
@@ -211,22 +342,71 @@ class LastAggression(PlayerIndex):
     def betsize(self):
         return self.aggressive_betsize
 
+# Card id -> [rank,suit]. id = (rank - 2) * 4 + (suit - 1)
+CARD_TABLE = np.array([[rank,suit] for rank in range(RANKS.LOW,RANKS.HIGH) for suit in range(SUITS.LOW,SUITS.HIGH)])
+
+def derive_seed(seed,*keys):
+    """Independent child seed for e.g. (training_round,worker_id). Same inputs always give the same stream"""
+    if isinstance(seed,np.random.SeedSequence):
+        return np.random.SeedSequence(seed.entropy,spawn_key=tuple(seed.spawn_key) + tuple(keys))
+    return np.random.SeedSequence(seed,spawn_key=tuple(keys))
+
 class Deck(object):
-    def __init__(self):
+    def __init__(self,seed=None):
+        """
+        Deck of int card ids (0-51). Cards are dealt from the end. When shuffled, each dealt card is drawn
+        uniformly from the remaining cards (partial Fisher-Yates), so only the cards a hand needs are shuffled.
+        """
+        self.rng = np.random.default_rng(seed)
+        self.cards = np.arange(52)
         self.reset()
 
+    def seed(self,seed):
+        self.rng = np.random.default_rng(seed)
+
     def reset(self):
-        self.deck = deque(maxlen=52)
-        for i in range(RANKS.LOW,RANKS.HIGH):
-            for j in range(SUITS.LOW,SUITS.HIGH):
-                self.deck.append([i,j])
+        self.cards[:] = np.arange(52)
+        self.position = 52
+        self.to_shuffle = False
+
+    def deal_ids(self,N):
+        """Returns an array of N card ids, in dealing order"""
+        end = self.position
+        start = end - N
+        assert start >= 0,'Not enough cards in the deck'
+        if self.to_shuffle:
+            cards = self.cards
+            draws = self.rng.integers(0,np.arange(end,start,-1))
+            for k,j in zip(range(end - 1,start - 1,-1),draws):
+                cards[k],cards[j] = cards[j],cards[k]
+        self.position = start
+        return self.cards[start:end][::-1]
+
+    def preset(self,cards):
+        """Fixes the next cards to be dealt, in dealing order"""
+        cards = np.asarray(cards)
+        self.reset()
+        self.cards[52 - len(cards):] = cards[::-1]
+
+    def dealt_ids(self):
+        """Card ids dealt so far, in dealing order"""
+        return self.cards[self.position:][::-1]
 
     def deal(self,N):
-        """Returns a list of cards (rank,suit)"""
-        cards = []
-        for card in range(N):
-            cards.append(self.deck.pop())
-        return cards
+        """Returns an (N,2) array of cards (rank,suit)"""
+        return CARD_TABLE[self.deal_ids(N)]
+
+    def deal_batch(self,n_hands,N):
+        """Returns (n_hands,N) card ids, each row drawn without replacement from a full deck"""
+        cards = np.tile(np.arange(52),(n_hands,1))
+        rows = np.arange(n_hands)
+        for i in range(N):
+            k = 51 - i
+            j = self.rng.integers(0,k + 1,size=n_hands)
+            drawn = cards[rows,j]
+            cards[rows,j] = cards[:,k]
+            cards[:,k] = drawn
+        return cards[:,::-1][:,:N]
 
     def initialize_board(self,street):
         assert isinstance(street,int),f'street type incorrect {type(street)}'
@@ -239,47 +419,87 @@ class Deck(object):
         return self.deal(num_cards)
 
     def shuffle(self):
-        shuffle(self.deck)
+        self.to_shuffle = True
 
     def __len__(self):
-        return len(self.deck)
+        return self.position
 
 class GlobalState(object):
-    def __init__(self,mapping):
+    def __init__(self,mapping,global_space,maxlen=10):
+        """
+        Ring buffer of the last maxlen global states. Each row is written twice (i and i + maxlen)
+        so the history is always a contiguous view of the buffer.
+        """
         self.mapping = mapping
+        self.maxlen = maxlen
+        self.buffer = np.zeros((maxlen * 2,global_space))
+        self.aggressive_action_index = mapping['last_aggressive_action'][0]
+        self.aggressive_betsize_index = mapping['last_aggressive_betsize'][0]
+        self.aggressive_position_index = mapping['last_aggressive_position'][0]
+        self.action_index = mapping['last_action'][0]
+        self.betsize_index = mapping['last_betsize'][0]
         self.reset()
 
     def add(self,state):
-        self.global_states.append(state)
+        index = self.count % self.maxlen
+        self.buffer[index] = state
+        self.buffer[index + self.maxlen] = state
+        self.count += 1
+        row = self.buffer[index]
+        self.penultimate_betsize = self.last_betsize
+        self.last_aggressive_action = row[self.aggressive_action_index]
+        self.last_aggressive_betsize = row[self.aggressive_betsize_index]
+        self.last_aggressive_position = row[self.aggressive_position_index]
+        self.last_action = row[self.action_index]
+        self.last_betsize = row[self.betsize_index]
 
     def stack(self):
-        return np.vstack(self.global_states)
+        """Returns a view of the last min(count,maxlen) states, oldest first"""
+        n_rows = len(self)
+        start = (self.count - n_rows) % self.maxlen
+        return self.buffer[start:start + n_rows]
+
+    def restore(self,states,count):
+        """Rebuilds the buffer from the last min(count,maxlen) states"""
+        self.reset()
+        self.count = count - len(states)
+        for state in states:
+            self.add(state)
 
     def reset(self):
-        self.global_states = []
+        self.count = 0
+        self.last_aggressive_action = 0
+        self.last_aggressive_betsize = 0
+        self.last_aggressive_position = 0
+        self.last_action = 0
+        self.last_betsize = 0
+        self.penultimate_betsize = 0
 
-    @property
-    def last_aggressive_action(self):
-        return self.global_states[-1][self.mapping['last_aggressive_action']][0]
-        
-    @property
-    def last_aggressive_betsize(self):
-        return self.global_states[-1][self.mapping['last_aggressive_betsize']][0]
+    def __len__(self):
+        return min(self.count,self.maxlen)
 
-    @property
-    def last_aggressive_position(self):
-        return self.global_states[-1][self.mapping['last_aggressive_position']][0]
-        
-    @property
-    def last_action(self):
-        return self.global_states[-1][self.mapping['last_action']][0]
-        
-    @property
-    def last_betsize(self):
-        return self.global_states[-1][self.mapping['last_betsize']][0]
+class PokerSnapshot(object):
+    __slots__ = ('scalars','board','table','totals','hands','handranks','deck','history','_hash')
+    def __init__(self,scalars,board,table,totals,hands,handranks,deck,history):
+        """
+        Immutable record of a Poker hand. All fields are read only numpy arrays of fixed size.
+        scalars: street,pot,players_remaining,current_index,aggressor_position,aggressor_action,aggressor_betsize,deck_position,to_shuffle,history_count
+        history: (maxlen,global_space) last global states, oldest first, zero padded at the end
+        """
+        for name,value in zip(self.__slots__[:-1],(scalars,board,table,totals,hands,handranks,deck,history)):
+            value.setflags(write=False)
+            object.__setattr__(self,name,value)
+        object.__setattr__(self,'_hash',None)
 
-    @property
-    def penultimate_betsize(self):
-        if len(self.global_states) > 1:
-            return self.global_states[-2][self.mapping['last_betsize']][0]
-        return 0
+    def __setattr__(self,name,value):
+        raise AttributeError('PokerSnapshot is immutable')
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self,'_hash',hash(tuple(getattr(self,name).tobytes() for name in self.__slots__[:-1])))
+        return self._hash
+
+    def __eq__(self,other):
+        if not isinstance(other,PokerSnapshot):
+            return NotImplemented
+        return all(np.array_equal(getattr(self,name),getattr(other,name)) for name in self.__slots__[:-1])
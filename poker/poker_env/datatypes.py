@@ -286,8 +286,7 @@ class OmahaHI(object):
 
 class OmahaHILO(object):
     def __init__(self):
-        ## NOT IMPLEMENTED ##
-        K = BaseHoldem()
+        K = BaseOmaha()
         self.starting_street = Street.PREFLOP
         self.rule_params = K.rule_params
         self.state_params = K.state_params
@@ -1,15 +1,19 @@
 import copy
 import numpy as np
-from random import shuffle
+from itertools import combinations
+from math import comb
 import poker_env.datatypes as pdt
-from collections import deque
-from utils.cardlib import hand_rank,encode
-from poker_env.data_classes import Status,PlayerIndex,Player,Players,LastAggression,Deck,GlobalState
+from utils.cardlib import hand_ranks,holdem_hand_ranks,batch_hand_ranks,batch_holdem_hand_ranks,encode_cards,batch_hilo_showdowns,NO_LOW
+from poker_env.episode_log import encode_action,encode_episode,decode_episode
+from poker_env.data_classes import Status,PlayerIndex,Player,Players,LastAggression,Deck,GlobalState,PokerSnapshot,CARD_TABLE,STATUS_DICT,split_pots,split_hilo_pots,derive_seed
 
 """
 last_position: int list of positions. last position is the null position. Used for the beginning of streets.
 """
 
+# Spawn key of the runout sampling stream, kept apart from the deck stream so expected payoffs don't shift the deals
+EQUITY_STREAM = 1
+
 def flatten(l):
     return [item for sublist in l for item in sublist]
 
@@ -30,8 +34,27 @@ class Poker(object):
         self.cards_per_player = params['cards_per_player']
         self.bet_type = params['bet_type']
         self.starting_stack = params['stacksize']
-        self.global_states = GlobalState(params['global_mapping'])
+        self.maxlen = params.get('maxlen',10)
+        self.global_states = GlobalState(params['global_mapping'],self.global_space,self.maxlen)
+        # dtype np.float32 lets torch.from_numpy / torch.as_tensor wrap the outputs without a copy
+        self.dtype = params.get('dtype',np.float64)
+        self.build_obs = params.get('build_obs',True)
+        self.state_buffer = np.zeros((self.maxlen,self.state_space),dtype=self.dtype)
+        self.obs_buffer = np.zeros((self.maxlen,self.observation_space),dtype=self.dtype)
+        self.global_row = np.zeros(self.global_space)
+        self.hero_width = 2 + self.cards_per_player * 2
+        self.deck = Deck(params.get('seed'))
+        self.log_episodes = params.get('log_episodes',False)
+        self.episode_actions = bytearray()
+        # Pays all in showdowns by equity over the remaining runouts, alongside the sampled runout
+        self.expected_payoff = params.get('expected_payoff',False)
+        self.equity_samples = params.get('equity_samples',1000)
+        self.equity_rng = np.random.default_rng(derive_seed(params.get('seed'),EQUITY_STREAM))
+        self.allin_board = None
+        self.allin_cards = None
         self.players = Players(self.n_players,self.starting_stack,self.cards_per_player)
+        # Follows the stacks until an allin showdown pays by equity
+        self.expected_stacks = self.players.stacks
         self.current_index = PlayerIndex(self.n_players,self.starting_street)
         self.last_aggressor = LastAggression(self.n_players,self.starting_street)
         self.players_remaining = self.n_players
@@ -43,29 +66,47 @@ class Poker(object):
             pdt.LimitTypes.POT_LIMIT : self.return_potlimit_betsize,
         }
         self.return_betsize = betsize_funcs[self.bet_type]
+        self.rank_hands = holdem_hand_ranks if self.cards_per_player == 2 else hand_ranks
+        self.batch_rank_hands = batch_holdem_hand_ranks if self.cards_per_player == 2 else batch_hand_ranks
+        # Hi/lo showdowns rank the high and the eight or better low in one evaluator call
+        self.hilo = self.game == pdt.GameTypes.OMAHAHILO
+        self.lo_ranks = np.full(self.n_players,NO_LOW)
 
         assert(self.n_players >= 2)
         assert(self.starting_stack >= 1)
         assert(self.cards_per_player >= 2)
+        assert not self.hilo or self.cards_per_player == 4,'Hi/lo is an Omaha game'
+        assert not (self.hilo and self.expected_payoff),'Expected payoff only supports high hands'
+
+    def seed(self,seed):
+        """Reseeds the deck and the runout sampling. Use poker_env.data_classes.derive_seed to get distinct seeds per worker"""
+        self.deck.seed(seed)
+        self.equity_rng = np.random.default_rng(derive_seed(seed,EQUITY_STREAM))
 
     def initialize_board(self):
         self.board = [0] * 10
-        starting_board_cards = flatten(self.deck.initialize_board(self.starting_street))
+        starting_board_cards = self.deck.initialize_board(self.starting_street).ravel().tolist()
         self.board[:len(starting_board_cards)] = starting_board_cards
         
     def update_board(self):
         assert(self.street > pdt.Street.PREFLOP and self.street <= pdt.Street.RIVER), f'Street is outside bounds {self.street}'
-        new_board_cards = flatten(self.deck.deal_board(self.street))
+        new_board_cards = self.deck.deal_board(self.street).ravel().tolist()
         start,end = pdt.Globals.BOARD_UPDATE[self.street]
         self.board[start:end] = new_board_cards
         
-    def reset(self):
+    def reset(self,cards=None):
+        """cards: optional card ids in dealing order, used to replay a logged hand"""
         self.global_states.reset()
         self.current_index.reset()
         self.last_aggressor.reset()
         self.players_remaining = self.n_players
-        self.deck = Deck()
-        if self.to_shuffle:
+        self.deck.reset()
+        self.episode_actions.clear()
+        self.allin_board = None
+        self.allin_cards = None
+        if cards is not None:
+            self.deck.preset(cards)
+        elif self.to_shuffle:
             self.deck.shuffle()
         self.street = self.starting_street
         # Pot
@@ -74,6 +115,7 @@ class Poker(object):
         self.initialize_board()
         # Players
         self.players.reset()
+        self.expected_stacks = self.players.stacks
         # Hands
         hands = self.deck.deal(self.cards_per_player*self.n_players)
         self.players.initialize_hands(hands)
@@ -105,6 +147,8 @@ class Poker(object):
         """
         assert isinstance(inputs['action_category'],int)
         assert isinstance(inputs['betsize'],int)
+        if self.log_episodes:
+            self.episode_actions.append(encode_action(inputs['action_category'],inputs['betsize']))
         action = inputs['action_category'] + pdt.Action.OFFSET
         betsize = self.return_betsize(action,inputs['betsize'])
         self.update_state(action,betsize)
@@ -119,29 +163,90 @@ class Poker(object):
         assert isinstance(betsize_mask,(np.generic,np.ndarray))
         return state,obs,done,action_mask,betsize_mask
 
+    def episode_log(self):
+        """Returns the compact binary log (poker_env.episode_log) of the current hand. Requires params['log_episodes']"""
+        assert self.log_episodes,'Episode logging is disabled'
+        return encode_episode(self.n_players,self.cards_per_player,self.starting_street,self.deck.dealt_ids(),self.episode_actions)
+
+    def replay(self,log):
+        """
+        Replays a hand from its episode log. For every decision yields
+        state,obs,action_mask,betsize_mask,action_category,betsize
+        state and obs are views that are overwritten on the next step. Rewards are in player_rewards() afterwards.
+        """
+        episode = decode_episode(log)
+        assert (episode.n_players,episode.cards_per_player,episode.starting_street) == (self.n_players,self.cards_per_player,self.starting_street),'Episode was logged with different env params'
+        state,obs,done,action_mask,betsize_mask = self.reset(cards=episode.cards)
+        for action_category,betsize in episode.actions:
+            assert not done,'Episode log continues after the hand is over'
+            yield state,obs,action_mask,betsize_mask,action_category,betsize
+            state,obs,done,action_mask,betsize_mask = self.step({'action_category':action_category,'betsize':betsize})
+
+    def snapshot(self):
+        """
+        Returns an immutable, hashable PokerSnapshot of the current hand.
+        The deck rng is not part of the snapshot, shuffled runouts after a restore are new draws.
+        """
+        history = np.zeros((self.maxlen,self.global_space))
+        states = self.global_states.stack()
+        history[:len(states)] = states
+        scalars = np.array([
+            self.street,
+            self.pot,
+            self.players_remaining,
+            self.current_index.current_index,
+            self.last_aggressor.current_index,
+            self.last_aggressor.aggressive_action,
+            self.last_aggressor.aggressive_betsize,
+            self.deck.position,
+            self.deck.to_shuffle,
+            self.global_states.count],dtype=np.float64)
+        handranks = np.array([-1 if rank is None else rank for rank in self.players.handranks],dtype=np.int64)
+        return PokerSnapshot(scalars,np.array(self.board,dtype=np.float64),self.players.table.copy(),self.players.totals.copy(),self.players.hands.copy(),handranks,self.deck.cards.astype(np.int8),history)
+
+    def restore(self,snapshot):
+        """Puts the env back into the state of snapshot. Returns state,obs,done,action_mask,betsize_mask"""
+        street,pot,players_remaining,current_index,aggressor_position,aggressor_action,aggressor_betsize,deck_position,to_shuffle,count = snapshot.scalars.tolist()
+        self.street = int(street)
+        self.pot = pot
+        self.players_remaining = int(players_remaining)
+        self.current_index.current_index = int(current_index)
+        self.last_aggressor.update_aggression(int(aggressor_position),int(aggressor_action),aggressor_betsize)
+        self.deck.cards[:] = snapshot.deck
+        self.deck.position = int(deck_position)
+        self.deck.to_shuffle = bool(to_shuffle)
+        self.board = snapshot.board.astype(int).tolist()
+        self.players.table[:] = snapshot.table
+        self.players.totals[:] = snapshot.totals
+        self.players.hands[:] = snapshot.hands
+        self.players.handranks[:] = [None if rank == -1 else rank for rank in snapshot.handranks.tolist()]
+        self.players.recount()
+        self.expected_stacks = self.players.stacks
+        self.allin_board = None
+        self.allin_cards = None
+        count = int(count)
+        self.global_states.restore(snapshot.history[:min(count,self.maxlen)],count)
+        state,obs = self.return_state()
+        action_mask,betsize_mask = self.return_masks(state)
+        return state,obs,self.game_over(),action_mask,betsize_mask
+
     def return_player_order(self):
-        """Returns sequence of player data (position,stacksize,street_total"""
-        player_data = []
-        temp_index = self.current_index.clone()
-        for i in range(self.n_players):
-            position = pdt.Globals.POSITION_INDEX[temp_index.current_index]
-            player_data.append(self.players.info(position))
-            temp_index.increment()
-        return flatten(player_data)
+        """Returns (n_players,4) player data (position,stacksize,street_total,status) starting from the current player"""
+        return self.players.order_info(self.current_index.current_index)
     
     def update_state(self,action,betsize,blind=pdt.Blind.NO_BLIND):
         """Updates the global state. Appends the new global state to storage"""
         if blind != pdt.Blind.POSTED:
             self.players_remaining -= 1
+        last_position = self.current_index.current_index
         if (action == pdt.Action.RAISE or action == pdt.Action.BET):
-            self.last_aggressor.update_aggression(self.current_index.value(),action,betsize)
+            self.last_aggressor.update_aggression(last_position,action,betsize)
             if blind != pdt.Blind.POSTED:
                 self.players_remaining = self.players.num_active_players - 1 # Current active player won't act again unless action is reopened
         elif action == pdt.Action.FOLD:
-            self.players.update_status(self.current_player,Status.FOLDED)
+            self.players.update_status(last_position,Status.FOLDED)
         self.pot += betsize
-        self.players.update_stack(-betsize,self.current_player)
-        last_position = pdt.Globals.NAME_INDEX[self.current_player]
+        self.players.update_stack(-betsize,last_position)
         self.increment_current_player_index()
         self.store_global_state(last_position,action,betsize,blind)
     
@@ -151,23 +256,28 @@ class Poker(object):
         self.board,self.street,last_position,last_action,last_betsize,blind,to_call,pot_odds
         """
         # last aggression
-        aggressor_values = self.last_aggressor.player_values()
-        if self.last_aggressor.current_index == self.dealer_position:
+        street_totals = self.players.street_totals
+        aggressor = self.last_aggressor.current_index
+        if aggressor == self.dealer_position:
             total_bet = 0
         else:
-            total_bet = self.players[self.last_aggressor.key].street_total
-        to_call = total_bet - self.players[self.current_player].street_total
+            total_bet = street_totals[aggressor - 1]
+        to_call = total_bet - street_totals[self.current_index.current_index - 1]
         if to_call == 0:
             pot_odds = 0
         else:
             pot_odds = to_call / (self.pot + to_call)
-        initial_data = [*self.board,self.street,*aggressor_values,last_position,last_action,last_betsize,blind,self.pot,to_call,pot_odds]
-        player_data = self.return_player_order()
-        global_state = np.array(initial_data+player_data)
-        assert global_state.shape[-1] == self.global_space
-        self.global_states.add(global_state)
+        row = self.global_row
+        row[:10] = self.board
+        row[10:21] = (self.street,aggressor,self.last_aggressor.aggressive_action,self.last_aggressor.aggressive_betsize,last_position,last_action,last_betsize,blind,self.pot,to_call,pot_odds)
+        row[21:] = self.return_player_order().ravel()
+        self.global_states.add(row)
     
     def increment_street(self):
+        if self.expected_payoff and self.players.to_showdown:
+            # Board and undealt cards at the time everyone is allin
+            self.allin_board = list(self.board)
+            self.allin_cards = self.deck.cards[:self.deck.position].copy()
         self.street += 1
         assert not self.street > pdt.Street.RIVER,'Street is greater than river'
         # clear previous street totals
@@ -188,44 +298,56 @@ class Poker(object):
 
     def street_starting_index(self):
         self.current_index.next_street(self.street)
-        if self.players[self.current_index.key].status != Status.ACTIVE:
+        if not self.players.is_active(self.current_index.current_index):
             for i in range(self.n_players):
                 self.current_index.increment()
-                if self.players[self.current_index.key].status == Status.ACTIVE:
+                if self.players.is_active(self.current_index.current_index):
                     break
     
     def increment_current_player_index(self):
         self.current_index.increment()
         for i in range(self.n_players):
-            if self.players[self.current_index.key].status == Status.ACTIVE:
+            if self.players.is_active(self.current_index.current_index):
                 break
             self.current_index.increment()
 
     def return_state(self):
-        # add hero hand, position, stack, street_total
+        """
+        Writes hero info and the last maxlen global states into the reusable state buffer.
+        Returned arrays are views of the buffers and are overwritten on the next step.
+        obs is None unless params['build_obs'], use observation() to build it on demand.
+        """
         states = self.global_states.stack()
         N = states.shape[0]
+        players = self.players
+        hero = self.current_index.current_index - 1
+        hero_width = self.hero_width
         # local state
-        player_data = np.array(self.players.hero_info(self.current_player))
-        player_data = np.tile(player_data,(N,1)) if N > 1 else player_data[None,]
-        state = np.hstack((player_data,states))
-        # obs
-        player_obs = np.array(self.players.observation_info(self.current_player))
-        player_obs = np.tile(player_obs,(N,1)) if N > 1 else player_obs[None,]
-        obs = np.hstack((player_data,player_obs,states))
-        assert state.shape[-1] == self.state_space
-        assert obs.shape[-1] == self.observation_space
-        return state[None,],obs[None,]
-            
+        self.state_buffer[:N,:2] = players.table[hero,:2]
+        self.state_buffer[:N,2:hero_width] = players.hands[hero]
+        self.state_buffer[:N,hero_width:] = states
+        obs = self.observation() if self.build_obs else None
+        return self.state_buffer[None,:N],obs
+
+    def observation(self):
+        """Writes the current observation (hero, all other hands and the global states) into the reusable obs buffer"""
+        states = self.global_states.stack()
+        N = states.shape[0]
+        players = self.players
+        hero = self.current_index.current_index - 1
+        hero_width = self.hero_width
+        self.obs_buffer[:N,:2] = players.table[hero,:2]
+        self.obs_buffer[:N,2:hero_width] = players.hands[hero]
+        for i,other in enumerate(players.others[hero + 1]):
+            start = (i + 1) * hero_width
+            self.obs_buffer[:N,start:start+2] = players.table[other,:2]
+            self.obs_buffer[:N,start+2:start+hero_width] = players.hands[other]
+        self.obs_buffer[:N,hero_width * self.n_players:] = states
+        return self.obs_buffer[None,:N]
+
     def active_players(self):
-        """Returns a list of active players"""
-        actives = []
-        active_index = self.current_index.clone()
-        for i in range(self.n_players):
-            if self.players[active_index].status == Status.ACTIVE:
-                actives.append(active_index)
-            active_index.increment()
-        return actives
+        """Returns a list of active player position ids, starting from the current player"""
+        return [int(position) for position in self.return_player_order()[:,0] if self.players.is_active(int(position))]
     
     def round_over(self):
         if self.players_remaining == 0 and self.street != pdt.Street.RIVER and self.players.num_folded_players != self.n_players - 1:
@@ -238,25 +360,67 @@ class Poker(object):
         return False
     
     def resolve_outcome(self):
-        """Gets all hands, gets all handranks,finds and counts lowest (strongest) hands. Assigns the pot to them."""
-        hands,positions = self.players.return_active_hands()
-        if len(positions) > 1:
-            # encode hands
-            en_hands = []
-            for hand in hands:
-                en_hand = [encode(c) for c in hand]
-                en_hands.append(en_hand)
-            en_board = [encode(self.board[i*2:(i*2)+2]) for i in range(0,len(self.board)//2)]
-            hand_ranks = [hand_rank(hand,en_board) for hand in en_hands]
-            best_hand = np.min(hand_ranks)
-            winner_mask = np.where(best_hand == hand_ranks)[0]
-            winner_positions = np.array(positions)[winner_mask]
-            for i,position in enumerate(positions):
-                self.players[position].handrank = hand_ranks[i]
-            for winner in winner_positions:
-                self.players[winner].stack += self.pot / len(winner_mask)
+        """Ranks all live hands in one evaluator call and awards the main pot and side pots to the strongest (lowest) hands"""
+        players = self.players
+        live = players.status != STATUS_DICT[Status.FOLDED]
+        if self.expected_payoff:
+            self.expected_stacks = players.stacks.copy()
+        if live.sum() > 1:
+            live_index = np.where(live)[0]
+            hands = players.hands[live_index].reshape(live_index.size,-1,2)
+            ranks = np.zeros(self.n_players)
+            if self.hilo:
+                hi_ranks,lo_ranks,_ = batch_hilo_showdowns(encode_cards(hands)[None],encode_cards(np.reshape(self.board,(-1,2)))[None])
+                ranks[live] = hi_ranks[0]
+                self.lo_ranks[:] = NO_LOW
+                self.lo_ranks[live] = lo_ranks[0]
+            else:
+                en_hands = encode_cards(hands).tolist()
+                en_board = encode_cards(np.reshape(self.board,(-1,2))).tolist()
+                ranks[live] = self.rank_hands(en_hands,en_board)
+            for i in live_index:
+                players.handranks[i] = int(ranks[i])
+            winnings = self.split_pot(ranks)
+            players.stacks[:] += winnings
+            if self.expected_payoff:
+                self.expected_stacks += self.expected_winnings(hands) if self.allin_board is not None else winnings
+        else:
+            players.stacks[live] += self.pot
+            if self.expected_payoff:
+                self.expected_stacks[live] += self.pot
+
+    def split_pot(self,hand_ranks):
+        """Returns the amount won by each player given (n_players,) hand_ranks"""
+        live = self.players.status != STATUS_DICT[Status.FOLDED]
+        totals = self.players.totals
+        if self.hilo:
+            return split_hilo_pots(totals,live,hand_ranks,self.lo_ranks,NO_LOW,self.pot - totals.sum())
+        return split_pots(totals,live,hand_ranks,self.pot - totals.sum())
+
+    def expected_winnings(self,hands):
+        """
+        hands: (n_live,cards_per_player,2) cards of the live players.
+        Expected amount won by each player over the runouts from the board at the time players went allin.
+        Enumerates all runouts when there are at most equity_samples of them, otherwise samples equity_samples runouts.
+        All runouts are ranked in one evaluator call.
+        """
+        known = np.reshape(self.allin_board,(5,2))
+        known = known[known[:,0] != 0]
+        remaining = np.asarray(self.allin_cards)
+        n_missing = 5 - len(known)
+        if comb(len(remaining),n_missing) <= self.equity_samples:
+            runouts = np.array(list(combinations(range(len(remaining)),n_missing)),dtype=np.int64).reshape(-1,n_missing)
         else:
-            self.players[positions[0]].stack += self.pot
+            runouts = np.argsort(self.equity_rng.random((self.equity_samples,len(remaining))),axis=-1)[:,:n_missing]
+        boards = np.concatenate((np.broadcast_to(known,(len(runouts),) + known.shape),CARD_TABLE[remaining[runouts]]),axis=1)
+        n_live = len(hands)
+        en_hands = np.broadcast_to(encode_cards(hands),(len(runouts),) + hands.shape[:2]).reshape(-1,hands.shape[1])
+        en_boards = np.repeat(encode_cards(boards),n_live,axis=0)
+        live = self.players.status != STATUS_DICT[Status.FOLDED]
+        ranks = np.zeros((len(runouts),self.n_players))
+        ranks[:,live] = self.batch_rank_hands(en_hands,en_boards).reshape(len(runouts),n_live)
+        totals = self.players.totals
+        return split_pots(totals,live,ranks,self.pot - totals.sum()).mean(0)
 
     def return_masks(self,state):
         """
@@ -272,7 +436,7 @@ class Poker(object):
     
     def return_mask(self):
         """Taking into account SB calling BB"""
-        if self.global_states.last_aggressive_position == pdt.Globals.POSITION_MAPPING[self.current_player]:
+        if self.global_states.last_aggressive_position == self.current_index.current_index:
             return copy.deepcopy(self.mask_dict[self.global_states.last_action])
         return copy.deepcopy(self.mask_dict[self.global_states.last_aggressive_action])
 
@@ -399,10 +563,13 @@ class Poker(object):
             betsize = 0
         return betsize
 
-    def player_rewards(self):
+    def player_rewards(self,expected=False):
+        """expected: use the equity payoff of allin showdowns. Requires params['expected_payoff']"""
+        assert not expected or self.expected_payoff,'Expected payoff is disabled'
+        stacks = self.expected_stacks if expected else self.players.stacks
         rewards = {}
-        for position in ['SB','BB']:
-            rewards[position] = self.players[position].stack - self.starting_stack
+        for i,position in enumerate(self.players.initial_positions):
+            rewards[position] = stacks[i] - self.starting_stack
         return rewards
     
     @property
@@ -0,0 +1,62 @@
+import struct
+import numpy as np
+from collections import namedtuple
+
+"""
+Compact binary log of a single hand. Enough to replay it through Poker.replay without any model inference.
+
+Layout (little endian):
+header: version,n_players,cards_per_player,starting_street,n_cards,n_actions (1 byte each)
+cards: n_cards card ids (0-51) in dealing order
+actions: n_actions bytes, action_category in the low 3 bits and betsize category in the high 5 bits
+
+Files hold a sequence of logs, each prefixed with its length as an unsigned short.
+"""
+
+VERSION = 1
+HEADER = struct.Struct('<BBBBBB')
+LENGTH = struct.Struct('<H')
+
+Episode = namedtuple('Episode',['n_players','cards_per_player','starting_street','cards','actions'])
+
+def encode_action(action_category,betsize):
+    assert 0 <= action_category < 8 and 0 <= betsize < 32,f'action {action_category},{betsize} does not fit in one byte'
+    return action_category | (betsize << 3)
+
+def decode_action(byte):
+    """Returns action_category,betsize"""
+    return byte & 7,byte >> 3
+
+def encode_episode(n_players,cards_per_player,starting_street,cards,actions):
+    """
+    cards: sequence of card ids in dealing order
+    actions: bytes of encoded actions
+    """
+    header = HEADER.pack(VERSION,n_players,cards_per_player,starting_street,len(cards),len(actions))
+    return header + bytes(np.asarray(cards,dtype=np.uint8)) + bytes(actions)
+
+def decode_episode(log):
+    version,n_players,cards_per_player,starting_street,n_cards,n_actions = HEADER.unpack_from(log)
+    assert version == VERSION,f'Unknown episode log version {version}'
+    start = HEADER.size
+    cards = np.frombuffer(log,dtype=np.uint8,count=n_cards,offset=start).astype(np.int64)
+    actions = [decode_action(byte) for byte in log[start + n_cards:start + n_cards + n_actions]]
+    return Episode(n_players,cards_per_player,starting_street,cards,actions)
+
+def write_episodes(path,logs):
+    """Appends logs to path"""
+    with open(path,'ab') as f:
+        for log in logs:
+            f.write(LENGTH.pack(len(log)))
+            f.write(log)
+
+def read_episodes(path):
+    """Yields the logs stored in path"""
+    with open(path,'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        (length,) = LENGTH.unpack_from(data,offset)
+        offset += LENGTH.size
+        yield data[offset:offset + length]
+        offset += length
@@ -0,0 +1,503 @@
+import numpy as np
+import poker_env.datatypes as pdt
+from utils.cardlib import batch_hand_ranks,batch_holdem_hand_ranks,batch_hilo_showdowns,encode_cards,NO_LOW
+from poker_env.data_classes import Status,STATUS_DICT,Deck,split_pots,split_hilo_pots
+
+"""
+Batched version of poker_env.env.Poker. Keeps N independent hands in struct of arrays numpy state,
+so an actor can do a single forward pass per tick over all of them.
+
+Players are stored by position index (SB=0,BB=1,BTN=2), position ids are index + 1 like in Poker.
+States are returned as (N,maxlen,state_space) with zero padding on the left for hands with
+fewer than maxlen history rows.
+"""
+
+ACTIVE = STATUS_DICT[Status.ACTIVE]
+ALLIN = STATUS_DICT[Status.ALLIN]
+FOLDED = STATUS_DICT[Status.FOLDED]
+
+# Indexed by action code, mirrors pdt.Globals.ACTION_MASKS
+MASK_TABLE = np.zeros((pdt.Action.UNOPENED+1,5))
+for action,mask in pdt.Globals.ACTION_MASKS.items():
+    MASK_TABLE[action] = mask
+
+class VectorPoker(object):
+    def __init__(self,params,n_envs):
+        self.game = params['game']
+        self.to_shuffle = params['shuffle']
+        self.global_mapping = params['global_mapping']
+        self.state_mapping = params['state_mapping']
+        self.obs_mapping = params['obs_mapping']
+        self.betsizes = np.asarray(params['betsizes'],dtype=np.float64)
+        self.num_betsizes = len(self.betsizes)
+        self.starting_street = params['starting_street']
+        self.starting_pot = params['pot']
+        self.n_players = params['n_players']
+        self.cards_per_player = params['cards_per_player']
+        self.bet_type = params['bet_type']
+        self.starting_stack = params['stacksize']
+        self.maxlen = params.get('maxlen',10)
+        self.dtype = params.get('dtype',np.float64)
+        self.build_obs = params.get('build_obs',True)
+        self.n_envs = n_envs
+        self.deck = Deck(params.get('seed'))
+        self.dealer_position = self.n_players + 1
+        self.hand_width = self.cards_per_player * 2
+        betsize_funcs = {
+            pdt.LimitTypes.LIMIT : self.return_limit_betsize,
+            pdt.LimitTypes.NO_LIMIT : self.return_nolimit_betsize,
+            pdt.LimitTypes.POT_LIMIT : self.return_potlimit_betsize,
+        }
+        self.return_betsize = betsize_funcs[self.bet_type]
+        self.rank_hands = batch_holdem_hand_ranks if self.cards_per_player == 2 else batch_hand_ranks
+        self.hilo = self.game == pdt.GameTypes.OMAHAHILO
+        assert not self.hilo or self.cards_per_player == 4,'Hi/lo is an Omaha game'
+        assert(self.n_players >= 2)
+        assert(self.starting_stack >= 1)
+        assert(self.cards_per_player >= 2)
+        assert(self.n_envs >= 1)
+        self.allocate()
+
+    def allocate(self):
+        N,P = self.n_envs,self.n_players
+        self.env_index = np.arange(N)
+        self.stacks = np.zeros((N,P))
+        self.street_totals = np.zeros((N,P))
+        self.totals = np.zeros((N,P))
+        self.status = np.zeros((N,P),dtype=np.int8)
+        self.handranks = np.zeros((N,P),dtype=np.int64)
+        self.hands = np.zeros((N,P,self.hand_width))
+        self.board = np.zeros((N,10))
+        self.pot = np.zeros(N)
+        self.street = np.zeros(N,dtype=np.int64)
+        self.current_index = np.zeros(N,dtype=np.int64)
+        self.players_remaining = np.zeros(N,dtype=np.int64)
+        self.aggressor_position = np.zeros(N,dtype=np.int64)
+        self.aggressor_action = np.zeros(N,dtype=np.int64)
+        self.aggressor_betsize = np.zeros(N)
+        self.last_action = np.zeros(N,dtype=np.int64)
+        self.decks = np.zeros((N,52),dtype=np.int64)
+        self.deck_position = np.zeros(N,dtype=np.int64)
+        self.history = np.zeros((N,self.maxlen,self.global_space))
+        self.history_length = np.zeros(N,dtype=np.int64)
+        self.rewards = np.zeros((N,P))
+        self.starting_index = np.array([pdt.Globals.STARTING_INDEX[P][street] for street in range(pdt.Street.PREFLOP,pdt.Street.RIVER+1)])
+
+    def seed(self,seed):
+        self.deck.seed(seed)
+
+    def reset(self):
+        """Resets every hand. Returns stacked state,obs,done,action_mask,betsize_mask"""
+        self.rewards[:] = 0
+        self.reset_hands(np.ones(self.n_envs,dtype=bool))
+        state,obs = self.return_state()
+        action_mask,betsize_mask = self.return_masks()
+        return state,obs,self.game_over(),action_mask,betsize_mask
+
+    def reset_hands(self,mask):
+        idx = np.where(mask)[0]
+        if idx.size == 0:
+            return
+        self.stacks[idx] = self.starting_stack
+        self.street_totals[idx] = 0
+        self.totals[idx] = 0
+        self.status[idx] = ACTIVE
+        self.handranks[idx] = 0
+        self.board[idx] = 0
+        self.pot[idx] = self.starting_pot
+        self.street[idx] = self.starting_street
+        self.current_index[idx] = pdt.Globals.STARTING_INDEX[self.n_players][self.starting_street]
+        self.players_remaining[idx] = self.n_players
+        self.aggressor_position[idx] = pdt.Globals.STARTING_INDEX[self.n_players][self.starting_street]
+        self.aggressor_action[idx],self.aggressor_betsize[idx] = pdt.Globals.STARTING_AGGRESSION[self.starting_street]
+        self.history[idx] = 0
+        self.history_length[idx] = 0
+        self.shuffle_decks(idx)
+        # Board
+        num_cards = pdt.Globals.INITIALIZE_BOARD_CARDS[self.starting_street]
+        if num_cards > 0:
+            self.board[idx,:num_cards*2] = self.deal(idx,num_cards)
+        # Hands
+        hands = self.deal(idx,self.cards_per_player*self.n_players)
+        self.hands[idx] = hands.reshape(idx.size,self.n_players,self.hand_width)
+        # Blinds
+        if self.starting_street == pdt.Street.PREFLOP:
+            self.update_state(idx,np.full(idx.size,pdt.Action.BET),np.full(idx.size,0.5),blind=pdt.Blind.POSTED)
+            self.update_state(idx,np.full(idx.size,pdt.Action.RAISE),np.full(idx.size,1.),blind=pdt.Blind.POSTED)
+        else:
+            self.store_global_state(idx,np.full(idx.size,self.dealer_position),pdt.Action.UNOPENED,np.zeros(idx.size),pdt.Blind.PADDING)
+
+    def shuffle_decks(self,idx):
+        """Decks are dealt from the end like poker_env.data_classes.Deck. Only the cards a hand can use are drawn"""
+        if self.to_shuffle:
+            num_cards = self.cards_per_player * self.n_players + 5
+            self.decks[idx,52 - num_cards:] = self.deck.deal_batch(idx.size,num_cards)[:,::-1]
+        else:
+            self.decks[idx] = np.arange(52)
+        self.deck_position[idx] = 52
+
+    def deal(self,idx,num_cards):
+        """Returns (len(idx),num_cards*2) alternating rank,suit"""
+        offsets = self.deck_position[idx,None] - 1 - np.arange(num_cards)
+        cards = self.decks[idx[:,None],offsets]
+        self.deck_position[idx] -= num_cards
+        dealt = np.empty((idx.size,num_cards*2))
+        dealt[:,::2] = cards // 4 + pdt.RANKS.LOW
+        dealt[:,1::2] = cards % 4 + pdt.SUITS.LOW
+        return dealt
+
+    def step(self,inputs):
+        """
+        Increments every hand with its action_category,betsize. Finished hands are reset.
+        inputs : dict of int arrays of shape (N,)
+        returns stacked state,obs,done,action_mask,betsize_mask. Rewards of finished hands are in self.rewards
+        """
+        action_category = np.asarray(inputs['action_category']).reshape(self.n_envs).astype(np.int64)
+        betsize_category = np.asarray(inputs['betsize']).reshape(self.n_envs).astype(np.int64)
+        idx = self.env_index
+        action = action_category + pdt.Action.OFFSET
+        betsize = self.return_betsize(idx,action,betsize_category)
+        self.update_state(idx,action,betsize)
+        round_over = self.round_over()
+        if round_over.any():
+            self.increment_street(np.where(round_over)[0])
+        done = self.game_over()
+        self.rewards[:] = 0
+        if done.any():
+            done_idx = np.where(done)[0]
+            self.resolve_outcome(done_idx)
+            self.rewards[done_idx] = self.stacks[done_idx] - self.starting_stack
+            self.reset_hands(done)
+        state,obs = self.return_state()
+        action_mask,betsize_mask = self.return_masks()
+        return state,obs,done,action_mask,betsize_mask
+
+    def next_position(self,positions):
+        return np.maximum((positions + 1) % (self.n_players + pdt.Action.OFFSET),1)
+
+    def player_values(self,idx,positions,values):
+        return values[idx,positions - 1]
+
+    def update_state(self,idx,action,betsize,blind=pdt.Blind.NO_BLIND):
+        """Same transition as Poker.update_state for the hands in idx"""
+        current = self.current_index[idx]
+        if blind != pdt.Blind.POSTED:
+            self.players_remaining[idx] -= 1
+        aggressive = (action == pdt.Action.RAISE) | (action == pdt.Action.BET)
+        if aggressive.any():
+            agg_idx = idx[aggressive]
+            self.aggressor_position[agg_idx] = current[aggressive]
+            self.aggressor_action[agg_idx] = action[aggressive]
+            self.aggressor_betsize[agg_idx] = betsize[aggressive]
+            if blind != pdt.Blind.POSTED:
+                self.players_remaining[agg_idx] = self.num_active_players(agg_idx) - 1
+        folds = action == pdt.Action.FOLD
+        if folds.any():
+            self.status[idx[folds],current[folds] - 1] = FOLDED
+        self.pot[idx] += betsize
+        self.stacks[idx,current - 1] -= betsize
+        self.street_totals[idx,current - 1] += betsize
+        self.totals[idx,current - 1] += betsize
+        assert (self.stacks[idx,current - 1] >= 0).all(),'Player stack below zero'
+        allin = self.stacks[idx,current - 1] == 0
+        self.status[idx[allin],current[allin] - 1] = ALLIN
+        self.increment_current_player_index(idx)
+        self.store_global_state(idx,current,action,betsize,blind)
+
+    def increment_current_player_index(self,idx):
+        self.current_index[idx] = self.next_position(self.current_index[idx])
+        for _ in range(self.n_players):
+            inactive = self.status[idx,self.current_index[idx] - 1] != ACTIVE
+            if not inactive.any():
+                break
+            self.current_index[idx[inactive]] = self.next_position(self.current_index[idx[inactive]])
+
+    def store_global_state(self,idx,last_position,last_action,last_betsize,blind):
+        """Writes a new global state row for each hand in idx"""
+        current = self.current_index[idx]
+        total_bet = self.street_totals[idx,self.aggressor_position[idx] - 1]
+        to_call = total_bet - self.street_totals[idx,current - 1]
+        pot = self.pot[idx]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            pot_odds = np.where(to_call == 0,0,to_call / (pot + to_call))
+        row = np.empty((idx.size,self.global_space))
+        row[:,:10] = self.board[idx]
+        row[:,10] = self.street[idx]
+        row[:,11] = self.aggressor_position[idx]
+        row[:,12] = self.aggressor_action[idx]
+        row[:,13] = self.aggressor_betsize[idx]
+        row[:,14] = last_position
+        row[:,15] = last_action
+        row[:,16] = last_betsize
+        row[:,17] = blind
+        row[:,18] = pot
+        row[:,19] = to_call
+        row[:,20] = pot_odds
+        position = current
+        for i in range(self.n_players):
+            start = 21 + i * 4
+            row[:,start] = position
+            row[:,start+1] = self.stacks[idx,position - 1]
+            row[:,start+2] = self.street_totals[idx,position - 1]
+            row[:,start+3] = self.status[idx,position - 1]
+            position = self.next_position(position)
+        self.history[idx,self.history_length[idx] % self.maxlen] = row
+        self.history_length[idx] += 1
+        self.last_action[idx] = last_action
+
+    def increment_street(self,idx):
+        self.street[idx] += 1
+        assert not (self.street[idx] > pdt.Street.RIVER).any(),'Street is greater than river'
+        self.street_totals[idx] = 0
+        self.update_board(idx)
+        self.players_remaining[idx] = self.num_active_players(idx)
+        self.street_starting_index(idx)
+        self.aggressor_position[idx] = self.starting_index[self.street[idx] - pdt.Street.PREFLOP]
+        self.aggressor_action[idx] = pdt.Action.UNOPENED
+        self.aggressor_betsize[idx] = 0
+        dealer = np.full(idx.size,self.dealer_position)
+        self.store_global_state(idx,dealer,pdt.Action.UNOPENED,np.zeros(idx.size),pdt.Blind.NO_BLIND)
+        # Fast forward to river if allin
+        showdown = idx[self.to_showdown(idx)]
+        if showdown.size > 0:
+            while True:
+                runout = showdown[self.street[showdown] < pdt.Street.RIVER]
+                if runout.size == 0:
+                    break
+                self.street[runout] += 1
+                self.update_board(runout)
+            self.store_global_state(showdown,dealer[:showdown.size],pdt.Action.UNOPENED,np.zeros(showdown.size),pdt.Blind.NO_BLIND)
+
+    def update_board(self,idx):
+        for street in (pdt.Street.FLOP,pdt.Street.TURN,pdt.Street.RIVER):
+            street_idx = idx[self.street[idx] == street]
+            if street_idx.size > 0:
+                start,end = pdt.Globals.BOARD_UPDATE[street]
+                self.board[street_idx,start:end] = self.deal(street_idx,pdt.Globals.ADDITIONAL_BOARD_CARDS[street])
+
+    def street_starting_index(self,idx):
+        self.current_index[idx] = self.starting_index[self.street[idx] - pdt.Street.PREFLOP]
+        inactive = idx[self.status[idx,self.current_index[idx] - 1] != ACTIVE]
+        for _ in range(self.n_players):
+            if inactive.size == 0:
+                break
+            self.current_index[inactive] = self.next_position(self.current_index[inactive])
+            inactive = inactive[self.status[inactive,self.current_index[inactive] - 1] != ACTIVE]
+
+    def num_active_players(self,idx=None):
+        status = self.status if idx is None else self.status[idx]
+        return (status == ACTIVE).sum(-1)
+
+    def num_folded_players(self,idx=None):
+        status = self.status if idx is None else self.status[idx]
+        return (status == FOLDED).sum(-1)
+
+    def to_showdown(self,idx):
+        status = self.status[idx]
+        return ((status == ACTIVE).sum(-1) == 0) & ((status == ALLIN).sum(-1) > 1)
+
+    def round_over(self):
+        return (self.players_remaining == 0) & (self.street != pdt.Street.RIVER) & (self.num_folded_players() != self.n_players - 1)
+
+    def game_over(self):
+        return ((self.players_remaining == 0) & (self.street == pdt.Street.RIVER)) | (self.num_folded_players() == self.n_players - 1)
+
+    def resolve_outcome(self,idx):
+        """Ranks the live hands of all finished hands in one evaluator call and awards the main pot and side pots"""
+        live = self.status[idx] != FOLDED
+        showdown = live.sum(-1) > 1
+        if self.hilo:
+            return self.resolve_hilo_outcome(idx,live,showdown)
+        env_rows,player_rows = np.where(live & showdown[:,None])
+        if env_rows.size:
+            boards = self.board[idx[env_rows]].reshape(-1,5,2)
+            hands = self.hands[idx[env_rows],player_rows].reshape(env_rows.size,-1,2)
+            ranks = np.zeros(live.shape)
+            ranks[env_rows,player_rows] = self.rank_hands(encode_cards(hands),encode_cards(boards))
+            self.handranks[idx] = ranks
+        for j,i in enumerate(idx):
+            if showdown[j]:
+                self.stacks[i] += split_pots(self.totals[i],live[j],ranks[j],self.pot[i] - self.totals[i].sum())
+            else:
+                self.stacks[i,np.where(live[j])[0][0]] += self.pot[i]
+
+    def resolve_hilo_outcome(self,idx,live,showdown):
+        """resolve_outcome for hi/lo, high and low ranks of every showdown in one evaluator call"""
+        ranks = np.zeros(live.shape,dtype=np.int64)
+        lo_ranks = np.full(live.shape,NO_LOW)
+        if showdown.any():
+            envs = idx[showdown]
+            hands = self.hands[envs].reshape(envs.size,self.n_players,-1,2)
+            hi,lo,_ = batch_hilo_showdowns(encode_cards(hands),encode_cards(self.board[envs].reshape(-1,5,2)))
+            ranks[showdown],lo_ranks[showdown] = hi,lo
+            ranks[~live] = 0
+            self.handranks[idx] = ranks
+        for j,i in enumerate(idx):
+            if showdown[j]:
+                self.stacks[i] += split_hilo_pots(self.totals[i],live[j],ranks[j],lo_ranks[j],NO_LOW,self.pot[i] - self.totals[i].sum())
+            else:
+                self.stacks[i,np.where(live[j])[0][0]] += self.pot[i]
+
+    def history_rows(self):
+        """Returns the last maxlen global states (N,maxlen,global_space), left padded, and the (N,maxlen) mask of valid rows"""
+        n_rows = np.minimum(self.history_length,self.maxlen)
+        order = (self.history_length[:,None] - self.maxlen + np.arange(self.maxlen)) % self.maxlen
+        valid = np.arange(self.maxlen)[None,:] >= (self.maxlen - n_rows)[:,None]
+        return self.history[self.env_index[:,None],order],valid
+
+    def hero_info(self):
+        """Returns (N,2+hand_width) position,stack,hand of the players to act"""
+        hero = self.current_index - 1
+        hero_info = np.empty((self.n_envs,2+self.hand_width))
+        hero_info[:,0] = self.current_index
+        hero_info[:,1] = self.stacks[self.env_index,hero]
+        hero_info[:,2:] = self.hands[self.env_index,hero]
+        return hero_info
+
+    def return_state(self):
+        """
+        Returns (N,maxlen,state_space) states and (N,maxlen,observation_space) observations, left padded.
+        obs is None unless params['build_obs'], use observation() to build it on demand.
+        """
+        states,valid = self.history_rows()
+        hero_info = self.hero_info()
+        hero_width = hero_info.shape[-1]
+        state = np.empty((self.n_envs,self.maxlen,self.state_space),dtype=self.dtype)
+        state[:,:,:hero_width] = hero_info[:,None]
+        state[:,:,hero_width:] = states
+        state[~valid] = 0
+        obs = self.observation() if self.build_obs else None
+        return state,obs
+
+    def observation(self):
+        """Returns (N,maxlen,observation_space) observations with every player's hand, left padded"""
+        N,P = self.n_envs,self.n_players
+        states,valid = self.history_rows()
+        hero_info = self.hero_info()
+        hero = self.current_index - 1
+        # Other players in seat order
+        others = np.arange(P)[None,:].repeat(N,0)
+        others = others[others != hero[:,None]].reshape(N,P-1)
+        obs_info = np.empty((N,P-1,2+self.hand_width))
+        obs_info[:,:,0] = others + 1
+        obs_info[:,:,1] = self.stacks[self.env_index[:,None],others]
+        obs_info[:,:,2:] = self.hands[self.env_index[:,None],others]
+        obs_info = obs_info.reshape(N,-1)
+        hero_width = hero_info.shape[-1]
+        obs_width = hero_width + obs_info.shape[-1]
+        obs = np.empty((N,self.maxlen,self.observation_space),dtype=self.dtype)
+        obs[:,:,:hero_width] = hero_info[:,None]
+        obs[:,:,hero_width:obs_width] = obs_info[:,None]
+        obs[:,:,obs_width:] = states
+        obs[~valid] = 0
+        return obs
+
+    def return_masks(self):
+        """Same semantics as Poker.return_masks, returns (N,5) action masks and (N,num_betsizes) betsize masks"""
+        hero_is_aggressor = self.aggressor_position == self.current_index
+        actions = np.where(hero_is_aggressor,self.last_action,self.aggressor_action)
+        available_categories = MASK_TABLE[actions]
+        available_betsizes = self.return_betsizes()
+        no_bets = available_betsizes.sum(-1) == 0
+        available_categories[no_bets,-2:] = 0
+        return available_categories,available_betsizes
+
+    def return_betsizes(self):
+        """Possible betsizes. Each row is filled up to and including the first size that puts the player allin"""
+        N = self.n_envs
+        idx = self.env_index
+        stack = self.player_values(idx,self.current_index,self.stacks)
+        hero_total = self.player_values(idx,self.current_index,self.street_totals)
+        aggressor_total = self.player_values(idx,self.aggressor_position,self.street_totals)
+        facing = self.aggressor_betsize > 0
+        last_betsize = np.where(self.aggressor_action == pdt.Action.RAISE,aggressor_total - hero_total,self.aggressor_betsize)
+        min_raise = 2 * last_betsize
+        max_raise = self.pot + last_betsize
+        facing_cutoff = (max_raise[:,None] * self.betsizes[None,:]) >= stack[:,None]
+        facing_cutoff[:,0] |= min_raise >= stack
+        unopened_cutoff = (self.betsizes[None,:] * self.pot[:,None]) >= stack[:,None]
+        cutoff = np.where(facing[:,None],facing_cutoff,unopened_cutoff)
+        last_index = np.where(cutoff.any(-1),cutoff.argmax(-1),self.num_betsizes - 1)
+        possible_betsizes = (np.arange(self.num_betsizes)[None,:] <= last_index[:,None]).astype(np.float64)
+        unopened = (self.aggressor_action == pdt.Action.UNOPENED) | (self.aggressor_action == pdt.Action.CHECK)
+        allowed = np.where(facing,last_betsize < stack,unopened)
+        possible_betsizes[~allowed] = 0
+        return possible_betsizes
+
+    def betsize_inputs(self,idx):
+        stack = self.player_values(idx,self.current_index[idx],self.stacks)
+        hero_total = self.player_values(idx,self.current_index[idx],self.street_totals)
+        aggressor_total = self.player_values(idx,self.aggressor_position[idx],self.street_totals)
+        return stack,hero_total,aggressor_total
+
+    ## LIMIT ##
+    def return_limit_betsize(self,idx,action,betsize_category):
+        stack,hero_total,aggressor_total = self.betsize_inputs(idx)
+        betsize = np.zeros(idx.size)
+        betsize = np.where(action == pdt.Action.CALL,np.minimum(stack,aggressor_total - hero_total),betsize)
+        betsize = np.where(action == pdt.Action.BET,np.minimum(1,stack),betsize)
+        betsize = np.where(action == pdt.Action.RAISE,np.minimum(aggressor_total + 1,stack) - hero_total,betsize)
+        return betsize
+
+    ## NO LIMIT ##
+    def return_nolimit_betsize(self,idx,action,betsize_category):
+        stack,hero_total,aggressor_total = self.betsize_inputs(idx)
+        pot = self.pot[idx]
+        sizes = self.betsizes[np.clip(betsize_category,0,self.num_betsizes - 1)]
+        max_raise = (2 * aggressor_total) + (pot - hero_total)
+        previous_bet = aggressor_total - hero_total
+        betsize = np.zeros(idx.size)
+        betsize = np.where(action == pdt.Action.CALL,np.minimum(previous_bet,stack),betsize)
+        betsize = np.where(action == pdt.Action.BET,np.minimum(np.maximum(1,sizes * pot),stack),betsize)
+        betsize = np.where(action == pdt.Action.RAISE,np.minimum(np.maximum(previous_bet * 2,sizes * max_raise),stack),betsize)
+        return betsize
+
+    ## POT LIMIT ##
+    def return_potlimit_betsize(self,idx,action,betsize_category):
+        stack,hero_total,aggressor_total = self.betsize_inputs(idx)
+        pot = self.pot[idx]
+        category = np.clip(betsize_category,0,self.num_betsizes - 1)
+        sizes = self.betsizes[category]
+        max_raise = (2 * aggressor_total) + (pot - hero_total)
+        previous_bet = aggressor_total - hero_total
+        min_raise = np.maximum(previous_bet,1) * 2
+        # np.linspace(min_raise,max_raise,num_betsizes)[category]
+        if self.num_betsizes > 1:
+            step = (max_raise - min_raise) / (self.num_betsizes - 1)
+            raise_sizes = np.where(category == self.num_betsizes - 1,max_raise,min_raise + category * step)
+        else:
+            raise_sizes = min_raise
+        betsize = np.zeros(idx.size)
+        betsize = np.where(action == pdt.Action.CALL,np.minimum(previous_bet,stack),betsize)
+        betsize = np.where(action == pdt.Action.BET,np.minimum(np.maximum(1,sizes * pot),stack),betsize)
+        betsize = np.where(action == pdt.Action.RAISE,np.minimum(np.maximum(previous_bet * 2,raise_sizes - hero_total),stack),betsize)
+        return betsize
+
+    def player_rewards(self):
+        """Rewards of the hands that finished on the last step, (N,n_players). Zero for unfinished hands"""
+        return self.rewards
+
+    @property
+    def current_player(self):
+        """Position ids of the players to act, (N,)"""
+        return self.current_index
+
+    @property
+    def action_space(self):
+        return 5
+
+    @property
+    def state_space(self):
+        return 31 + self.n_players * 4
+
+    @property
+    def betsize_space(self):
+        return len(self.betsizes)
+
+    @property
+    def observation_space(self):
+        return 21 + self.n_players * 4 + self.n_players * 10
+
+    @property
+    def global_space(self):
+        return 21 + self.n_players * 4
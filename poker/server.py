@@ -7,11 +7,11 @@ import numpy as np
 from torch import set_grad_enabled
 from torch import load
 from torch import device as D
-from pymongo import MongoClient
 from collections import defaultdict
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 
+from db import mongo_client,collection_writer
 from poker_env.env import Poker,flatten
 import poker_env.datatypes as pdt
 from poker_env.config import Config
@@ -71,8 +71,8 @@ class API(object):
             raise ValueError('File does not exist')
 
     def connect(self):
-        client = MongoClient('localhost', 27017,maxPoolSize=10000)
-        self.db = client.baseline
+        self.db = mongo_client().baseline
+        self.writers = {collection:collection_writer('baseline',collection) for collection in ['bot_data','player_stats','game_data']}
 
     def update_player_name(self,name:str):
         """updates player name"""
@@ -92,7 +92,7 @@ class API(object):
             'action_mask':action_mask.tolist(),
             'player':self.player['name']
         }
-        self.db['bot_data'].insert_one(outputs_json)
+        self.writers['bot_data'].put(outputs_json)
 
     def insert_into_db(self,training_data:dict):
         """
@@ -105,7 +105,7 @@ class API(object):
             'reward':training_data[self.player['position']][0]['rewards'][0],
             'position':self.player['position'],
         }
-        self.db['player_stats'].insert_one(stats_json)
+        self.writers['player_stats'].put(stats_json)
         keys = training_data.keys()
         positions = [position for position in keys if position in ['SB','BB']]  
         for position in positions:
@@ -143,12 +143,13 @@ class API(object):
                         'reward':rewards[step],
                         'value':values[step].tolist()
                     }
-                    self.db['game_data'].insert_one(state_json)
+                    self.writers['game_data'].put(state_json)
 
     def return_model_outputs(self):
         query = {
             'player':self.player['name']
         }
+        self.writers['bot_data'].flush()
         player_data = self.db['bot_data'].find(query).sort('_id',-1)
         action_probs = []
         values = []
@@ -189,6 +190,7 @@ class API(object):
             'player':self.player['name']
         }
         # projection ={'reward':1,'hand_num':1,'_id':0}
+        self.writers['player_stats'].flush()
         player_data = self.db['player_stats'].find(query)
         total_hands = self.db['player_stats'].count_documents(query)
         results = []
@@ -1,5 +1,22 @@
 import unittest
+import tempfile
+import os
+import numpy as np
+import torch
 import utils.cardlib as cb
+from itertools import combinations
+from utils.suit_isomorphism import canonicalize,canonical_key,relabel_suits,card_ids
+from utils.rank_cache import RankCache
+from utils.preflop_equity import build_table,save_table,PreflopEquity
+from poker_env.data_classes import split_hilo_pots
+from models.model_layers import HandStrength,ProcessHandBoard
+from utils.range_equity import range_vs_range,expand
+from utils.hand_buckets import build_street,save_street,sample_situations,draws,HandBuckets,FLUSH_DRAWS,STRAIGHT_DRAWS
+from poker_env.data_classes import CARD_TABLE
+
+def random_deals(n,n_cards,rng):
+    """(n,n_cards,2) [rank,suit] cards, each row drawn without replacement"""
+    return CARD_TABLE[np.stack([rng.permutation(52)[:n_cards] for _ in range(n)])]
 
 class TestCardlib(unittest.TestCase):
     @classmethod
@@ -41,6 +58,191 @@ class TestCardlib(unittest.TestCase):
         en_board = [cb.encode(card) for card in self.board]
         assert cb.holdem_winner(en_hand,en_hand2,en_board) == -1
 
+    def testHandranks(self):
+        en_hands = [[cb.encode(card) for card in self.omaha_hand],[cb.encode(card) for card in self.omaha_hand2[:4]]]
+        en_board = [cb.encode(card) for card in self.board]
+        assert cb.hand_ranks(en_hands,en_board) == [cb.hand_rank(hand,en_board) for hand in en_hands]
+        en_hands = [[cb.encode(card) for card in self.holdem_hand],[cb.encode(card) for card in self.holdem_hand2]]
+        assert cb.holdem_hand_ranks(en_hands,en_board) == [cb.holdem_hand_rank(hand,en_board) for hand in en_hands]
+
+    def testEncodeCards(self):
+        cards = np.array([[rank,suit] for rank in range(2,15) for suit in range(1,5)])
+        en_cards = cb.encode_cards(cards)
+        assert en_cards.tolist() == [cb.encode(card) for card in cards.tolist()]
+        assert np.array_equal(cb.decode_cards(en_cards),cards)
+        assert cb.encode_cards(cards.reshape(13,4,2)).shape == (13,4)
+        assert cb.encode_cards([[0,0]]).tolist() == [0]
+
+    def testBatch(self):
+        rng = np.random.default_rng(0)
+        cards = [[cb.encode([rank,suit]) for rank in range(2,15) for suit in range(1,5)][i] for i in rng.permuted(np.tile(np.arange(52),(64,1)),axis=1)[:,:13].ravel()]
+        cards = np.array(cards,dtype=np.int32).reshape(64,13)
+        hands1,hands2,boards = cards[:,:4],cards[:,4:8],cards[:,8:]
+        ranks = cb.batch_hand_ranks(hands1,boards)
+        assert ranks.tolist() == [cb.hand_rank(h.tolist(),b.tolist()) for h,b in zip(hands1,boards)]
+        ranks = cb.batch_holdem_hand_ranks(hands1[:,:2],boards)
+        assert ranks.tolist() == [cb.holdem_hand_rank(h.tolist(),b.tolist()) for h,b in zip(hands1[:,:2],boards)]
+        results = cb.batch_winners(hands1,hands2,boards)
+        assert results.tolist() == [cb.winner(h1.tolist(),h2.tolist(),b.tolist()) for h1,h2,b in zip(hands1,hands2,boards)]
+        results = cb.batch_holdem_winners(hands1[:,:2],hands2[:,:2],boards)
+        assert results.tolist() == [cb.holdem_winner(h1.tolist(),h2.tolist(),b.tolist()) for h1,h2,b in zip(hands1[:,:2],hands2[:,:2],boards)]
+
+    def testEquity(self):
+        aces = cb.encode_cards([[14,1],[14,2]])
+        kings = cb.encode_cards([[13,2],[13,3]])
+        board = np.array([cb.encode(card) for card in self.board])
+        wins,ties,losses,shares = cb.equity([aces,kings],board)
+        assert shares.tolist() == [0.,1.] and cb.holdem_winner(aces.tolist(),kings.tolist(),board.tolist()) == -1
+        # Turn and river are enumerated exactly and are deterministic
+        wins,ties,losses,shares = cb.equity([aces,kings],board[:3],seed=1)
+        assert np.array_equal(shares,cb.equity([aces,kings],board[:3],seed=2)[3])
+        assert np.allclose(wins + ties + losses,1) and np.isclose(shares.sum(),1)
+        # Preflop is sampled
+        wins,ties,losses,shares = cb.equity([aces,kings],iterations=200000)
+        assert abs(wins[0] - 0.8106) < 0.01 and abs(ties[0] - 0.0038) < 0.005
+        # Seeded runouts don't depend on the number of threads
+        shares = cb.equity([aces,kings],iterations=20000,n_threads=1,seed=3)[3]
+        assert np.array_equal(shares,cb.equity([aces,kings],iterations=20000,n_threads=3,seed=3)[3])
+        assert not np.array_equal(shares,cb.equity([aces,kings],iterations=20000,n_threads=1,seed=3,stream=1)[3])
+        omaha_hands = [[cb.encode(card) for card in self.omaha_hand],[cb.encode(card) for card in self.omaha_hand2[:4]],cb.encode_cards([[9,1],[8,1],[7,3],[6,3]]).tolist()]
+        wins,ties,losses,shares = cb.equity(omaha_hands,board[:4])
+        assert np.isclose(shares.sum(),1)
+        assert np.allclose(cb.equity(omaha_hands[:2],board)[3],[0,1])
+        # Invalid inputs raise instead of aborting in rusteval
+        for hands,cards in [([aces] * 7,()),([aces[:1],kings[:1]],board),([aces,kings],np.tile(board,2)),([aces,aces],board),([aces,kings],[0,0,0])]:
+            with self.assertRaises(ValueError):
+                cb.equity(hands,cards)
+        with self.assertRaises(ValueError):
+            cb.range_equity([aces],[kings],board[[0,0,1]])
+        with self.assertRaises(ValueError):
+            cb.range_equity([aces],[kings],board,owners_a=[1],n_ids_a=1)
+
+    def testHiLo(self):
+        board = cb.encode_cards([[13,3],[3,1],[4,2],[6,3],[7,4]])
+        low = cb.encode_cards([[14,1],[2,2],[11,3],[10,4]])
+        kings = cb.encode_cards([[13,1],[13,2],[12,3],[12,4]])
+        no_low_board = cb.encode_cards([[13,3],[3,1],[4,2],[10,3],[11,4]])
+        hi,lo,shares = cb.batch_hilo_showdowns(np.stack([[low,kings]] * 2),np.stack([board,no_low_board]))
+        assert np.array_equal(hi,cb.batch_hand_ranks(np.stack([low,kings] * 2),np.repeat([board,no_low_board],2,0)).reshape(2,2))
+        assert lo[0,0] == 1 and lo[0,1] == cb.NO_LOW and (lo[1] == cb.NO_LOW).all()
+        assert shares.tolist() == [[0.5,0.5],[0.,1.]]
+        # Side pot: the short stack scoops the low of the main pot only
+        won = split_hilo_pots([2,4,4],[True,True,True],[3,1,2],[0,cb.NO_LOW,1],cb.NO_LOW)
+        assert won.tolist() == [3.,5.,2.]
+
+    def testHandStrength(self):
+        rng = np.random.default_rng(1)
+        cards = random_deals(120,9,rng)
+        expected = cb.batch_hand_ranks(cb.encode_cards(cards[:,:4]),cb.encode_cards(cards[:,4:]))
+        x = torch.from_numpy(cards.reshape(3,40,18))
+        x[2,:,8:] = 0
+        best,hand_class = HandStrength()(x)
+        assert np.array_equal(best[:2].view(-1).numpy(),expected[:80])
+        assert (best[2] == HandStrength.NO_HAND).all() and (hand_class[2] == 0).all()
+        assert (hand_class[:2].sum(-1) == 1).all()
+        params = {'maxlen':10,'device':'cpu','exact_handstrength':True}
+        out = ProcessHandBoard(params,4)(x[:,:2].float())
+        assert out.shape == (3,2,128) and torch.equal(out[...,-HandStrength.N_CLASSES - 1],best[:,:2,0])
+
+    def testHandBuckets(self):
+        table = build_street('turn',n_situations=2000,n_buckets=4,n_rank_bins=8,n_runouts=8,n_villains=4,n_workers=1)
+        # Every key of the street has a bucket
+        n_keys = (len(table['edges']) + 1) * FLUSH_DRAWS * STRAIGHT_DRAWS
+        assert table['buckets'].shape == (n_keys,) and table['counts'].sum() == 2000 and table['centroids'].shape == (4,10)
+        assert set(table['buckets'].tolist()) == {0,1,2,3}
+        sampled = table['counts'] > 0
+        bucket_ehs = [np.average(table['ehs'][sampled & (table['buckets'] == i)],weights=table['counts'][sampled & (table['buckets'] == i)]) for i in range(4)]
+        assert bucket_ehs == sorted(bucket_ehs)
+        # Nut flush draw and three ranks (4,5,T) completing a straight
+        hand,board = CARD_TABLE[[[48,12,30,26]]],CARD_TABLE[[[20,16,3,45]]]
+        flush,straight = draws(card_ids(hand),card_ids(board))
+        assert flush.tolist() == [2] and straight.tolist() == [3]
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder,'buckets')
+            save_street(path,'turn',table)
+            buckets = HandBuckets(path,streets=('turn',))
+            hands,boards = sample_situations('turn',200,np.random.default_rng(1))
+            hands,boards = CARD_TABLE[hands],CARD_TABLE[boards]
+            keys = buckets.keys(hands,boards)
+            assert np.array_equal(buckets.bucket(hands,boards),table['buckets'][keys])
+            # Suit permutations share a key
+            permuted = lambda cards: np.stack((cards[...,0],cards[...,1] % 4 + 1),axis=-1)
+            assert np.array_equal(buckets.keys(permuted(hands),permuted(boards)),keys)
+            del buckets
+
+    def testRangeEquity(self):
+        board = np.array([[11,1],[4,2],[5,3],[2,4]])
+        board_ids = (board[:,0] - 2) * 4 + board[:,1] - 1
+        ids_a,ids_b = np.array([12000,500]),np.array([9000,16431])
+        matrix,equity_a,equity_b = range_vs_range((ids_a,[1,1]),(ids_b,[1,3]),board,iterations=100)
+        combos_a,owners_a = expand(ids_a,board_ids)
+        combos_b,owners_b = expand(ids_b,board_ids)
+        shares = np.zeros((2,2))
+        pairs = np.zeros((2,2))
+        for hand_a,i in zip(combos_a,owners_a):
+            for hand_b,j in zip(combos_b,owners_b):
+                if not np.intersect1d(hand_a,hand_b).size:
+                    shares[i,j] += cb.equity(cb.encode_cards(CARD_TABLE[[hand_a,hand_b]]),cb.encode_cards(board))[3][0]
+                    pairs[i,j] += 1
+        assert np.allclose(matrix,shares / pairs)
+        assert np.allclose(equity_a,(shares * [1,3]).sum(1) / (pairs * [1,3]).sum(1))
+        assert np.allclose(equity_b,((pairs - shares) * [[1],[1]]).sum(0) / pairs.sum(0))
+        # Runouts are split over threads, tallies don't depend on how many
+        sampled = range_vs_range((ids_a,[1,1]),(ids_b,[1,3]),board[:3],iterations=200,n_threads=3,seed=2)
+        assert np.array_equal(sampled[0],range_vs_range((ids_a,[1,1]),(ids_b,[1,3]),board[:3],iterations=200,n_threads=1,seed=2)[0])
+
+    def testSuitIsomorphism(self):
+        hands = CARD_TABLE[np.array(list(combinations(range(52),2)))]
+        keys = canonical_key(hands,np.zeros((len(hands),0,2),dtype=int))
+        assert len(np.unique(keys)) == 169
+        rng = np.random.default_rng(0)
+        cards = random_deals(100,9,rng)
+        cards[:,7:] = 0
+        permuted = cards.copy()
+        permuted[...,1] = np.where(cards[...,1] > 0,rng.permutation(4)[cards[...,1] - 1] + 1,0)
+        permuted[:,:4] = permuted[:,3::-1]
+        hand,board,key = canonicalize(cards[:,:4],cards[:,4:])
+        permuted_hand,permuted_board,permuted_key = canonicalize(permuted[:,:4],permuted[:,4:])
+        assert np.array_equal(key,permuted_key) and np.array_equal(hand,permuted_hand) and np.array_equal(board,permuted_board)
+        assert np.array_equal(relabel_suits(np.array([[3,3,1,4,1]])),[[1,1,2,3,2]])
+        assert np.array_equal(relabel_suits(np.array([[0,2,0,3]])),[[0,1,0,2]])
+        single_hand,single_board,single_key = canonicalize(torch.tensor(cards[0,:2]),torch.tensor(cards[0,4:6]))
+        assert isinstance(single_key,torch.Tensor) and single_key.dim() == 0
+        assert single_key.item() == canonical_key(cards[:1,:2],cards[:1,4:6])[0]
+
+    def testRankCache(self):
+        rng = np.random.default_rng(0)
+        cards = random_deals(200,9,rng)
+        expected = cb.batch_hand_ranks(cb.encode_cards(cards[:,:4]),cb.encode_cards(cards[:,4:]))
+        cache = RankCache(capacity=150)
+        assert np.array_equal(cache.ranks(cards[:,:4],cards[:,4:]),expected)
+        assert len(cache) == 150 and cache.misses == 200
+        assert np.array_equal(cache.ranks(cards[-100:,:4],cards[-100:,4:]),expected[-100:])
+        assert cache.hits == 100 and cache.misses == 200
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder,'ranks.npy')
+            cache.save(path)
+            disk_cache = RankCache(capacity=10,path=path)
+            assert np.array_equal(disk_cache.ranks(cards[:,:4],cards[:,4:]),expected)
+            assert disk_cache.disk_hits == 150 and disk_cache.misses == 50
+            del disk_cache
+
+    def testPreflopEquity(self):
+        aces = np.array([[14,1],[14,2],[13,1],[13,2]])
+        ids = [0,16431]
+        keys,table = build_table(n_samples=200,ranges=(0.1,),n_workers=1,hands=ids)
+        assert len(keys) == 16432 and table.shape == (16432,2)
+        assert np.isnan(table[1:-1]).all()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder,'preflop')
+            save_table(path,keys,table,(0.1,))
+            preflop = PreflopEquity(path)
+            quads = np.array([[[2,suit] for suit in range(1,5)],[[14,suit] for suit in range(4,0,-1)]])
+            assert np.array_equal(preflop.hand_ids(quads),ids)
+            assert preflop.equity(quads)[0] < 0.25 and preflop.equity(quads,1)[1] > preflop.equity(quads,1)[0]
+            assert preflop.hand_ids(aces) == preflop.hand_ids(aces[[1,0,3,2]] + [0,2])
+            del preflop
+
 def cardlibTestSuite():
     suite = unittest.TestSuite()
     suite.addTest(TestEnv('testEncode'))
@@ -49,6 +251,17 @@ def cardlibTestSuite():
     suite.addTest(TestEnv('testHandrank'))
     suite.addTest(TestEnv('testHoldemHandrank'))
     suite.addTest(TestEnv('testHoldemWinner'))
+    suite.addTest(TestEnv('testHandranks'))
+    suite.addTest(TestEnv('testEncodeCards'))
+    suite.addTest(TestEnv('testBatch'))
+    suite.addTest(TestEnv('testEquity'))
+    suite.addTest(TestEnv('testHiLo'))
+    suite.addTest(TestEnv('testHandStrength'))
+    suite.addTest(TestEnv('testHandBuckets'))
+    suite.addTest(TestEnv('testRangeEquity'))
+    suite.addTest(TestEnv('testSuitIsomorphism'))
+    suite.addTest(TestEnv('testRankCache'))
+    suite.addTest(TestEnv('testPreflopEquity'))
     return suite
 
 if __name__ == "__main__":
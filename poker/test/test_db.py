@@ -0,0 +1,138 @@
+import unittest
+import threading
+import tempfile
+import torch
+from torch import optim
+from db import BufferedWriter
+from trajectory_store import NpyStore,return_store
+from train import generate_trajectories,dual_learning_update,batch_learning_update,return_env
+from models.networks import OmahaActor,OmahaObsQCritic
+from models.model_utils import hard_update
+from poker_env.env import Poker
+from poker_env.config import Config
+import poker_env.datatypes as pdt
+
+class Collection(object):
+    """Records the insert_many batches, blocks while gate is cleared"""
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def insert_many(self,documents,ordered=True):
+        assert ordered == False
+        self.gate.wait()
+        self.batches.append(list(documents))
+
+class TestDB(unittest.TestCase):
+    def testBufferedWriter(self):
+        collection = Collection()
+        writer = BufferedWriter(collection,max_batch=4,flush_interval=60)
+        for i in range(10):
+            writer.put({'step':i})
+        writer.flush()
+        assert [len(batch) for batch in collection.batches] == [4,4,2]
+        assert [doc['step'] for batch in collection.batches for doc in batch] == list(range(10))
+        writer.close()
+        self.assertRaises(ValueError,writer.put,{'step':10})
+        writer.flush()
+
+    def testFlushInterval(self):
+        collection = Collection()
+        writer = BufferedWriter(collection,max_batch=100,flush_interval=0.01)
+        writer.put({'step':0})
+        writer.queue.join()
+        assert collection.batches == [[{'step':0}]]
+        writer.close()
+
+    def testBackpressure(self):
+        collection = Collection()
+        collection.gate.clear()
+        writer = BufferedWriter(collection,max_batch=1,flush_interval=60,max_queue=2)
+        producer = threading.Thread(target=lambda:[writer.put({'step':i}) for i in range(6)])
+        producer.start()
+        producer.join(0.2)
+        # One document in the blocked insert and two queued, the producer waits
+        assert producer.is_alive()
+        collection.gate.set()
+        producer.join()
+        writer.close()
+        assert len(collection.batches) == 6
+
+    def testNpyStore(self):
+        game_object = pdt.Globals.GameTypeDict[pdt.GameTypes.OMAHAHI]
+        config = Config()
+        env_params = {
+            'game':pdt.GameTypes.OMAHAHI,
+            'betsizes': game_object.rule_params['betsizes'],
+            'bet_type': game_object.rule_params['bettype'],
+            'n_players': 2,
+            'pot':1,
+            'stacksize': 5.,
+            'cards_per_player': game_object.state_params['cards_per_player'],
+            'starting_street': game_object.starting_street,
+            'global_mapping':config.global_mapping,
+            'state_mapping':config.state_mapping,
+            'obs_mapping':config.obs_mapping,
+            'shuffle':True
+        }
+        env = Poker(env_params)
+        network_params = config.network_params
+        network_params['device'] = torch.device('cpu')
+        nS,nA,nB = env.state_space,env.action_space,env.betsize_space
+        actor,target_actor = OmahaActor(1,nS,nA,nB,network_params),OmahaActor(1,nS,nA,nB,network_params)
+        critic,target_critic = OmahaObsQCritic(1,nS,nA,nB,network_params),OmahaObsQCritic(1,nS,nA,nB,network_params)
+        hard_update(actor,target_actor)
+        hard_update(critic,target_critic)
+        with tempfile.TemporaryDirectory() as path:
+            training_params = {'training_round':3,'game':pdt.GameTypes.OMAHAHI,'generate_epochs':4,'store':'npy','store_path':path}
+            for id in range(2):
+                generate_trajectories(env,target_actor,target_critic,training_params,id)
+            store = return_store(training_params)
+            assert isinstance(store,NpyStore)
+            data = store.get_data({'training_round':3},{'state':1,'obs':1,'action':1,'reward':1,'_id':0})
+            assert len(data) >= 8 and set(data[0].keys()) == {'state','obs','action','reward'}
+            assert {row['poker_round'] for row in store.get_data({'training_round':3})} == set(range(8))
+            assert all(row['state'].shape[:2] == (1,row['obs'].shape[1]) for row in data)
+            assert isinstance(data[0]['action'],int)
+            first = store.get_data({'training_round':3,'poker_round':0})
+            assert first and all(row['poker_round'] == 0 for row in first)
+            assert store.get_data({'training_round':4}) == []
+            # Same trajectories from the worker process env
+            async_params = dict(training_params,training_round=5,async_env=True,env_params=env_params,seed=0)
+            async_env = return_env(env,async_params,0)
+            try:
+                generate_trajectories(async_env,target_actor,target_critic,async_params,0)
+            finally:
+                async_env.close()
+            async_data = store.get_data({'training_round':5},{'state':1,'obs':1,'action':1,'reward':1,'_id':0})
+            assert {row['poker_round'] for row in store.get_data({'training_round':5})} == set(range(4))
+            assert all(row['state'].shape[:2] == (1,row['obs'].shape[1]) for row in async_data)
+            learning_params = {
+                'training_round':3,
+                'learning_rounds':1,
+                'device':torch.device('cpu'),
+                'gradient_clip':config.agent_params['CLIP_NORM'],
+                'actor_optimizer':optim.Adam(actor.parameters(),lr=1e-4),
+                'critic_optimizer':optim.Adam(critic.parameters(),lr=1e-4),
+                'store':'npy',
+                'store_path':path
+            }
+            before = [p.detach().clone() for p in critic.parameters()]
+            dual_learning_update(actor,critic,target_actor,target_critic,learning_params)
+            assert any(not torch.equal(a,b) for a,b in zip(before,critic.parameters()))
+            batch_learning_update(actor,critic,target_actor,target_critic,learning_params)
+            store.clean_db()
+            assert store.get_data({'training_round':3}) == []
+
+def dbTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(TestDB('testBufferedWriter'))
+    suite.addTest(TestDB('testFlushInterval'))
+    suite.addTest(TestDB('testBackpressure'))
+    suite.addTest(TestDB('testNpyStore'))
+    return suite
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(dbTestSuite())
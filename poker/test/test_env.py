@@ -5,9 +5,12 @@ import unittest
 import numpy as np
 import os
 import copy
+import tempfile
 
 from models.networks import OmahaActor,OmahaQCritic,OmahaObsQCritic,CombinedNet
 from poker_env.env import Poker,Status
+from poker_env.data_classes import Deck,derive_seed,split_pots
+from poker_env.episode_log import write_episodes,read_episodes
 from poker_env.config import Config
 import poker_env.datatypes as pdt
 from utils.cardlib import winner,holdem_winner,encode
@@ -772,6 +775,161 @@ class TestEnv(unittest.TestCase):
         betsize = env.return_potlimit_betsize(action=4,betsize_category=1)
         assert betsize == 2
 
+    def testDeck(self):
+        params = copy.deepcopy(self.env_params)
+        params['shuffle'] = True
+        params['seed'] = 7
+        env = Poker(params)
+        env2 = Poker(params)
+        for _ in range(5):
+            state,obs,done,mask,betsize_mask = env.reset()
+            state2,obs2,done2,mask2,betsize_mask2 = env2.reset()
+            assert np.array_equal(obs,obs2)
+        env2.seed(derive_seed(7,0,1))
+        env.reset()
+        env2.reset()
+        assert env.players['SB'].hand != env2.players['SB'].hand
+        deck = Deck(0)
+        deck.shuffle()
+        cards = deck.deal_ids(52)
+        assert len(deck) == 0
+        assert len(set(cards.tolist())) == 52
+        batch = deck.deal_batch(100,13)
+        assert batch.shape == (100,13)
+        assert all(len(set(row)) == 13 for row in batch.tolist())
+        full = deck.deal_batch(2,52)
+        assert full.shape == (2,52) and all(sorted(row) == list(range(52)) for row in full.tolist())
+
+    def testSnapshot(self):
+        env = Poker(self.env_params)
+        env.reset()
+        env.step(ACTION_RAISE)
+        snapshot = env.snapshot()
+        state,obs,done,mask,betsize_mask = [copy.copy(output) for output in env.step(ACTION_CALL)]
+        env.step(ACTION_BET)
+        env.step(ACTION_FOLD)
+        assert env.snapshot() != snapshot
+        env.restore(snapshot)
+        assert env.snapshot() == snapshot
+        assert hash(env.snapshot()) == hash(snapshot)
+        state2,obs2,done2,mask2,betsize_mask2 = env.step(ACTION_CALL)
+        assert np.array_equal(state,state2)
+        assert np.array_equal(obs,obs2)
+        assert np.array_equal(mask,mask2)
+        assert np.array_equal(betsize_mask,betsize_mask2)
+        assert env.players.num_folded_players == 0
+        with self.assertRaises(ValueError):
+            snapshot.table[0,0] = 0
+
+    def testEpisodeLog(self):
+        params = copy.deepcopy(self.env_params)
+        params['shuffle'] = True
+        params['seed'] = 3
+        params['log_episodes'] = True
+        env = Poker(params)
+        replay_env = Poker(params)
+        rng = np.random.default_rng(0)
+        for _ in range(10):
+            states = []
+            state,obs,done,mask,betsize_mask = env.reset()
+            while not done:
+                action_category = int(rng.choice(np.where(mask)[0]))
+                betsize = int(rng.choice(np.where(betsize_mask)[0])) if action_category > 2 else 0
+                states.append((copy.copy(obs),action_category,betsize))
+                state,obs,done,mask,betsize_mask = env.step({'action_category':action_category,'betsize':betsize})
+            log = env.episode_log()
+            assert len(log) < 64
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory,'episodes.bin')
+                write_episodes(path,[log,log])
+                logs = list(read_episodes(path))
+            assert logs == [log,log]
+            replayed = [(copy.copy(obs),action_category,betsize) for state,obs,mask,betsize_mask,action_category,betsize in replay_env.replay(log)]
+            assert len(replayed) == len(states)
+            for (obs,action_category,betsize),(obs2,action_category2,betsize2) in zip(states,replayed):
+                assert np.array_equal(obs,obs2)
+                assert (action_category,betsize) == (action_category2,betsize2)
+            assert replay_env.player_rewards() == env.player_rewards()
+
+    def testExpectedPayoff(self):
+        params = copy.deepcopy(self.env_params)
+        params['starting_street'] = pdt.Street.TURN
+        params['expected_payoff'] = True
+        params['shuffle'] = True
+        params['seed'] = 1
+        env = Poker(params)
+        env.reset()
+        # Same as the chip rewards until an allin showdown
+        assert env.player_rewards(expected=True) == env.player_rewards()
+        for action in [ACTION_BET,ACTION_RAISE,ACTION_RAISE,ACTION_CALL]:
+            state,obs,done,mask,betsize_mask = env.step(action)
+        assert done
+        assert env.allin_board[-2:] == [0,0]
+        rewards = env.player_rewards()
+        expected_rewards = env.player_rewards(expected=True)
+        assert np.isclose(sum(rewards.values()),sum(expected_rewards.values()))
+        # Enumerate the river by hand
+        en_board = [encode(env.allin_board[i*2:(i*2)+2]) for i in range(4)]
+        en_hands = [[encode(card) for card in env.players[position].hand] for position in ['SB','BB']]
+        dealt = set(map(tuple,env.players['SB'].hand + env.players['BB'].hand + np.reshape(env.allin_board[:8],(4,2)).tolist()))
+        sb_won = 0
+        rivers = [[rank,suit] for rank in range(2,15) for suit in range(1,5) if (rank,suit) not in dealt]
+        for river in rivers:
+            result = winner(en_hands[0],en_hands[1],en_board + [encode(river)])
+            sb_won += {1:1.,0:0.5,-1:0.}[result] * env.pot
+        assert np.isclose(expected_rewards['SB'],sb_won / len(rivers) - self.env_params['stacksize'])
+
+    def testExpectedPayoffSampling(self):
+        # Sampled runouts come from their own stream, the deals match an env without expected payoffs
+        params = copy.deepcopy(self.env_params)
+        params['starting_street'] = pdt.Street.FLOP
+        params['shuffle'] = True
+        params['seed'] = 3
+        env = Poker(params)
+        params['expected_payoff'] = True
+        params['equity_samples'] = 50
+        expected_env = Poker(params)
+        for _ in range(3):
+            for poker_env in (env,expected_env):
+                poker_env.reset()
+                for action in [ACTION_BET,ACTION_RAISE,ACTION_RAISE,ACTION_CALL]:
+                    poker_env.step(action)
+            assert env.board == expected_env.board
+            assert np.array_equal(env.players.hands,expected_env.players.hands)
+            assert env.player_rewards() == expected_env.player_rewards()
+            assert np.isclose(sum(expected_env.player_rewards(expected=True).values()),sum(env.player_rewards().values()))
+
+    def testSidePots(self):
+        assert np.allclose(split_pots([2,5,5],[True,True,True],[1,3,2],dead_money=1),[7,0,6])
+        assert np.allclose(split_pots([5,1,5],[True,False,True],[5,1,5]),[5.5,0,5.5])
+        assert np.allclose(split_pots([2,4,2],[True,False,True],[1,0,2]),[8,0,0])
+        params = copy.deepcopy(self.env_params)
+        params['n_players'] = 3
+        env = Poker(params)
+        env.reset()
+        for action in [ACTION_RAISE,ACTION_CALL,ACTION_CALL]:
+            state,obs,done,mask,betsize_mask = env.step(action)
+        assert done
+        rewards = env.player_rewards()
+        assert set(rewards.keys()) == {'SB','BB','BTN'}
+        assert np.isclose(sum(rewards.values()),params['pot'])
+
+    def testFloat32State(self):
+        params = copy.deepcopy(self.env_params)
+        params['dtype'] = np.float32
+        params['build_obs'] = False
+        env = Poker(params)
+        reference_env = Poker(self.env_params)
+        state,obs,done,mask,betsize_mask = env.reset()
+        reference_state,reference_obs,_,_,_ = reference_env.reset()
+        assert obs is None
+        assert state.dtype == np.float32
+        assert np.allclose(state,reference_state)
+        assert np.allclose(env.observation(),reference_obs)
+        tensor = torch.from_numpy(state)
+        env.step(ACTION_CALL)
+        assert np.shares_memory(tensor.numpy(),env.state_buffer)
+
     # def testOutcome(self):
     #     params = self.env_params
     #     params['stacksize'] = 5
@@ -812,6 +970,13 @@ def envTestSuite():
     suite.addTest(TestEnv('testPreflop'))
     suite.addTest(TestEnv('testBetsizing'))
     suite.addTest(TestEnv('testOutcome'))
+    suite.addTest(TestEnv('testDeck'))
+    suite.addTest(TestEnv('testSnapshot'))
+    suite.addTest(TestEnv('testEpisodeLog'))
+    suite.addTest(TestEnv('testExpectedPayoff'))
+    suite.addTest(TestEnv('testExpectedPayoffSampling'))
+    suite.addTest(TestEnv('testSidePots'))
+    suite.addTest(TestEnv('testFloat32State'))
     return suite
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+import numpy as np
+import unittest
+import copy
+
+from poker_env.env import Poker
+from poker_env.vector_env import VectorPoker
+from poker_env.async_vector_env import AsyncVectorPoker,AsyncPoker
+from poker_env.config import Config
+import poker_env.datatypes as pdt
+
+def random_inputs(rng,action_masks,betsize_masks):
+    """Picks a random legal action_category,betsize for every row"""
+    action_categories = []
+    betsizes = []
+    for action_mask,betsize_mask in zip(action_masks,betsize_masks):
+        action_category = int(rng.choice(np.where(action_mask)[0]))
+        betsize = 0
+        if action_category > 2:
+            betsize = int(rng.choice(np.where(betsize_mask)[0]))
+        action_categories.append(action_category)
+        betsizes.append(betsize)
+    return action_categories,betsizes
+
+class TestVectorEnv(unittest.TestCase):
+    @classmethod
+    def setUp(self):
+        game_object = pdt.Globals.GameTypeDict[pdt.GameTypes.OMAHAHI]
+        config = Config()
+        self.env_params = {
+            'game':pdt.GameTypes.OMAHAHI,
+            'betsizes': game_object.rule_params['betsizes'],
+            'bet_type': game_object.rule_params['bettype'],
+            'n_players': 2,
+            'pot':1,
+            'stacksize': 5.,
+            'cards_per_player': game_object.state_params['cards_per_player'],
+            'starting_street': game_object.starting_street,
+            'global_mapping':config.global_mapping,
+            'state_mapping':config.state_mapping,
+            'obs_mapping':config.obs_mapping,
+            'shuffle':False
+        }
+
+    def compare(self,params,n_envs=8,n_steps=120):
+        rng = np.random.default_rng(0)
+        vector_env = VectorPoker(params,n_envs)
+        envs = [Poker(params) for _ in range(n_envs)]
+        outputs = [env.reset() for env in envs]
+        vector_outputs = vector_env.reset()
+        for _ in range(n_steps):
+            state,obs,done,action_mask,betsize_mask = vector_outputs
+            for i,(e_state,e_obs,e_done,e_action_mask,e_betsize_mask) in enumerate(outputs):
+                M = min(e_state.shape[1],vector_env.maxlen)
+                self.assertTrue(np.allclose(state[i,-M:],e_state[0,-M:]))
+                self.assertTrue(np.allclose(obs[i,-M:],e_obs[0,-M:]))
+                self.assertTrue(np.all(state[i,:-M] == 0))
+                self.assertTrue(np.array_equal(action_mask[i],e_action_mask))
+                self.assertTrue(np.array_equal(betsize_mask[i],e_betsize_mask))
+            self.assertTrue(np.array_equal(vector_env.current_player,[pdt.Globals.NAME_INDEX[env.current_player] for env in envs]))
+            action_categories,betsizes = random_inputs(rng,action_mask,betsize_mask)
+            vector_outputs = vector_env.step({'action_category':action_categories,'betsize':betsizes})
+            outputs = []
+            for i,env in enumerate(envs):
+                output = env.step({'action_category':action_categories[i],'betsize':betsizes[i]})
+                self.assertEqual(bool(vector_outputs[2][i]),output[2])
+                if output[2]:
+                    rewards = [env.players[position].stack - env.starting_stack for position in env.players.initial_positions]
+                    self.assertTrue(np.allclose(vector_env.player_rewards()[i],rewards))
+                    output = env.reset()
+                outputs.append(output)
+
+    def testShapes(self):
+        vector_env = VectorPoker(self.env_params,4)
+        state,obs,done,action_mask,betsize_mask = vector_env.reset()
+        assert state.shape == (4,vector_env.maxlen,vector_env.state_space)
+        assert obs.shape == (4,vector_env.maxlen,vector_env.observation_space)
+        assert action_mask.shape == (4,vector_env.action_space)
+        assert betsize_mask.shape == (4,vector_env.betsize_space)
+        assert not done.any()
+
+    def testMatchesPoker(self):
+        self.compare(self.env_params)
+
+    def testBetTypes(self):
+        for bet_type in [pdt.LimitTypes.LIMIT,pdt.LimitTypes.NO_LIMIT]:
+            params = copy.deepcopy(self.env_params)
+            params['bet_type'] = bet_type
+            self.compare(params,n_steps=60)
+
+    def testStreets(self):
+        for street in [pdt.Street.FLOP,pdt.Street.RIVER]:
+            params = copy.deepcopy(self.env_params)
+            params['starting_street'] = street
+            self.compare(params,n_steps=60)
+
+    def testThreePlayers(self):
+        params = copy.deepcopy(self.env_params)
+        params['n_players'] = 3
+        self.compare(params)
+
+    def testHiLo(self):
+        params = copy.deepcopy(self.env_params)
+        params['game'] = pdt.GameTypes.OMAHAHILO
+        params['n_players'] = 3
+        self.compare(params)
+
+    def testAsync(self):
+        rng = np.random.default_rng(0)
+        vector_env = VectorPoker(self.env_params,6)
+        async_env = AsyncVectorPoker(self.env_params,6,n_workers=2)
+        try:
+            outputs = vector_env.reset()
+            async_outputs = async_env.reset()
+            for _ in range(30):
+                for output,async_output in zip(outputs,async_outputs):
+                    self.assertTrue(np.array_equal(output,async_output))
+                self.assertTrue(np.array_equal(vector_env.current_player,async_env.current_player))
+                self.assertTrue(np.array_equal(vector_env.player_rewards(),async_env.player_rewards()))
+                action_categories,betsizes = random_inputs(rng,outputs[3],outputs[4])
+                inputs = {'action_category':action_categories,'betsize':betsizes}
+                outputs = vector_env.step(inputs)
+                async_outputs = async_env.step(inputs)
+        finally:
+            async_env.close()
+
+    def testAsyncPoker(self):
+        # Single hand contract, step for step the same as Poker over several hands
+        rng = np.random.default_rng(1)
+        env = Poker(self.env_params)
+        async_env = AsyncPoker(self.env_params)
+        try:
+            for _ in range(4):
+                outputs = env.reset()
+                async_outputs = async_env.reset()
+                done = False
+                while not done:
+                    state,obs,done,action_mask,betsize_mask = outputs
+                    for output,async_output in zip(outputs,async_outputs):
+                        self.assertTrue(np.array_equal(output,async_output))
+                    self.assertEqual(env.current_player,async_env.current_player)
+                    action_categories,betsizes = random_inputs(rng,[action_mask],[betsize_mask])
+                    inputs = {'action_category':action_categories[0],'betsize':betsizes[0]}
+                    outputs = env.step(inputs)
+                    async_outputs = async_env.step(inputs)
+                    done = outputs[2]
+                    self.assertEqual(done,async_outputs[2])
+                self.assertEqual(env.player_rewards(),async_env.player_rewards())
+        finally:
+            async_env.close()
+
+def vectorEnvTestSuite():
+    suite = unittest.TestSuite()
+    suite.addTest(TestVectorEnv('testShapes'))
+    suite.addTest(TestVectorEnv('testMatchesPoker'))
+    suite.addTest(TestVectorEnv('testBetTypes'))
+    suite.addTest(TestVectorEnv('testStreets'))
+    suite.addTest(TestVectorEnv('testThreePlayers'))
+    suite.addTest(TestVectorEnv('testHiLo'))
+    suite.addTest(TestVectorEnv('testAsync'))
+    suite.addTest(TestVectorEnv('testAsyncPoker'))
+    return suite
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(vectorEnvTestSuite())
@@ -45,6 +45,7 @@ def tournament(env,agent1,agent2,model_names,training_params):
                 actor_outputs = agent_positions[env.current_player](state,action_mask,betsize_mask)
                 street = pdt.Globals.STREET_DICT[state[:,-1,env.state_mapping['street']][0]]
                 if street == pdt.StreetStrs.RIVER:
+                    obs = env.observation()
                     if agent_loc[env.current_player] == hero:
                         hero_handstrength = hardcode_handstrength(torch.from_numpy(obs[:,-1,env.obs_mapping['hand_board']][:,None,:]))[0][0][0]
                         villain_handstrength = hardcode_handstrength(torch.from_numpy(obs[:,-1,env.obs_mapping['villain_board']][:,None,:]))[0][0][0]
@@ -145,7 +146,9 @@ if __name__ == "__main__":
         'global_mapping':config.global_mapping,
         'state_mapping':config.state_mapping,
         'obs_mapping':config.obs_mapping,
-        'shuffle':True
+        'shuffle':True,
+        'dtype':np.float32,
+        'build_obs':False
     }
     print(f'Environment Parameters: Starting street: {env_params["starting_street"]},\
         Stacksize: {env_params["stacksize"]},\
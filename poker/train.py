@@ -6,7 +6,6 @@ import torch
 import torch.nn.functional as F
 import sys
 import numpy as np
-from pymongo import MongoClient
 from collections import defaultdict
 import copy
 import time
@@ -18,8 +17,10 @@ from utils.data_loaders import return_trajectoryloader
 from utils.utils import return_latest_baseline_path,return_next_baseline_path
 from models.model_utils import scale_rewards,soft_update,copy_weights,load_weights
 from tournament import tournament
-from db import MongoDB
+from trajectory_store import return_store
 from poker_env.env import Poker
+from poker_env.async_vector_env import AsyncPoker
+from poker_env.data_classes import derive_seed
 import torch.autograd.profiler as profiler
 
 def pad_state(state,maxlen):
@@ -71,17 +72,17 @@ def generate_vs_frozen(env,actor,critic,villain,training_params,id):
                 state,obs,done,action_mask,betsize_mask = env.step(actor_outputs)
                 cur_player = env.current_player
                 if not done and agent_loc[cur_player]:
-                    trajectory[cur_player]['states'].append(state)
+                    trajectory[cur_player]['states'].append(copy.copy(state))
                     trajectory[cur_player]['obs'].append(copy.copy(obs))
                     trajectory[cur_player]['action_masks'].append(action_mask)
                     trajectory[cur_player]['betsize_masks'].append(betsize_mask)
             assert len(trajectory[cur_player]['betsize']) == len(trajectory[cur_player]['betsize_masks'])
-            rewards = env.player_rewards()
+            rewards = env.player_rewards(expected=env.expected_payoff)
             for position in trajectory.keys():
                 N = len(trajectory[position]['betsize_masks'])
                 trajectory[position]['rewards'] = [rewards[position]] * N
                 trajectories[position].append(trajectory[position])
-    insert_data(trajectories,env.state_mapping,env.obs_mapping,training_params['training_round'],training_params['game'],id,training_params['generate_epochs'])
+    insert_data(trajectories,env.state_mapping,env.obs_mapping,training_params['training_round'],training_params['game'],id,training_params['generate_epochs'],training_params)
 
 
 def generate_trajectories(env,actor,critic,training_params,id):
@@ -110,26 +111,25 @@ def generate_trajectories(env,actor,critic,training_params,id):
                 state,obs,done,action_mask,betsize_mask = env.step(actor_outputs)
                 cur_player = env.current_player
                 if not done:
-                    trajectory[cur_player]['states'].append(state)
+                    trajectory[cur_player]['states'].append(copy.copy(state))
                     trajectory[cur_player]['obs'].append(copy.copy(obs))
                     trajectory[cur_player]['action_masks'].append(action_mask)
                     trajectory[cur_player]['betsize_masks'].append(betsize_mask)
             assert len(trajectory[cur_player]['betsize']) == len(trajectory[cur_player]['betsize_masks'])
-            rewards = env.player_rewards()
+            rewards = env.player_rewards(expected=env.expected_payoff)
             for position in trajectory.keys():
                 N = len(trajectory[position]['betsize_masks'])
                 trajectory[position]['rewards'] = [rewards[position]] * N
                 trajectories[position].append(trajectory[position])
-    insert_data(trajectories,env.state_mapping,env.obs_mapping,training_params['training_round'],training_params['game'],id,training_params['generate_epochs'])
+    insert_data(trajectories,env.state_mapping,env.obs_mapping,training_params['training_round'],training_params['game'],id,training_params['generate_epochs'],training_params)
 
-def insert_data(training_data:dict,mapping:dict,obs_mapping,training_round:int,gametype:str,id:int,epochs:int):
+def insert_data(training_data:dict,mapping:dict,obs_mapping,training_round:int,gametype:str,id:int,epochs:int,store_params:dict=None):
     """
-    takes trajectories and inserts them into db for data analysis and learning.
+    takes trajectories and inserts them into the trajectory store (MongoDB unless store_params select npy) for data analysis and learning.
     """
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
     keys = training_data.keys()
     positions = [position for position in keys if position in ['SB','BB']]   
+    steps = []
     for position in positions:
         for i,poker_round in enumerate(training_data[position]):
             states = poker_round['states']
@@ -150,31 +150,31 @@ def insert_data(training_data:dict,mapping:dict,obs_mapping,training_round:int,g
             assert(isinstance(observations,list))
             assert(isinstance(states,list))
             for step,state in enumerate(states):
-                state_json = {
-                    'training_round':training_round,
+                steps.append({
                     'poker_round':i + (id * epochs),
-                    'state':state.tolist(),
-                    'obs':observations[step].tolist(),
-                    'action_probs':action_probs[step].tolist(),
-                    'action_prob':action_prob[step].tolist(),
+                    'state':state,
+                    'obs':observations[step],
+                    'action_probs':action_probs[step],
+                    'action_prob':action_prob[step],
                     'action':actions[step],
                     'action_category':action_categories[step],
-                    'betsize_mask':betsize_masks[step].tolist(),
-                    'action_mask':action_masks[step].tolist(),
+                    'betsize_mask':betsize_masks[step],
+                    'action_mask':action_masks[step],
                     'betsize':betsizes[step],
                     'reward':rewards[step],
-                    'values':values[step].tolist()
-                }
-                db['game_data'].insert_one(state_json)
-    client.close()
+                    'values':values[step]
+                })
+    store = return_store(store_params or {})
+    store.store_steps(steps,training_round,id)
+    # The learning update reads these rounds next
+    store.close()
 
 def combined_learning_update(model,params):
+    mongo = return_store(params)
     model.train()
     query = {'training_round':params['training_round']}
     projection = {'state':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
-    client = MongoClient('localhost', 27017,maxPoolSize=10000)
-    db = client['poker']
-    data = list(db['game_data'].find(query,projection))
+    data = mongo.get_data(query,projection)
     # trainloader = return_trajectoryloader(data)
     # loss_dict = defaultdict(lambda:None)
     for i in range(params['learning_rounds']):
@@ -185,12 +185,12 @@ def combined_learning_update(model,params):
             losses.append(critic_loss)
             policy_losses.append(policy_loss)
         print(f'Training Round {i}, critic loss {sum(losses)}, policy loss {sum(policy_losses)}')
-    del data
     mongo.close()
+    del data
     return model,params
 
 def dual_learning_update(actor,critic,target_actor,target_critic,params):
-    mongo = MongoDB()
+    mongo = return_store(params)
     actor.train()
     query = {'training_round':params['training_round']}
     projection = {'obs':1,'state':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
@@ -207,7 +207,7 @@ def dual_learning_update(actor,critic,target_actor,target_critic,params):
     return actor,critic,params
 
 def batch_learning_update(actor,critic,target_actor,target_critic,params):
-    mongo = MongoDB()
+    mongo = return_store(params)
     actor.train()
     query = {'training_round':params['training_round']}
     projection = {'obs':1,'state':1,'betsize_mask':1,'action_mask':1,'action':1,'reward':1,'_id':0}
@@ -223,6 +223,7 @@ def batch_learning_update(actor,critic,target_actor,target_critic,params):
     return actor,critic,params
 
 def train_batch(env,actor,critic,target_actor,target_critic,training_params,learning_params,network_params,id):
+    env.seed(derive_seed(training_params['seed'],training_params['training_round'],id))
     villain = BetAgent()
     for e in range(training_params['training_epochs']):
         sys.stdout.write('\r')
@@ -243,6 +244,7 @@ def train_batch(env,actor,critic,target_actor,target_critic,training_params,lear
             torch.save(critic.state_dict(), os.path.join(training_params['critic_path'],f'OmahaCritic_{e}'))
 
 def train_combined(env,model,training_params,learning_params,id):
+    env.seed(derive_seed(training_params['seed'],training_params['training_round'],id))
     for e in range(training_params['training_epochs']):
         sys.stdout.write('\r')
         generate_trajectories(env,model,training_params,id)
@@ -257,7 +259,16 @@ def train_combined(env,model,training_params,learning_params,id):
         if e % training_params['save_every'] == 0 and id == 0:
             torch.save(model.state_dict(), os.path.join(training_params['save_dir'],f'OmahaCombined_{e}'))
 
+def return_env(env,training_params,id):
+    """env seeded for this training round and worker, or an AsyncPoker over training_params['env_params'] when training_params['async_env']"""
+    seed = derive_seed(training_params['seed'],training_params['training_round'],id)
+    if training_params.get('async_env',False):
+        return AsyncPoker(dict(training_params['env_params'],seed=seed))
+    env.seed(seed)
+    return env
+
 def train_dual(env,actor,critic,target_actor,target_critic,training_params,learning_params,network_params,validation_params,id):
+    env = return_env(env,training_params,id)
     if validation_params['koth']:
         villain = load_villain(seed,nS,nA,nB,network_params,learning_params['device'],training_params['baseline_path'])
     for e in range(training_params['training_epochs']):
@@ -287,4 +298,6 @@ def train_dual(env,actor,critic,target_actor,target_critic,training_params,learn
         #             new_baseline_path = return_next_baseline_path(training_params['baseline_path'])
         #             torch.save(actor.state_dict(), new_baseline_path)
         #             # load new villain
-        #             villain = load_villain(seed,nS,nA,nB,network_params,learning_params['device'],training_params['baseline_path'])
\ No newline at end of file
+        #             villain = load_villain(seed,nS,nA,nB,network_params,learning_params['device'],training_params['baseline_path'])
+    if training_params.get('async_env',False):
+        env.close()
@@ -0,0 +1,112 @@
+import os
+import glob
+import shutil
+import numpy as np
+import torch
+
+"""
+File based alternative to the MongoDB trajectory collection. Every insert writes one shard of typed columns,
+<path>/round_<training_round>/worker_<id>_<part>/<column>.npy, one row per decision step. States and observations
+grow with the step, they are stored concatenated over the sequence dimension with per row offsets.
+Reads open the columns memory mapped and return the same row dicts as MongoDB.get_data.
+
+Select the backend with params['store'] ('mongo' or 'npy') and params['store_path'], see return_store.
+"""
+
+SCALAR_COLUMNS = ['poker_round','action','action_category','betsize','reward']
+ARRAY_COLUMNS = ['action_mask','betsize_mask','action_prob','action_probs','values']
+SEQUENCE_COLUMNS = ['state','obs']
+
+def to_numpy(value):
+    if isinstance(value,torch.Tensor):
+        return value.detach().cpu().numpy()
+    return np.asarray(value)
+
+class NpyStore(object):
+    def __init__(self,path='trajectories'):
+        self.path = path
+        os.makedirs(self.path,exist_ok=True)
+
+    def store_steps(self,steps:list,training_round:int,id:int):
+        """steps: list of dicts holding the columns of one decision step"""
+        if not steps:
+            return
+        round_dir = os.path.join(self.path,f'round_{training_round}')
+        os.makedirs(round_dir,exist_ok=True)
+        part = len([shard for shard in self.shards(training_round) if os.path.basename(shard).startswith(f'worker_{id}_')])
+        shard = os.path.join(round_dir,f'worker_{id}_{part}')
+        # Written aside and renamed so readers never see a partial shard
+        tmp = shard + '.tmp'
+        os.makedirs(tmp,exist_ok=True)
+        for column in SCALAR_COLUMNS:
+            values = np.array([step[column] for step in steps])
+            np.save(os.path.join(tmp,f'{column}.npy'),values.astype(np.float32 if column == 'reward' else np.int64))
+        for column in ARRAY_COLUMNS:
+            values = np.stack([to_numpy(step[column]) for step in steps])
+            np.save(os.path.join(tmp,f'{column}.npy'),values.astype(np.float32) if values.dtype == np.float64 else values)
+        for column in SEQUENCE_COLUMNS:
+            # (1,t,features) per step
+            sequences = [to_numpy(step[column])[0] for step in steps]
+            offsets = np.concatenate(([0],np.cumsum([len(sequence) for sequence in sequences])))
+            np.save(os.path.join(tmp,f'{column}.npy'),np.concatenate(sequences).astype(np.float32))
+            np.save(os.path.join(tmp,f'{column}_offsets.npy'),offsets)
+        os.rename(tmp,shard)
+
+    def shards(self,training_round):
+        return sorted(path for path in glob.glob(os.path.join(self.path,f'round_{training_round}','worker_*')) if not path.endswith('.tmp'))
+
+    def load_shard(self,shard,columns):
+        """Memory mapped (copy on write) columns of a shard"""
+        data = {}
+        for column in columns:
+            data[column] = np.load(os.path.join(shard,f'{column}.npy'),mmap_mode='c')
+            if column in SEQUENCE_COLUMNS:
+                data[column + '_offsets'] = np.load(os.path.join(shard,f'{column}_offsets.npy'))
+        return data
+
+    def get_data(self,query:dict,projection:dict=None):
+        """
+        query: must hold training_round, other keys are matched against the scalar columns.
+        projection: {column:1}, defaults to every column. Returns a list of row dicts.
+        """
+        query = dict(query)
+        training_round = query.pop('training_round')
+        columns = SCALAR_COLUMNS + ARRAY_COLUMNS + SEQUENCE_COLUMNS
+        if projection:
+            columns = [column for column in columns if projection.get(column)]
+        rows = []
+        for shard in self.shards(training_round):
+            data = self.load_shard(shard,set(columns) | set(query) | {'poker_round'})
+            mask = np.ones(len(data['poker_round']),dtype=bool)
+            for key,value in query.items():
+                mask &= data[key] == value
+            for i in np.flatnonzero(mask):
+                row = {}
+                for column in columns:
+                    if column in SEQUENCE_COLUMNS:
+                        offsets = data[column + '_offsets']
+                        row[column] = data[column][offsets[i]:offsets[i + 1]][None]
+                    elif column in SCALAR_COLUMNS:
+                        row[column] = data[column][i].item()
+                    else:
+                        row[column] = data[column][i]
+                rows.append(row)
+        return rows
+
+    def clean_db(self):
+        shutil.rmtree(self.path,ignore_errors=True)
+        os.makedirs(self.path,exist_ok=True)
+
+    def close(self):
+        pass
+
+def return_store(params:dict):
+    """The trajectory store selected by params['store'], MongoDB unless it is 'npy'"""
+    store = params.get('store','mongo')
+    if store == 'npy':
+        return NpyStore(params.get('store_path','trajectories'))
+    elif store == 'mongo':
+        # pymongo is only needed for the mongo backend
+        from db import MongoDB
+        return MongoDB()
+    raise ValueError(f'Store {store} not supported')
@@ -1,4 +1,5 @@
 import ctypes
+import numpy as np
 from os import path
 from sys import platform, argv
 
@@ -28,6 +29,50 @@ def encode(card):
         suitnum = {'s': 1, 'h': 2,'d': 3,'c': 4}.get(card[1], 0)
     return lib.encode(ctypes.c_byte(card[0] - 2), ctypes.c_byte(suitnum - 1))
 
+# [rank,suit] -> cactus kev encoding, built once from rusteval's DECK table. Suits 1-4 in the same
+# order as encode (s,h,d,c). Suit 0 gets the suit bit below spades like encode gives it.
+# Rank 0 stays 0 so zero padded cards encode to 0
+def build_encoding_table():
+    deck = np.empty(52,dtype=np.dtype(ctypes.c_long))
+    lib.deck_table(pointer(deck))
+    table = np.zeros((15,5),dtype=np.int64)
+    table[((deck >> 8) & 0xF) + 2,SUIT_NUMBERS[(deck >> 12) & 0xF]] = deck
+    table[2:,0] = (table[2:,1] & ~0xF000) | 0x800
+    return table
+
+# Copies of the lookup tables rank() uses: FLUSHES and UNIQUE5 indexed by the or of the five rank bits,
+# the sorted prime products of the paired hands and their ranks
+def rank_tables():
+    sizes = np.empty(3,dtype=np.int32)
+    lib.rank_table_sizes(pointer(sizes, ctypes.c_int))
+    flushes,unique5 = np.empty(sizes[0],dtype=np.int16),np.empty(sizes[1],dtype=np.int16)
+    products,product_ranks = np.empty(sizes[2],dtype=np.int32),np.empty(sizes[2],dtype=np.int16)
+    lib.rank_tables(pointer(flushes, ctypes.c_short), pointer(unique5, ctypes.c_short), pointer(products, ctypes.c_int), pointer(product_ranks, ctypes.c_short))
+    return {'flushes':flushes,'unique5':unique5,'products':products,'product_ranks':product_ranks}
+
+# numpy rank() of (...,5) encoded cards with the rank_tables() lookups, for board sizes the batched evaluators
+# don't take (flop and turn). Returns (...) int64 ranks, 1 is a royal flush
+def five_card_ranks(cards):
+    cards = np.asarray(cards,dtype=np.int64)
+    index = np.bitwise_or.reduce(cards,axis=-1) >> 16
+    flush = (np.bitwise_and.reduce(cards,axis=-1) & 0xF000) != 0
+    unique = RANK_TABLES['unique5'][index].astype(np.int64)
+    position = np.minimum(np.searchsorted(RANK_TABLES['products'],np.prod(cards & 0xFF,axis=-1)),len(RANK_TABLES['products']) - 1)
+    return np.where(flush,RANK_TABLES['flushes'][index],np.where(unique > 0,unique,RANK_TABLES['product_ranks'][position])).astype(np.int64)
+
+# (encoded >> 12) & 0xF -> suit 1-4
+SUIT_NUMBERS = np.array([0,1,2,0,3,0,0,0,4])
+
+# vectorized encode: (...,2) array of numeric [rank,suit] -> (...) array of encoded cards
+def encode_cards(cards):
+    cards = np.asarray(cards,dtype=np.int64)
+    return ENCODING_TABLE[cards[...,0],cards[...,1]]
+
+# vectorized decode: (...) array of encoded cards -> (...,2) array of numeric [rank,suit]
+def decode_cards(encoded):
+    encoded = np.asarray(encoded,dtype=np.int64)
+    return np.stack((((encoded >> 8) & 0xF) + 2,SUIT_NUMBERS[(encoded >> 12) & 0xF]),axis=-1)
+
 # takes a cactus kev encoded card and returns a list like [2,'s']
 def decode(encoded):
     rank = ((encoded >> 8) & 0xF) + 2
@@ -50,10 +95,130 @@ def hand_rank(hand, board):
 
 def holdem_hand_rank(hand, board):
     return lib.holdem_hand_with_board_rank(long_array(hand), long_array(board))
+
+# takes a list of 4-card hands and a 5 card board and returns the rank of every hand in one call
+def hand_ranks(hands, board):
+    ranks = (ctypes.c_int * len(hands))()
+    lib.hands_with_board_rank(long_array([card for hand in hands for card in hand]), len(hands), long_array(board), ranks)
+    return list(ranks)
+
+def holdem_hand_ranks(hands, board):
+    ranks = (ctypes.c_int * len(hands))()
+    lib.holdem_hands_with_board_rank(long_array([card for hand in hands for card in hand]), len(hands), long_array(board), ranks)
+    return list(ranks)
+# Batched versions: take (N,4) or (N,2) hands and (N,5) boards of encoded cards as numpy arrays (any integer dtype)
+# and cross into rust once. Return (N,) int32 arrays
+def batch_hand_ranks(hands, boards):
+    hands,boards = long_buffer(hands,4),long_buffer(boards,5)
+    ranks = np.empty(len(hands),dtype=np.int32)
+    lib.hand_board_ranks(pointer(hands), pointer(boards), len(hands), pointer(ranks, ctypes.c_int))
+    return ranks
+
+def batch_holdem_hand_ranks(hands, boards):
+    hands,boards = long_buffer(hands,2),long_buffer(boards,5)
+    ranks = np.empty(len(hands),dtype=np.int32)
+    lib.holdem_hand_board_ranks(pointer(hands), pointer(boards), len(hands), pointer(ranks, ctypes.c_int))
+    return ranks
+
+# 1 for hands1 wins, -1 for hands2 wins, 0 for tie on every row
+def batch_winners(hands1, hands2, boards):
+    hands1,hands2,boards = long_buffer(hands1,4),long_buffer(hands2,4),long_buffer(boards,5)
+    results = np.empty(len(hands1),dtype=np.int32)
+    lib.winners(pointer(hands1), pointer(hands2), pointer(boards), len(hands1), pointer(results, ctypes.c_int))
+    return results
+
+def batch_holdem_winners(hands1, hands2, boards):
+    hands1,hands2,boards = long_buffer(hands1,2),long_buffer(hands2,2),long_buffer(boards,5)
+    results = np.empty(len(hands1),dtype=np.int32)
+    lib.holdem_winners(pointer(hands1), pointer(hands2), pointer(boards), len(hands1), pointer(results, ctypes.c_int))
+    return results
+
+# Low rank of hands without an eight or better low, rusteval lo::NO_LOW
+NO_LOW = 0xFF
+
+# Omaha hi/lo showdowns: (N,n_players,4) encoded hands and (N,5) boards. Returns (N,n_players) high ranks,
+# low ranks (0 = A2345, NO_LOW when no low qualifies, lower is stronger) and pot shares, half to the best high
+# and half to the best low, the whole pot to the high when nobody has a low
+def batch_hilo_showdowns(hands, boards):
+    hands = np.asarray(hands)
+    n,n_players = hands.shape[:2]
+    hands,boards = long_buffer(hands.reshape(-1,4),4),long_buffer(boards,5)
+    hi_ranks,lo_ranks = np.empty((n,n_players),dtype=np.int32),np.empty((n,n_players),dtype=np.int32)
+    shares = np.empty((n,n_players))
+    lib.hilo_showdowns(pointer(hands), pointer(boards), n, n_players, pointer(hi_ranks, ctypes.c_int), pointer(lo_ranks, ctypes.c_int), pointer(shares, ctypes.c_double))
+    return hi_ranks,lo_ranks,shares
+
+# Negative return codes of rusteval equity and range_equity (equity.rs), raised as ValueError
+EQUITY_ERRORS = {
+    -1:'equity supports 2 to 6 players',
+    -2:'hands must hold 2 or 4 cards',
+    -3:'at most 5 board cards',
+    -4:'cards must be encoded deck cards, none repeated within the hands and board',
+    -5:'owners must be ids in 0..n_ids',
+}
+
+def check_equity(result):
+    if result < 0:
+        raise ValueError(EQUITY_ERRORS[result])
+    return result
+
+# Equity of (n_players,2) or (n_players,4) encoded hands, 2-6 players, given 0-5 encoded board cards.
+# Exact over every runout when there are at most iterations of them, otherwise iterations Monte Carlo runouts
+# spread over n_threads threads (0 for one per core). Sampled runouts only depend on seed and stream, not
+# on n_threads. Returns (n_players,) win, tie and loss fractions and pot shares with ties split evenly.
+# Raises ValueError for other player counts, hand widths or board lengths and for repeated or invalid cards
+def equity(hands, board=(), iterations=10000, n_threads=0, seed=0, stream=0):
+    hands = np.asarray(hands)
+    if hands.ndim != 2:
+        raise ValueError(f'expected (n_players,2|4) hands, got {hands.shape}')
+    hands = long_buffer(hands, hands.shape[-1])
+    board = np.ascontiguousarray(board, dtype=np.dtype(ctypes.c_long)).ravel()
+    wins,ties,losses,shares = (np.empty(len(hands)) for _ in range(4))
+    check_equity(lib.equity(pointer(hands), len(hands), hands.shape[1], pointer(board), len(board), iterations, n_threads,
+        ctypes.c_ulonglong(seed), ctypes.c_ulonglong(stream), *(pointer(out, ctypes.c_double) for out in (wins,ties,losses,shares))))
+    return wins,ties,losses,shares
+
+# Pairwise equity of (n_a,2|4) encoded hands against (n_b,2|4) encoded hands given 0-5 encoded board cards,
+# summed per owner id: owners_a (n_a,) ids in 0..n_ids_a, owners_b (n_b,) ids in 0..n_ids_b, each hand its own id
+# when None. Runouts as in equity(), each ranks every hand once. Returns the (n_ids_a,n_ids_b) summed pot shares
+# of the a hands (ties count half) and the number of hand pairs times runouts compared, pairs sharing a card skipped.
+# Raises ValueError like equity()
+def range_equity(hands_a, hands_b, board=(), iterations=1000, n_threads=0, seed=0, stream=0, owners_a=None, owners_b=None, n_ids_a=None, n_ids_b=None):
+    hands_a,hands_b = np.asarray(hands_a),np.asarray(hands_b)
+    if hands_a.ndim != 2 or hands_b.ndim != 2 or hands_a.shape[1] != hands_b.shape[1]:
+        raise ValueError(f'expected (n,2|4) hands of one width, got {hands_a.shape} and {hands_b.shape}')
+    width = hands_a.shape[-1]
+    hands_a,hands_b = long_buffer(hands_a, width),long_buffer(hands_b, width)
+    owners_a = np.arange(len(hands_a)) if owners_a is None else owners_a
+    owners_b = np.arange(len(hands_b)) if owners_b is None else owners_b
+    owners_a,owners_b = (np.ascontiguousarray(owners, dtype=np.dtype(ctypes.c_int)) for owners in (owners_a,owners_b))
+    if owners_a.shape != (len(hands_a),) or owners_b.shape != (len(hands_b),):
+        raise ValueError('expected one owner per hand')
+    n_ids_a = len(hands_a) if n_ids_a is None else n_ids_a
+    n_ids_b = len(hands_b) if n_ids_b is None else n_ids_b
+    board = np.ascontiguousarray(board, dtype=np.dtype(ctypes.c_long)).ravel()
+    shares,counts = np.empty((n_ids_a,n_ids_b)),np.empty((n_ids_a,n_ids_b))
+    check_equity(lib.range_equity(pointer(hands_a), pointer(owners_a, ctypes.c_int), len(hands_a), n_ids_a, pointer(hands_b),
+        pointer(owners_b, ctypes.c_int), len(hands_b), n_ids_b, width, pointer(board), len(board), iterations, n_threads,
+        ctypes.c_ulonglong(seed), ctypes.c_ulonglong(stream), pointer(shares, ctypes.c_double), pointer(counts, ctypes.c_double)))
+    return shares,counts
+
+# contiguous (N,width) c_long copy of arr, no copy if it already is one
+def long_buffer(arr, width):
+    arr = np.ascontiguousarray(arr, dtype=np.dtype(ctypes.c_long))
+    assert arr.ndim == 2 and arr.shape[1] == width, f'expected (N,{width}) cards, got {arr.shape}'
+    return arr
+
+def pointer(arr, ctype=ctypes.c_long):
+    return arr.ctypes.data_as(ctypes.POINTER(ctype))
+
 # for converting an array to a c array for passing to rust
 def long_array(arr):
     return (ctypes.c_long * len(arr))(*arr)
 
+ENCODING_TABLE = build_encoding_table()
+RANK_TABLES = rank_tables()
+
 def rank(hand):
     return lib.rank(*hand)
 
@@ -0,0 +1,280 @@
+import os
+import numpy as np
+from itertools import combinations
+from utils.cardlib import encode_cards,five_card_ranks,batch_hand_ranks
+from utils.monte_carlo import deal,showdown_equity,map_chunks
+from utils.suit_isomorphism import card_ids
+from poker_env.data_classes import CARD_TABLE,derive_seed
+import poker_env.datatypes as pdt
+
+"""
+Omaha postflop hand abstraction. Hand + board situations of a street are reduced to a coarse, suit isomorphic
+key, every key of the street gets a bucket id, buckets are numbered from weakest (0) to strongest (K-1).
+
+Key: the bin of the best made hand on the current board (2 hand cards + 3 board cards, bin edges are quantiles
+of the sampled ranks so bins hold similar mass), the flush draw (none, draw, nut draw) and the number of ranks
+that complete a straight (0, 1, 2, 3 or more). Draws are 0 on the river. The key space is small enough to
+enumerate, so each street is a dense table indexed by key and a lookup is an array index.
+
+Features: n_runouts random completions of the board to the river, each played against n_villains random hands.
+The equities of the runouts form a histogram, its mean is the expected hand strength (EHS). Histograms are
+averaged per key and the keys clustered with k-means on the cumulative histograms (L2 on cumulative histograms
+tracks the earth mover's distance between equity distributions), so keys with the same EHS but different draws
+land in different buckets. Keys no sampled deal reached take the bucket of the nearest sampled key with the same
+draws (nearest made hand bin), or the nearest draws when none has them.
+
+Each street is stored as <path>_<street>_{buckets,ehs,counts,centroids,edges,meta}.npy. buckets, ehs and counts
+(sampled deals per key, 0 for filled keys) are indexed by key and opened memory mapped.
+
+Build: python -m utils.hand_buckets --out assets/hand_buckets --situations 200000 --buckets 50
+"""
+
+BOARD_CARDS = {pdt.StreetStrs.FLOP:3,pdt.StreetStrs.TURN:4,pdt.StreetStrs.RIVER:5}
+FLUSH_DRAWS = 3
+STRAIGHT_DRAWS = 4
+HAND_PAIRS = list(combinations(range(4),2))
+# Rank bits (rank - 2) of the 10 straights, the wheel counts the ace low
+STRAIGHTS = np.array([0b1000000001111] + [0b11111 << low for low in range(9)])
+ENCODED_IDS = encode_cards(CARD_TABLE)
+POPCOUNT = np.array([bin(bits).count('1') for bits in range(1 << 13)])
+HIGHEST_BIT = np.array([0] + [1 << (bits.bit_length() - 1) for bits in range(1,1 << 13)])
+
+def sample_situations(street,n,rng):
+    """n random (4,) hands and (board_cards,) boards of street as card ids"""
+    deals = np.argsort(rng.random((n,52)),axis=-1)[:,:4 + BOARD_CARDS[street]]
+    return deals[:,:4],deals[:,4:]
+
+def made_ranks(hands,boards):
+    """(N,) best rank of hands (N,4) with 2 hand cards and 3 of the (N,b) board card ids, 1 is a royal flush"""
+    if boards.shape[-1] == 5:
+        return batch_hand_ranks(ENCODED_IDS[hands],ENCODED_IDS[boards]).astype(np.int64)
+    triples = list(combinations(range(boards.shape[-1]),3))
+    shape = (len(hands),len(HAND_PAIRS),len(triples))
+    pairs = np.broadcast_to(hands[:,HAND_PAIRS][:,:,None],shape + (2,))
+    board_triples = np.broadcast_to(boards[:,triples][:,None],shape + (3,))
+    cards = np.concatenate((pairs,board_triples),axis=-1)
+    return five_card_ranks(ENCODED_IDS[cards]).reshape(len(hands),-1).min(-1)
+
+def draws(hands,boards):
+    """
+    (N,) flush draw (0 none, 1 draw, 2 nut draw) and (N,) number of ranks completing a straight, capped at
+    STRAIGHT_DRAWS - 1, of hands (N,4) on the (N,b) flop or turn board card ids. Both 0 on the river
+    """
+    if boards.shape[-1] == 5:
+        return np.zeros(len(hands),dtype=np.int64),np.zeros(len(hands),dtype=np.int64)
+    hand_bits,board_bits = 1 << (hands >> 2),1 << (boards >> 2)
+    # Flush: two of the hero's suit on board, nut when the hero holds the highest card of the suit the board lacks
+    suits = np.arange(4)
+    hero_suited = np.where((hands & 3)[...,None] == suits,hand_bits[...,None],0)
+    board_suited = np.where((boards & 3)[...,None] == suits,board_bits[...,None],0)
+    drawing = ((hero_suited > 0).sum(1) >= 2) & ((board_suited > 0).sum(1) == 2)
+    nut = (np.bitwise_or.reduce(hero_suited,axis=1) & HIGHEST_BIT[0x1FFF & ~np.bitwise_or.reduce(board_suited,axis=1)]) > 0
+    flush = np.where(drawing,1 + nut,0).max(-1)
+    # Straight: two distinct hand ranks in a straight, the board holds all but one of its other three ranks
+    pairs = hand_bits[:,HAND_PAIRS]
+    pair_bits = np.where(pairs[...,0] != pairs[...,1],pairs[...,0] | pairs[...,1],0)
+    board_mask = np.bitwise_or.reduce(board_bits,axis=-1)
+    inside = (pair_bits[...,None] > 0) & ((pair_bits[...,None] & ~STRAIGHTS) == 0)
+    missing = STRAIGHTS & ~pair_bits[...,None] & ~board_mask[:,None,None]
+    outs = np.bitwise_or.reduce(np.where(inside & (POPCOUNT[missing] == 1),missing,0).reshape(len(hands),-1),axis=-1)
+    return flush,np.minimum(POPCOUNT[outs],STRAIGHT_DRAWS - 1)
+
+def abstraction_keys(hands,boards,edges):
+    """(N,) keys of hands (N,4) on boards (N,b) card ids, given the made hand bin edges. Strongest made hands get bin 0"""
+    flush,straight = draws(hands,boards)
+    rank_bins = np.searchsorted(edges,made_ranks(hands,boards),side='right')
+    return (rank_bins * FLUSH_DRAWS + flush) * STRAIGHT_DRAWS + straight
+
+def rank_edges(ranks,n_rank_bins):
+    """Inner edges of up to n_rank_bins made hand bins holding similar numbers of ranks"""
+    return np.unique(np.quantile(ranks,np.linspace(0,1,n_rank_bins + 1)[1:-1]).astype(np.int64))
+
+def equity_histograms(hands,boards,n_runouts,n_villains,n_bins,rng):
+    """
+    hands (N,4), boards (N,b) card ids. Returns (N,) EHS and (N,n_bins) histograms of the equity of n_runouts
+    board completions, each against n_villains random hands. Ties count as half.
+    """
+    N,n_board = boards.shape
+    missing = 5 - n_board
+    assert missing + 4 * n_villains <= 48 - n_board,'Not enough cards for the villains'
+    used = np.concatenate((hands,boards),axis=-1)
+    dealt = deal(np.repeat(used[:,None],n_runouts,1),missing + 4 * n_villains,rng)
+    full_boards = np.concatenate((np.repeat(boards[:,None],n_runouts,1),dealt[...,:missing]),axis=-1)
+    villains = dealt[...,missing:].reshape(N,n_runouts,n_villains,4)
+    equities = showdown_equity(hands[:,None,None],villains,full_boards[:,:,None]).mean(-1)
+    bins = np.minimum((equities * n_bins).astype(np.int64),n_bins - 1)
+    histograms = (bins[...,None] == np.arange(n_bins)).mean(1)
+    return equities.mean(-1),histograms
+
+def histogram_chunk(args):
+    hands,boards,n_runouts,n_villains,n_bins,seed,chunk = args
+    rng = np.random.default_rng(derive_seed(seed,*chunk))
+    return equity_histograms(hands,boards,n_runouts,n_villains,n_bins,rng)
+
+def parallel_histograms(hands,boards,n_runouts,n_villains,n_bins,seed,street,n_workers):
+    """equity_histograms over chunks of situations spread over n_workers processes"""
+    chunks = np.array_split(np.arange(len(hands)),max(n_workers * 8,1))
+    jobs = [(hands[c],boards[c],n_runouts,n_villains,n_bins,seed,(BOARD_CARDS[street],i)) for i,c in enumerate(chunks)]
+    results = map_chunks(histogram_chunk,jobs,n_workers)
+    return np.concatenate([r[0] for r in results]),np.concatenate([r[1] for r in results])
+
+def kmeans(features,k,rng,weights=None,n_iter=30):
+    """Lloyd's k-means with k-means++ seeding, rows weighted by weights. Returns (k,D) centroids and (N,) labels"""
+    weights = np.ones(len(features)) if weights is None else np.asarray(weights,dtype=np.float64)
+    centroids = [features[rng.choice(len(features),p=weights / weights.sum())]]
+    distances = ((features - centroids[0])**2).sum(-1)
+    for _ in range(1,k):
+        probs = distances * weights / (distances * weights).sum() if (distances * weights).sum() > 0 else None
+        centroids.append(features[rng.choice(len(features),p=probs)])
+        distances = np.minimum(distances,((features - centroids[-1])**2).sum(-1))
+    centroids = np.stack(centroids)
+    for _ in range(n_iter):
+        labels = nearest(features,centroids)
+        for i in range(k):
+            members = labels == i
+            if members.any():
+                centroids[i] = np.average(features[members],axis=0,weights=weights[members])
+    return centroids,nearest(features,centroids)
+
+def nearest(features,centroids):
+    """(N,) index of the closest of the (k,D) centroids to each (N,D) feature row"""
+    return ((features[:,None,:] - centroids[None])**2).sum(-1).argmin(-1)
+
+def fill_keys(sampled,n_rank_bins):
+    """(n_keys,) index of the sampled key each key takes its bucket from: itself, or the nearest sampled key with
+    the closest draws (draw distance outweighs any made hand bin distance)"""
+    grid = np.stack(np.unravel_index(np.arange(len(sampled)),(n_rank_bins,FLUSH_DRAWS,STRAIGHT_DRAWS)),axis=-1)
+    candidates = np.flatnonzero(sampled)
+    distance = np.abs(grid[:,None] - grid[candidates][None])
+    distance = distance[...,0] + n_rank_bins * (distance[...,1] + distance[...,2])
+    return candidates[distance.argmin(-1)]
+
+def build_street(street,n_situations=200000,n_buckets=50,n_rank_bins=64,n_runouts=16,n_villains=8,n_bins=10,seed=0,n_workers=None):
+    """
+    Buckets every key of street from the equity histograms of n_situations sampled deals.
+    Returns a dict of buckets, ehs and counts indexed by key, centroids (cumulative histograms), edges and meta
+    """
+    n_workers = n_workers or os.cpu_count()
+    rng = np.random.default_rng(derive_seed(seed,BOARD_CARDS[street]))
+    hands,boards = sample_situations(street,n_situations,rng)
+    edges = rank_edges(made_ranks(hands,boards),n_rank_bins)
+    n_rank_bins = len(edges) + 1
+    n_keys = n_rank_bins * FLUSH_DRAWS * STRAIGHT_DRAWS
+    keys = abstraction_keys(hands,boards,edges)
+    ehs,histograms = parallel_histograms(hands,boards,n_runouts,n_villains,n_bins,seed,street,n_workers)
+    counts = np.bincount(keys,minlength=n_keys)
+    sampled = counts > 0
+    key_histograms = np.zeros((n_keys,n_bins))
+    np.add.at(key_histograms,keys,histograms)
+    key_histograms = key_histograms[sampled] / counts[sampled,None]
+    key_ehs = np.bincount(keys,weights=ehs,minlength=n_keys)[sampled] / counts[sampled]
+    centroids,labels = kmeans(np.cumsum(key_histograms,-1),min(n_buckets,sampled.sum()),rng,weights=counts[sampled])
+    # Number buckets by the mean EHS of their deals, weakest first
+    bucket_ehs = np.array([np.average(key_ehs[labels == i],weights=counts[sampled][labels == i]) if (labels == i).any() else 0 for i in range(len(centroids))])
+    order = np.argsort(bucket_ehs)
+    buckets,all_ehs = np.zeros(n_keys,dtype=np.int64),np.zeros(n_keys)
+    buckets[sampled],all_ehs[sampled] = np.argsort(order)[labels],key_ehs
+    source = fill_keys(sampled,n_rank_bins)
+    return {
+        'buckets':buckets[source].astype(np.uint16),
+        'ehs':all_ehs[source].astype(np.float32),
+        'counts':counts,
+        'centroids':centroids[order].astype(np.float32),
+        'edges':edges,
+        'meta':np.array([n_runouts,n_villains,n_bins]),
+    }
+
+def save_street(path,street,table):
+    for name,values in table.items():
+        np.save(f'{path}_{street}_{name}.npy',values)
+
+class HandBuckets(object):
+    def __init__(self,path,streets=(pdt.StreetStrs.FLOP,pdt.StreetStrs.TURN,pdt.StreetStrs.RIVER)):
+        """path: prefix given to save_street. buckets, ehs and counts are memory mapped"""
+        self.tables = {}
+        for street in streets:
+            self.tables[street] = {name:np.load(f'{path}_{street}_{name}.npy',mmap_mode='r' if name in ('buckets','ehs','counts') else None)
+                for name in ('buckets','ehs','counts','centroids','edges','meta')}
+
+    def keys(self,hands,boards):
+        """(N,) abstraction keys of hands (N,4,2) on boards (N,b,2) [rank,suit] cards, b picks the street"""
+        table = self.tables[street_of(boards)]
+        return abstraction_keys(card_ids(np.asarray(hands)),card_ids(np.asarray(boards)),table['edges'])
+
+    def bucket(self,hands,boards):
+        """(N,) buckets of hands (N,4,2) on boards (N,b,2)"""
+        return self.tables[street_of(boards)]['buckets'][self.keys(hands,boards)].astype(np.int64)
+
+    def ehs(self,hands,boards):
+        """(N,) mean EHS of the sampled deals sharing the key of each situation"""
+        return self.tables[street_of(boards)]['ehs'][self.keys(hands,boards)]
+
+def street_of(boards):
+    return {n:street for street,n in BOARD_CARDS.items()}[np.shape(boards)[-2]]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description=
+        """
+        Build the postflop hand bucket tables
+        """)
+
+    parser.add_argument('--out','-o',
+                        dest='out',
+                        default='assets/hand_buckets',
+                        type=str,
+                        help='Output path prefix')
+    parser.add_argument('--streets',
+                        dest='streets',
+                        default=[pdt.StreetStrs.FLOP,pdt.StreetStrs.TURN,pdt.StreetStrs.RIVER],
+                        nargs='*',
+                        type=str,
+                        help='Streets to build')
+    parser.add_argument('--situations','-s',
+                        dest='situations',
+                        default=200000,
+                        type=int,
+                        help='Sampled deals per street')
+    parser.add_argument('--buckets','-k',
+                        dest='buckets',
+                        default=50,
+                        type=int,
+                        help='Buckets per street')
+    parser.add_argument('--rank-bins',
+                        dest='rank_bins',
+                        default=64,
+                        type=int,
+                        help='Made hand bins per street')
+    parser.add_argument('--runouts',
+                        dest='runouts',
+                        default=16,
+                        type=int,
+                        help='Board completions per situation')
+    parser.add_argument('--villains',
+                        dest='villains',
+                        default=8,
+                        type=int,
+                        help='Random villain hands per board completion')
+    parser.add_argument('--bins',
+                        dest='bins',
+                        default=10,
+                        type=int,
+                        help='Equity histogram bins')
+    parser.add_argument('--workers','-w',
+                        dest='workers',
+                        default=None,
+                        type=int,
+                        help='Number of processes, defaults to one per core')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        default=0,
+                        type=int,
+                        help='Seed of the sampled deals and runouts')
+    args = parser.parse_args()
+
+    for street in args.streets:
+        table = build_street(street,args.situations,args.buckets,args.rank_bins,args.runouts,args.villains,args.bins,args.seed,args.workers)
+        save_street(args.out,street,table)
+        print(f'Saved {len(table["buckets"])} {street} keys ({(table["counts"] > 0).sum()} sampled) in {len(table["centroids"])} buckets')
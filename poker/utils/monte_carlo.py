@@ -0,0 +1,34 @@
+import numpy as np
+import multiprocessing as mp
+from utils.cardlib import batch_winners,encode_cards
+from poker_env.data_classes import CARD_TABLE
+
+"""
+Monte Carlo helpers shared by the equity tables (preflop_equity, hand_buckets): dealing around dead cards,
+batched Omaha showdowns and spreading chunks of work over a process pool.
+"""
+
+def deal(dead,n_cards,rng):
+    """
+    dead: (...,d) card ids already out. Returns (...,n_cards) card ids drawn without replacement from the rest
+    of the deck: a random order over the deck with the dead cards pushed to the end
+    """
+    order = rng.random(dead.shape[:-1] + (52,))
+    np.put_along_axis(order,dead,2,axis=-1)
+    return np.argsort(order,axis=-1)[...,:n_cards]
+
+def showdown_equity(heroes,villains,boards):
+    """heroes (...,4), villains (...,4), boards (...,5) card ids, broadcast together. Returns (...) hero equity, ties count half"""
+    shape = np.broadcast(heroes[...,0],villains[...,0],boards[...,0]).shape
+    heroes,villains,boards = (np.broadcast_to(cards,shape + cards.shape[-1:]).reshape(-1,cards.shape[-1]) for cards in (heroes,villains,boards))
+    results = batch_winners(encode_cards(CARD_TABLE[heroes]),encode_cards(CARD_TABLE[villains]),encode_cards(CARD_TABLE[boards]))
+    return ((results + 1) / 2).reshape(shape)
+
+def map_chunks(function,jobs,n_workers,initializer=None,initargs=()):
+    """function over jobs in n_workers processes, in this process when n_workers <= 1. initializer runs once per process"""
+    if n_workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [function(job) for job in jobs]
+    with mp.Pool(n_workers,initializer,initargs) as pool:
+        return pool.map(function,jobs)
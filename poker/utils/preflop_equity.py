@@ -0,0 +1,149 @@
+import os
+import numpy as np
+from itertools import combinations
+from utils.monte_carlo import deal,showdown_equity,map_chunks
+from utils.suit_isomorphism import canonical_key
+from poker_env.data_classes import CARD_TABLE,derive_seed
+
+"""
+Omaha preflop equity of every canonical (suit isomorphic) 4 card starting hand.
+
+Column 0 is equity against a random hand, column i > 0 against a random hand from the top ranges[i-1]
+fraction of starting hands (by combos, ordered by equity against a random hand). Equity counts ties as half.
+
+Stored as <path>.npy (n_hands,1 + n_ranges) float32, opened memory mapped, plus <path>_keys.npy with the sorted
+canonical keys that index it and <path>_ranges.npy with the range fractions.
+
+Build: python -m utils.preflop_equity --out assets/preflop_equity --samples 4000 --ranges 0.1 0.25
+"""
+
+def starting_hands():
+    """Returns all (270725,4) starting hands as card ids and their canonical keys"""
+    hand_ids = np.array(list(combinations(range(52),4)))
+    keys = canonical_key(CARD_TABLE[hand_ids],np.zeros((len(hand_ids),0,2),dtype=np.int64))
+    return hand_ids,keys
+
+def canonical_hands():
+    """
+    Returns the sorted canonical keys, a representative (n_hands,4) card id hand of each,
+    the number of combos of each and the class index of every one of the 270725 hands
+    """
+    hand_ids,keys = starting_hands()
+    unique_keys,index,inverse,counts = np.unique(keys,return_index=True,return_inverse=True,return_counts=True)
+    return unique_keys,hand_ids[index],counts,inverse
+
+def sample_equity(hero,villains,n_samples,rng):
+    """
+    Equity of hero (4,) card ids against n_samples villain hands drawn from villains (n,4) card ids,
+    each with a random board. Villain hands that share a card with hero are redrawn.
+    """
+    hero_mask = np.zeros(52,dtype=bool)
+    hero_mask[hero] = True
+    opponents = np.empty((0,4),dtype=np.int64)
+    while len(opponents) < n_samples:
+        draw = villains[rng.integers(len(villains),size=n_samples * 2)]
+        opponents = np.concatenate((opponents,draw[~hero_mask[draw].any(-1)]))[:n_samples]
+    boards = deal(np.concatenate((np.broadcast_to(hero,(n_samples,4)),opponents),axis=-1),5,rng)
+    return showdown_equity(hero,opponents,boards).mean()
+
+# Villain hands of the current column, set once per process by set_villains instead of pickled into every job
+_villains = None
+
+def set_villains(villains):
+    global _villains
+    _villains = villains
+
+def equity_chunk(args):
+    hands,n_samples,seed,chunk = args
+    rng = np.random.default_rng(derive_seed(seed,chunk))
+    return np.array([sample_equity(hero,_villains,n_samples,rng) for hero in hands])
+
+def parallel_equity(hands,villains,n_samples,seed,column,n_workers):
+    """Equity of every hand against villains, chunks of hands spread over n_workers processes"""
+    chunks = np.array_split(np.arange(len(hands)),max(n_workers * 8,1))
+    jobs = [(hands[chunk],n_samples,seed,(column,i)) for i,chunk in enumerate(chunks)]
+    return np.concatenate(map_chunks(equity_chunk,jobs,n_workers,set_villains,(villains,)))
+
+def build_table(n_samples=4000,ranges=(),seed=0,n_workers=None,hands=None):
+    """
+    Returns keys,(n_hands,1 + len(ranges)) equity table.
+    hands: optional subset of canonical hand indexes to evaluate, the other rows are nan
+    """
+    n_workers = n_workers or os.cpu_count()
+    keys,representatives,counts,inverse = canonical_hands()
+    all_hands,_ = starting_hands()
+    rows = np.arange(len(keys)) if hands is None else np.asarray(hands)
+    table = np.full((len(keys),1 + len(ranges)),np.nan,dtype=np.float32)
+    table[rows,0] = parallel_equity(representatives[rows],all_hands,n_samples,seed,0,n_workers)
+    if len(ranges):
+        # Ranges are the strongest hands by equity against a random hand, sized by combos
+        order = np.argsort(-np.nan_to_num(table[:,0],nan=-1))
+        cumulative = np.cumsum(counts[order]) / counts.sum()
+        for column,fraction in enumerate(ranges,1):
+            in_range = np.zeros(len(keys),dtype=bool)
+            in_range[order[:np.searchsorted(cumulative,fraction) + 1]] = True
+            villains = all_hands[in_range[inverse]]
+            table[rows,column] = parallel_equity(representatives[rows],villains,n_samples,seed,column,n_workers)
+    return keys,table
+
+def save_table(path,keys,table,ranges):
+    np.save(path + '.npy',table)
+    np.save(path + '_keys.npy',keys)
+    np.save(path + '_ranges.npy',np.asarray(ranges,dtype=np.float64))
+
+class PreflopEquity(object):
+    def __init__(self,path):
+        """path: prefix given to save_table, the table is memory mapped"""
+        self.table = np.load(path + '.npy',mmap_mode='r')
+        self.keys = np.load(path + '_keys.npy')
+        self.ranges = np.load(path + '_ranges.npy')
+
+    def hand_ids(self,hands):
+        """(...,4,2) [rank,suit] hands -> (...) canonical hand ids"""
+        keys = canonical_key(hands,np.zeros(np.shape(hands)[:-2] + (0,2),dtype=np.int64))
+        return np.searchsorted(self.keys,keys)
+
+    def equity(self,hands,column=0):
+        """(...,4,2) hands -> (...) equity against column 0 (random hand) or reference range column"""
+        return self.table[self.hand_ids(hands),column]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description=
+        """
+        Build the Omaha preflop equity table
+        """)
+
+    parser.add_argument('--out','-o',
+                        dest='out',
+                        default='assets/preflop_equity',
+                        type=str,
+                        help='Output path prefix')
+    parser.add_argument('--samples','-s',
+                        dest='samples',
+                        default=4000,
+                        type=int,
+                        help='Sampled villain hand and board pairs per starting hand')
+    parser.add_argument('--ranges','-r',
+                        dest='ranges',
+                        default=[0.1,0.25],
+                        nargs='*',
+                        type=float,
+                        help='Top fractions of starting hands used as reference ranges')
+    parser.add_argument('--workers','-w',
+                        dest='workers',
+                        default=None,
+                        type=int,
+                        help='Number of processes, defaults to one per core')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        default=0,
+                        type=int,
+                        help='Seed of the sampled runouts')
+    args = parser.parse_args()
+
+    keys,table = build_table(args.samples,args.ranges,args.seed,args.workers)
+    save_table(args.out,keys,table,args.ranges)
+    print(f'Saved {len(keys)} starting hands to {args.out}.npy')
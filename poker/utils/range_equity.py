@@ -0,0 +1,51 @@
+import numpy as np
+from functools import lru_cache
+from utils.cardlib import range_equity,encode_cards
+from utils.preflop_equity import canonical_hands,starting_hands
+from poker_env.data_classes import CARD_TABLE
+
+"""
+Omaha range versus range equity. Ranges are canonical hand ids (rows of preflop_equity.canonical_hands, the
+same ids PreflopEquity uses) with weights. Each id stands for all of its suit permutations, which are expanded
+to concrete combos, so card removal against the board and between the two hands is exact.
+
+All combo pairs go through a single rusteval range_equity call. It splits the runouts over threads, ranks every
+combo once per runout and sums the pair results straight into the (n_ids_a,n_ids_b) id pairs.
+"""
+
+@lru_cache(maxsize=1)
+def combos_by_id():
+    """Returns (270725,4) card id hands grouped by canonical id and the (n_ids + 1,) offsets of each id's group"""
+    _,_,counts,inverse = canonical_hands()
+    order = np.argsort(inverse,kind='stable')
+    return starting_hands()[0][order],np.concatenate(([0],np.cumsum(counts)))
+
+def expand(ids,board_ids):
+    """Concrete (n,4) card id combos of ids and the index into ids of each, combos holding a board card dropped"""
+    hands,offsets = combos_by_id()
+    ids = np.asarray(ids)
+    rows = np.concatenate([np.arange(offsets[i],offsets[i + 1]) for i in ids]) if len(ids) else np.zeros(0,dtype=np.int64)
+    owners = np.repeat(np.arange(len(ids)),offsets[ids + 1] - offsets[ids])
+    live = ~np.isin(hands[rows],board_ids).any(-1)
+    return hands[rows[live]],owners[live]
+
+def range_vs_range(range_a,range_b,board=(),iterations=1000,n_threads=0,seed=0):
+    """
+    range_a, range_b: (ids,weights) canonical hand ids and their weights, the weight applies to every combo of the id.
+    board: (0-5,2) [rank,suit] cards.
+    Returns the (n_a,n_b) equity of each id of range_a against each id of range_b (nan when every combo pair
+    is blocked) and the (n_a,) and (n_b,) weighted equity of each id against the opposing range.
+    """
+    (ids_a,weights_a),(ids_b,weights_b) = range_a,range_b
+    board = np.asarray(board,dtype=np.int64).reshape(-1,2)
+    board_ids = (board[:,0] - 2) * 4 + board[:,1] - 1
+    combos_a,owners_a = expand(ids_a,board_ids)
+    combos_b,owners_b = expand(ids_b,board_ids)
+    shares,counts = range_equity(encode_cards(CARD_TABLE[combos_a]),encode_cards(CARD_TABLE[combos_b]),encode_cards(board),
+        iterations=iterations,n_threads=n_threads,seed=seed,owners_a=owners_a,owners_b=owners_b,n_ids_a=len(ids_a),n_ids_b=len(ids_b))
+    weights_a,weights_b = np.asarray(weights_a,dtype=np.float64),np.asarray(weights_b,dtype=np.float64)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        matrix = shares / counts
+        equity_a = (shares * weights_b[None,:]).sum(1) / (counts * weights_b[None,:]).sum(1)
+        equity_b = ((counts - shares) * weights_a[:,None]).sum(0) / (counts * weights_a[:,None]).sum(0)
+    return matrix,equity_a,equity_b
@@ -0,0 +1,90 @@
+import numpy as np
+from collections import OrderedDict
+from utils.cardlib import batch_hand_ranks,batch_holdem_hand_ranks,encode_cards
+from utils.suit_isomorphism import canonical_key
+
+"""
+Hand rank cache keyed by the canonical (suit isomorphic) hand + board, so all suit permutations of a
+showdown share one entry.
+
+Two tiers in front of the evaluator:
+memory: bounded LRU of the most recently used keys.
+disk: optional read only table of (key,rank) rows sorted by key, saved with np.save and opened memory mapped,
+so worker processes can share one copy through the page cache. Build it with save().
+
+Batched lookups check the memory tier, then the disk tier, and send only what is left to the evaluator.
+
+Not wired into the environments: computing the canonical keys alone costs more than ranking a batch directly
+(about 35ms against 11ms for 20k Omaha hands).
+"""
+
+class RankCache(object):
+    def __init__(self,capacity=100000,path=None):
+        """
+        capacity: max entries in the memory tier
+        path: optional .npy table written by save()
+        """
+        self.capacity = capacity
+        self.memory = OrderedDict()
+        self.path = path
+        self.table = np.load(path,mmap_mode='r') if path is not None else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.memory)
+
+    def ranks(self,hands,boards):
+        """
+        hands: (N,2|4,2), boards: (N,5,2) numeric [rank,suit] cards.
+        Returns (N,) int32 ranks, lower is stronger
+        """
+        hands = np.asarray(hands,dtype=np.int64)
+        boards = np.asarray(boards,dtype=np.int64)
+        keys = canonical_key(hands,boards)
+        ranks = np.empty(len(keys),dtype=np.int32)
+        missing = []
+        for i,key in enumerate(keys.tolist()):
+            rank = self.memory.get(key)
+            if rank is None:
+                missing.append(i)
+            else:
+                self.memory.move_to_end(key)
+                ranks[i] = rank
+        self.hits += len(keys) - len(missing)
+        missing = np.array(missing,dtype=np.int64)
+        if missing.size and self.table is not None and len(self.table):
+            found,disk_ranks = self.lookup(keys[missing])
+            ranks[missing[found]] = disk_ranks
+            self.insert(keys[missing[found]],disk_ranks)
+            self.disk_hits += int(found.sum())
+            missing = missing[~found]
+        if missing.size:
+            rank_hands = batch_holdem_hand_ranks if hands.shape[1] == 2 else batch_hand_ranks
+            evaluated = rank_hands(encode_cards(hands[missing]),encode_cards(boards[missing]))
+            ranks[missing] = evaluated
+            self.insert(keys[missing],evaluated)
+            self.misses += missing.size
+        return ranks
+
+    def lookup(self,keys):
+        """Returns the (n,) found mask and the ranks of the found keys in the disk tier"""
+        index = np.minimum(np.searchsorted(self.table[:,0],keys),len(self.table) - 1)
+        found = self.table[index,0] == keys
+        return found,self.table[index[found],1].astype(np.int32)
+
+    def insert(self,keys,ranks):
+        for key,rank in zip(keys.tolist(),ranks.tolist()):
+            self.memory[key] = rank
+            self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def save(self,path):
+        """Writes the memory tier merged with the current disk tier as a sorted (key,rank) table"""
+        rows = np.array(list(self.memory.items()),dtype=np.int64).reshape(-1,2)
+        if self.table is not None:
+            rows = np.concatenate((np.asarray(self.table),rows))
+        keys,index = np.unique(rows[:,0],return_index=True)
+        np.save(path,np.stack((keys,rows[index,1]),axis=-1))
@@ -0,0 +1,95 @@
+import numpy as np
+
+"""
+Suit isomorphism. Hands that only differ by a permutation of suits play identically, so they can share
+cache entries, dataset rows and table slots.
+
+Cards are [rank 2-14, suit 1-4], rank 0 rows are padding (unknown board cards).
+Each suit gets the signature (hand rank bits << 13 | board rank bits). Suits are relabeled 1-4 in
+descending signature order, suits with equal signatures are interchangeable so any order between them gives
+the same result. Hand and board are then sorted by card id, which makes the form independent of card order.
+
+The key packs the sorted card ids + 1 (0 for padding) of up to 4 hand and 5 board cards in 6 bits each.
+
+All functions take NumPy arrays or torch tensors of shape (...,n_cards,2) and batch over the leading dims.
+Tensors are returned as tensors on their original device.
+"""
+
+MAX_HAND = 4
+MAX_BOARD = 5
+CARD_BITS = 6
+
+def card_ids(cards):
+    """(...,n,2) -> (...,n) ids (rank-2)*4 + suit-1, -1 for padding"""
+    ranks,suits = cards[...,0],cards[...,1]
+    return np.where(ranks > 0,(ranks - 2) * 4 + suits - 1,-1)
+
+def suit_masks(cards):
+    """(...,n,2) -> (...,4) rank bits of the cards of each suit"""
+    ranks,suits = cards[...,0],cards[...,1]
+    bits = np.where(ranks > 0,np.left_shift(1,np.maximum(ranks - 2,0)),0)
+    one_hot = suits[...,None] == np.arange(1,5)
+    return (bits[...,None] * one_hot).sum(-2)
+
+def sort_cards(cards):
+    """Sorts (...,n,2) cards by descending card id, padding last"""
+    order = np.argsort(-card_ids(cards),axis=-1,kind='stable')
+    return np.take_along_axis(cards,order[...,None],axis=-2)
+
+def _canonicalize(hand,board):
+    signature = (suit_masks(hand) << 13) | suit_masks(board)
+    order = np.argsort(-signature,axis=-1,kind='stable')
+    # new label of each original suit
+    labels = np.argsort(order,axis=-1) + 1
+    labels = np.concatenate((np.zeros(labels.shape[:-1] + (1,),dtype=labels.dtype),labels),axis=-1)
+    canonical = []
+    for cards in (hand,board):
+        suits = np.take_along_axis(labels,cards[...,1].reshape(cards.shape[:-2] + (-1,)),axis=-1)
+        canonical.append(sort_cards(np.stack((cards[...,0],np.where(cards[...,0] > 0,suits,0)),axis=-1)))
+    return canonical
+
+def _key(hand,board):
+    ids = np.concatenate((_pad(card_ids(hand) + 1,MAX_HAND),_pad(card_ids(board) + 1,MAX_BOARD)),axis=-1).astype(np.int64)
+    shifts = np.arange(ids.shape[-1],dtype=np.int64) * CARD_BITS
+    return (ids << shifts).sum(-1)
+
+def _pad(ids,width):
+    assert ids.shape[-1] <= width,f'at most {width} cards'
+    return np.concatenate((ids,np.zeros(ids.shape[:-1] + (width - ids.shape[-1],),dtype=ids.dtype)),axis=-1)
+
+def _to_numpy(x):
+    if hasattr(x,'detach'):
+        return x.detach().cpu().numpy().astype(np.int64),x
+    return np.asarray(x,dtype=np.int64),None
+
+def _like(x,tensor):
+    if tensor is None:
+        return x
+    import torch
+    return torch.from_numpy(np.asarray(x)).to(device=tensor.device)
+
+def canonicalize(hand,board):
+    """
+    hand: (...,n_hand,2), board: (...,n_board,2) with rank 0 padding.
+    Returns the canonical hand, board and (...) int64 keys
+    """
+    (hand,tensor),(board,_) = _to_numpy(hand),_to_numpy(board)
+    hand,board = _canonicalize(hand,board)
+    return _like(hand,tensor),_like(board,tensor),_like(_key(hand,board),tensor)
+
+def canonical_key(hand,board):
+    """Stable 64 bit key shared by all suit permutations and card orders of hand and board"""
+    return canonicalize(hand,board)[2]
+
+def relabel_suits(suits):
+    """
+    (...,n) suits 1-4 -> suits relabeled 1-4 in order of first appearance along the last axis, 0 (padding) stays 0.
+    Vectorized form of the per row loop in model_utils.swap_suit_vector
+    """
+    suits,tensor = _to_numpy(suits)
+    n = suits.shape[-1]
+    present = suits[...,None] == np.arange(1,5)
+    first = np.where(present.any(-2),present.argmax(-2),n)
+    labels = np.argsort(np.argsort(first,axis=-1,kind='stable'),axis=-1) + 1
+    relabeled = np.take_along_axis(labels,np.maximum(suits - 1,0),axis=-1)
+    return _like(np.where(suits > 0,relabeled,0),tensor)
@@ -0,0 +1,91 @@
+// Generates a perfect hash over tables::CARD_PRODUCTS so rank() can look up the prime product
+// of a paired hand in constant time instead of binary searching, and the eight or better low table.
+//
+// Hash and displace: keys are split into 2^BUCKET_BITS buckets by hash1, then each bucket (largest first)
+// gets the smallest displacement that moves all of its keys into free slots of a 2^SLOT_BITS table under
+// hash2. Lookup is slot = (hash2(key) ^ PRODUCT_DISPLACEMENTS[hash1(key)]) & PRODUCT_SLOT_MASK.
+//
+// Lows are indexed by the 8 bit mask of their five ranks (ace bit 0, deuce to eight bits 1-7). With the highest
+// card in the highest bit a smaller mask is a better low, so LOW_RANKS numbers the 56 five bit masks in
+// increasing order (0 = A2345) and marks every other mask 0xFF.
+
+use std::env;
+use std::fs::File;
+use std::io::Write;
+use std::path::Path;
+
+#[allow(dead_code)]
+mod tables {
+    include!("src/tables.rs");
+}
+
+#[path = "src/product_hash.rs"]
+mod product_hash;
+
+use product_hash::{hash1, hash2, BUCKET_BITS, SLOT_BITS};
+
+fn main() {
+    println!("cargo:rerun-if-changed=build.rs");
+    println!("cargo:rerun-if-changed=src/tables.rs");
+    println!("cargo:rerun-if-changed=src/product_hash.rs");
+    let n_buckets = 1usize << BUCKET_BITS;
+    let n_slots = 1usize << SLOT_BITS;
+    let mask = n_slots - 1;
+
+    let mut buckets: Vec<Vec<usize>> = vec![Vec::new(); n_buckets];
+    for (i, product) in tables::CARD_PRODUCTS.iter().enumerate() {
+        buckets[hash1(*product as u32)].push(i);
+    }
+    let mut order: Vec<usize> = (0..n_buckets).collect();
+    order.sort_by(|a, b| buckets[*b].len().cmp(&buckets[*a].len()));
+
+    let mut displacements = vec![0u16; n_buckets];
+    let mut keys = vec![0i32; n_slots];
+    let mut ranks = vec![0i16; n_slots];
+    let mut used = vec![false; n_slots];
+    for bucket in order {
+        if buckets[bucket].is_empty() {
+            break;
+        }
+        let mut found = false;
+        for d in 0..n_slots {
+            let slots: Vec<usize> = buckets[bucket].iter().map(|i| (hash2(tables::CARD_PRODUCTS[*i] as u32) ^ d) & mask).collect();
+            let mut distinct = slots.clone();
+            distinct.sort();
+            distinct.dedup();
+            if distinct.len() == slots.len() && slots.iter().all(|s| !used[*s]) {
+                for (slot, i) in slots.iter().zip(buckets[bucket].iter()) {
+                    used[*slot] = true;
+                    keys[*slot] = tables::CARD_PRODUCTS[*i];
+                    ranks[*slot] = tables::PRODUCT_RANKS[*i];
+                }
+                displacements[bucket] = d as u16;
+                found = true;
+                break;
+            }
+        }
+        assert!(found, "no displacement found for bucket {}", bucket);
+    }
+
+    let out_dir = env::var("OUT_DIR").unwrap();
+    write_low_table(Path::new(&out_dir).join("low_table.rs").as_path());
+    let path = Path::new(&out_dir).join("product_hash_table.rs");
+    let mut f = File::create(&path).unwrap();
+    writeln!(f, "pub const PRODUCT_SLOT_MASK: usize = {};", mask).unwrap();
+    writeln!(f, "pub static PRODUCT_DISPLACEMENTS: [u16; {}] = {:?};", n_buckets, displacements).unwrap();
+    writeln!(f, "pub static PRODUCT_KEYS: [i32; {}] = {:?};", n_slots, keys).unwrap();
+    writeln!(f, "pub static PRODUCT_HASH_RANKS: [i16; {}] = {:?};", n_slots, ranks).unwrap();
+}
+
+fn write_low_table(path: &Path) {
+    let mut low_ranks = [0xFFu8; 256];
+    let mut next = 0;
+    for mask in 0..256usize {
+        if (mask as u32).count_ones() == 5 {
+            low_ranks[mask] = next;
+            next += 1;
+        }
+    }
+    let mut f = File::create(path).unwrap();
+    writeln!(f, "pub static LOW_RANKS: [u8; 256] = {:?};", low_ranks.to_vec()).unwrap();
+}
@@ -1,6 +1,7 @@
 extern crate libc;
 
 use self::libc::{c_long, c_char};
+use tables;
 
 pub fn card_format(card: c_long) -> String {
     format!("{:08b} {:08b} {:08b} {:08b}", card >> 24, (card >> 16) & 0xFF, (card >> 8) & 0xFF, card & 0xFF)
@@ -11,3 +12,12 @@ pub extern fn encode(rank: c_char, suit: c_char) -> c_long {
     let prime_rank: c_long = [2,3,5,7,11,13,17,19,23,29,31,37,41][rank as usize];
     (1 << (12 + suit)) as c_long | (1 << (16 + rank)) as c_long | ((rank as c_long) << 8) | prime_rank
 }
+
+/// Copies the 52 encoded cards of tables::DECK into out
+#[no_mangle]
+pub extern fn deck_table(out: *mut c_long) {
+    let out = unsafe { ::std::slice::from_raw_parts_mut(out, tables::DECK.len()) };
+    for (card, encoded) in out.iter_mut().zip(tables::DECK.iter()) {
+        *card = *encoded as c_long;
+    }
+}
@@ -0,0 +1,233 @@
+extern crate libc;
+
+use std::slice;
+use std::sync::Arc;
+use std::thread;
+use sim::{BoardInfo, best_rank_w_board_info, holdem_best_rank_w_board};
+use rng::SplitMix;
+use tables;
+use self::libc::{c_long, c_int, c_double, c_ulonglong};
+
+pub const MAX_PLAYERS: usize = 6;
+// Threads used when the core count can't be read
+const DEFAULT_THREADS: usize = 4;
+// Pot shares are counted in 1/SHARE_UNITS of a pot, divisible by every number of tied players,
+// so tallies stay integers and sum the same in any order
+const SHARE_UNITS: u64 = 60;
+// Error codes returned in place of the number of runouts. Asserting instead would abort the calling process
+pub const BAD_PLAYER_COUNT: c_int = -1;
+pub const BAD_HAND_WIDTH: c_int = -2;
+pub const BAD_BOARD_LENGTH: c_int = -3;
+pub const BAD_CARDS: c_int = -4;
+pub const BAD_OWNERS: c_int = -5;
+
+/// Equity of n_players (2-6) hands of cards_per_player (2 or 4) cards given n_board (0-5) known board cards.
+/// Enumerates every runout when there are at most iterations of them, otherwise samples iterations runouts
+/// spread over n_threads threads (0 for one per core). Runout i is drawn from position i of the
+/// (seed, stream) generator, so results only depend on the seed and stream, not the thread count.
+/// Writes each player's win, tie and loss fractions and pot share (ties split evenly) into the n_players long outputs.
+/// Returns the number of runouts evaluated, or one of the negative error codes above for invalid inputs.
+#[no_mangle]
+pub extern fn equity(hands: *const c_long, n_players: c_int, cards_per_player: c_int, board: *const c_long, n_board: c_int,
+                     iterations: c_int, n_threads: c_int, seed: c_ulonglong, stream: c_ulonglong,
+                     wins: *mut c_double, ties: *mut c_double, losses: *mut c_double, shares: *mut c_double) -> c_int {
+    if n_players < 2 || n_players as usize > MAX_PLAYERS {
+        return BAD_PLAYER_COUNT;
+    }
+    if cards_per_player != 2 && cards_per_player != 4 {
+        return BAD_HAND_WIDTH;
+    }
+    if n_board < 0 || n_board > 5 {
+        return BAD_BOARD_LENGTH;
+    }
+    let n_players = n_players as usize;
+    let cards_per_player = cards_per_player as usize;
+    let n_board = n_board as usize;
+    let hands = unsafe { slice::from_raw_parts(hands, n_players * cards_per_player) }.to_vec();
+    let known = unsafe { slice::from_raw_parts(board, n_board) };
+    let mut dealt = hands.clone();
+    dealt.extend_from_slice(known);
+    if !distinct_cards(&dealt) {
+        return BAD_CARDS;
+    }
+    let mut showdown = Showdown { hands: hands, n_players: n_players, cards_per_player: cards_per_player, board: [0; 5], n_board: n_board };
+    showdown.board[..n_board].copy_from_slice(known);
+    let remaining: Vec<c_long> = tables::DECK.iter()
+        .map(|card| *card as c_long)
+        .filter(|card| !showdown.hands.contains(card) && !known.contains(card))
+        .collect();
+
+    let iterations = iterations.max(1) as u64;
+    let tally = if n_runouts(remaining.len() as u64, (5 - n_board) as u64) <= iterations {
+        let mut tally = Tally::new();
+        showdown.enumerate(&remaining, &mut tally);
+        tally
+    } else {
+        let n_threads = if n_threads > 0 { n_threads as usize } else { n_cores() };
+        sample_parallel(showdown, remaining, iterations, n_threads.min(iterations as usize), seed, stream)
+    };
+
+    let outputs = [wins, ties, losses, shares];
+    let counts = [tally.wins, tally.ties, tally.losses, tally.shares];
+    let units = [1, 1, 1, SHARE_UNITS];
+    for ((output, count), unit) in outputs.iter().zip(counts.iter()).zip(units.iter()) {
+        let output = unsafe { slice::from_raw_parts_mut(*output, n_players) };
+        for player in 0..n_players {
+            output[player] = count[player] as f64 / (tally.runouts * unit) as f64;
+        }
+    }
+    tally.runouts as c_int
+}
+
+/// Win, tie and loss counts and summed pot shares (in SHARE_UNITS) per player
+struct Tally {
+    wins: [u64; MAX_PLAYERS],
+    ties: [u64; MAX_PLAYERS],
+    losses: [u64; MAX_PLAYERS],
+    shares: [u64; MAX_PLAYERS],
+    runouts: u64,
+}
+
+impl Tally {
+    fn new() -> Tally {
+        Tally { wins: [0; MAX_PLAYERS], ties: [0; MAX_PLAYERS], losses: [0; MAX_PLAYERS], shares: [0; MAX_PLAYERS], runouts: 0 }
+    }
+
+    fn add(&mut self, other: &Tally) {
+        for player in 0..MAX_PLAYERS {
+            self.wins[player] += other.wins[player];
+            self.ties[player] += other.ties[player];
+            self.losses[player] += other.losses[player];
+            self.shares[player] += other.shares[player];
+        }
+        self.runouts += other.runouts;
+    }
+}
+
+struct Showdown {
+    hands: Vec<c_long>,
+    n_players: usize,
+    cards_per_player: usize,
+    board: [c_long; 5],
+    n_board: usize,
+}
+
+impl Showdown {
+    fn evaluate(&self, board: &[c_long; 5], tally: &mut Tally) {
+        let mut ranks = [0i32; MAX_PLAYERS];
+        if self.cards_per_player == 4 {
+            let info = BoardInfo::new(board);
+            for player in 0..self.n_players {
+                let hand = &self.hands[player * 4..player * 4 + 4];
+                ranks[player] = best_rank_w_board_info([hand[0], hand[1], hand[2], hand[3]], &info);
+            }
+        } else {
+            for player in 0..self.n_players {
+                ranks[player] = holdem_best_rank_w_board([self.hands[player * 2], self.hands[player * 2 + 1]], *board);
+            }
+        }
+        let best = *ranks[..self.n_players].iter().min().unwrap();
+        let n_best = ranks[..self.n_players].iter().filter(|rank| **rank == best).count();
+        for player in 0..self.n_players {
+            if ranks[player] != best {
+                tally.losses[player] += 1;
+            } else {
+                if n_best == 1 {
+                    tally.wins[player] += 1;
+                } else {
+                    tally.ties[player] += 1;
+                }
+                tally.shares[player] += SHARE_UNITS / n_best as u64;
+            }
+        }
+        tally.runouts += 1;
+    }
+
+    /// Every combination of the missing board cards from remaining
+    fn enumerate(&self, remaining: &[c_long], tally: &mut Tally) {
+        let missing = 5 - self.n_board;
+        let n = remaining.len();
+        let mut board = self.board;
+        let mut index: Vec<usize> = (0..missing).collect();
+        loop {
+            for (k, i) in index.iter().enumerate() {
+                board[self.n_board + k] = remaining[*i];
+            }
+            self.evaluate(&board, tally);
+            let mut k = missing;
+            while k > 0 && index[k - 1] == n - missing + k - 1 {
+                k -= 1;
+            }
+            if k == 0 {
+                return;
+            }
+            index[k - 1] += 1;
+            for j in k..missing {
+                index[j] = index[j - 1] + 1;
+            }
+        }
+    }
+
+    /// Random runouts start..end, drawing the missing cards with a partial Fisher-Yates shuffle.
+    /// The swaps are undone after each runout so every runout starts from the same deck order
+    fn sample(&self, mut remaining: Vec<c_long>, start: u64, end: u64, seed: u64, stream: u64) -> Tally {
+        let missing = 5 - self.n_board;
+        let n = remaining.len() as u64;
+        let mut board = self.board;
+        let mut swaps = [0usize; 5];
+        let mut tally = Tally::new();
+        for runout in start..end {
+            let mut rng = SplitMix::at(seed, stream, runout * missing as u64);
+            for k in 0..missing {
+                let j = k + rng.below(n - k as u64) as usize;
+                remaining.swap(k, j);
+                swaps[k] = j;
+                board[self.n_board + k] = remaining[k];
+            }
+            self.evaluate(&board, &mut tally);
+            for k in (0..missing).rev() {
+                remaining.swap(k, swaps[k]);
+            }
+        }
+        tally
+    }
+}
+
+/// Splits runouts 0..iterations into one contiguous range per thread
+fn sample_parallel(showdown: Showdown, remaining: Vec<c_long>, iterations: u64, n_threads: usize, seed: u64, stream: u64) -> Tally {
+    let showdown = Arc::new(showdown);
+    let handles: Vec<_> = (0..n_threads as u64).map(|i| {
+        let showdown = showdown.clone();
+        let remaining = remaining.clone();
+        let start = iterations * i / n_threads as u64;
+        let end = iterations * (i + 1) / n_threads as u64;
+        thread::spawn(move || showdown.sample(remaining, start, end, seed, stream))
+    }).collect();
+    let mut tally = Tally::new();
+    for handle in handles {
+        tally.add(&handle.join().unwrap());
+    }
+    tally
+}
+
+/// Number of online cores. Read through sysconf rather than thread::available_parallelism (Rust 1.59),
+/// so the crate still builds with older distribution toolchains
+pub fn n_cores() -> usize {
+    #[cfg(unix)]
+    {
+        let n = unsafe { libc::sysconf(libc::_SC_NPROCESSORS_ONLN) };
+        if n > 0 {
+            return n as usize;
+        }
+    }
+    DEFAULT_THREADS
+}
+
+/// True when every card is an encoded card of the deck and none repeats
+pub fn distinct_cards(cards: &[c_long]) -> bool {
+    cards.iter().enumerate().all(|(i, card)| tables::DECK.contains(&(*card as i64)) && !cards[..i].contains(card))
+}
+
+pub fn n_runouts(n: u64, k: u64) -> u64 {
+    (0..k).fold(1, |total, i| total * (n - i) / (i + 1))
+}
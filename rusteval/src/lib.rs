@@ -1,4 +1,9 @@
 pub mod encode;
 pub mod rank;
 pub mod tables;
-pub mod sim;
\ No newline at end of file
+pub mod product_hash;
+pub mod rng;
+pub mod sim;
+pub mod lo;
+pub mod equity;
+pub mod range;
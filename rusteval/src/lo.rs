@@ -0,0 +1,216 @@
+extern crate libc;
+
+use std::slice;
+use sim::{BoardInfo, best_rank_w_board_info, HAND_COMBOS, BOARD_COMBOS};
+use self::libc::{c_long, c_int, c_double};
+
+// LOW_RANKS, generated by build.rs
+mod low_table {
+    include!(concat!(env!("OUT_DIR"), "/low_table.rs"));
+}
+
+/// Low rank of a hand without a qualifying eight or better low, worse than every low
+pub const NO_LOW: i32 = 0xFF;
+
+/// Low bit of each Cactus Kev rank ((card >> 8) & 0xF, deuce = 0). Ace is bit 0, deuce to eight bits 1-7,
+/// nine and up can't play in the low
+const LOW_BITS: [u8; 16] = [2, 4, 8, 16, 32, 64, 128, 0, 0, 0, 0, 0, 1, 0, 0, 0];
+
+fn low_bit(card: c_long) -> u8 {
+    LOW_BITS[((card >> 8) & 0xF) as usize]
+}
+
+/// Board side of the low evaluation. Low bits of the 10 three card board combinations, 0 for combinations
+/// that can't be part of a low (paired or holding a card above eight)
+pub struct LowBoard {
+    masks: [u8; 10],
+    low_possible: bool,
+}
+
+impl LowBoard {
+    pub fn new(board: &[c_long]) -> LowBoard {
+        let mut info = LowBoard { masks: [0; 10], low_possible: false };
+        for (bi, bc) in BOARD_COMBOS.iter().enumerate() {
+            let (c, d, e) = (low_bit(board[bc.0]), low_bit(board[bc.1]), low_bit(board[bc.2]));
+            let mask = c | d | e;
+            if mask.count_ones() == 3 {
+                info.masks[bi] = mask;
+                info.low_possible = true;
+            }
+        }
+        info
+    }
+}
+
+/// Best eight or better low of exactly 2 hand and 3 board cards, 0 (A2345) to 55, NO_LOW when none qualifies
+pub fn best_low_w_board_info(hand: [c_long; 4], board: &LowBoard) -> i32 {
+    let mut cur_rank = NO_LOW;
+    if !board.low_possible {
+        return cur_rank;
+    }
+    let bits = [low_bit(hand[0]), low_bit(hand[1]), low_bit(hand[2]), low_bit(hand[3])];
+    for hc in HAND_COMBOS.iter() {
+        let hand_mask = bits[hc.0] | bits[hc.1];
+        if hand_mask.count_ones() != 2 {
+            continue;
+        }
+        for board_mask in board.masks.iter() {
+            if *board_mask != 0 && hand_mask & board_mask == 0 {
+                let new_rank = low_table::LOW_RANKS[(hand_mask | board_mask) as usize] as i32;
+                if new_rank < cur_rank {
+                    cur_rank = new_rank;
+                }
+            }
+        }
+    }
+    cur_rank
+}
+
+/// Omaha hi/lo showdowns of n_players 4 card hands on each of n boards. hands (n,n_players,4) and boards (n,5)
+/// row major. Writes every player's high rank, low rank (NO_LOW when it doesn't qualify) and share of the pot
+/// into the (n,n_players) outputs: half to the best high and half to the best low, all of it to the best high
+/// when no low qualifies, ties split evenly.
+#[no_mangle]
+pub extern fn hilo_showdowns(hands: *const c_long, boards: *const c_long, n: c_int, n_players: c_int,
+                             hi_ranks: *mut c_int, lo_ranks: *mut c_int, shares: *mut c_double) {
+    let n = n as usize;
+    let n_players = n_players as usize;
+    let hands = unsafe { slice::from_raw_parts(hands as *const [c_long; 4], n * n_players) };
+    let boards = unsafe { slice::from_raw_parts(boards as *const [c_long; 5], n) };
+    let hi_ranks = unsafe { slice::from_raw_parts_mut(hi_ranks, n * n_players) };
+    let lo_ranks = unsafe { slice::from_raw_parts_mut(lo_ranks, n * n_players) };
+    let shares = unsafe { slice::from_raw_parts_mut(shares, n * n_players) };
+    for (i, board) in boards.iter().enumerate() {
+        let rows = i * n_players..(i + 1) * n_players;
+        let hi_board = BoardInfo::new(board);
+        let lo_board = LowBoard::new(board);
+        for player in rows.clone() {
+            hi_ranks[player] = best_rank_w_board_info(hands[player], &hi_board);
+            lo_ranks[player] = best_low_w_board_info(hands[player], &lo_board);
+        }
+        split_hilo(&hi_ranks[rows.clone()], &lo_ranks[rows.clone()], &mut shares[rows]);
+    }
+}
+
+fn split_hilo(hi_ranks: &[c_int], lo_ranks: &[c_int], shares: &mut [c_double]) {
+    let best_hi = *hi_ranks.iter().min().unwrap();
+    let best_lo = *lo_ranks.iter().min().unwrap();
+    let n_hi = hi_ranks.iter().filter(|rank| **rank == best_hi).count() as f64;
+    let n_lo = lo_ranks.iter().filter(|rank| **rank == best_lo).count() as f64;
+    let hi_pot = if best_lo == NO_LOW { 1. } else { 0.5 };
+    for player in 0..shares.len() {
+        shares[player] = 0.;
+        if hi_ranks[player] == best_hi {
+            shares[player] += hi_pot / n_hi;
+        }
+        if best_lo != NO_LOW && lo_ranks[player] == best_lo {
+            shares[player] += 0.5 / n_lo;
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::time::Instant;
+    use sim::best_rank_w_board_info;
+    use tables;
+
+    /// Low ranks 1-8 (ace low) of the cards, highest first
+    fn low_values(cards: &[c_long]) -> Vec<i32> {
+        let mut values: Vec<i32> = cards.iter().map(|card| {
+            let rank = ((card >> 8) & 0xF) as i32;
+            if rank == 12 { 1 } else { rank + 2 }
+        }).collect();
+        values.sort_by(|a, b| b.cmp(a));
+        values
+    }
+
+    /// Best low over all 60 combinations as the descending low values, None when nothing qualifies
+    fn best_low_combos(hand: [c_long; 4], board: [c_long; 5]) -> Option<Vec<i32>> {
+        let mut best: Option<Vec<i32>> = None;
+        for hc in HAND_COMBOS.iter() {
+            for bc in BOARD_COMBOS.iter() {
+                let values = low_values(&[hand[hc.0], hand[hc.1], board[bc.0], board[bc.1], board[bc.2]]);
+                let mut distinct = values.clone();
+                distinct.dedup();
+                if distinct.len() == 5 && values[0] <= 8 && best.as_ref().map_or(true, |b| values < *b) {
+                    best = Some(values);
+                }
+            }
+        }
+        best
+    }
+
+    /// n random (hand, board) showdowns drawn without replacement from the deck with a xorshift generator
+    fn random_showdowns(n: usize) -> Vec<([c_long; 4], [c_long; 5])> {
+        let mut state: u64 = 0x9E3779B97F4A7C15;
+        let mut showdowns = Vec::with_capacity(n);
+        for _ in 0..n {
+            let mut deck: Vec<c_long> = tables::DECK.iter().map(|card| *card as c_long).collect();
+            for i in 0..9 {
+                state ^= state << 13;
+                state ^= state >> 7;
+                state ^= state << 17;
+                let j = i + (state % (52 - i as u64)) as usize;
+                deck.swap(i, j);
+            }
+            showdowns.push(([deck[0], deck[1], deck[2], deck[3]], [deck[4], deck[5], deck[6], deck[7], deck[8]]));
+        }
+        showdowns
+    }
+
+    #[test]
+    fn best_low_matches_combos() {
+        let showdowns = random_showdowns(20000);
+        let mut lows: Vec<(Vec<i32>, i32)> = Vec::new();
+        for (hand, board) in showdowns {
+            let rank = best_low_w_board_info(hand, &LowBoard::new(&board));
+            match best_low_combos(hand, board) {
+                None => assert_eq!(rank, NO_LOW),
+                Some(values) => lows.push((values, rank)),
+            }
+        }
+        assert!(lows.len() > 1000);
+        // ranks order lows the same way as comparing their cards from the highest down
+        for pair in lows.windows(2) {
+            assert_eq!(pair[0].0.cmp(&pair[1].0), pair[0].1.cmp(&pair[1].1));
+        }
+    }
+
+    #[test]
+    fn hilo_splits() {
+        // ace deuce makes A2346 for the whole low, the set of kings wins the high
+        let card = |rank: i32, suit: i32| tables::DECK[(suit * 13 + rank) as usize] as c_long;
+        let hands = [card(12, 0), card(0, 1), card(9, 2), card(8, 3),
+                     card(11, 0), card(11, 1), card(10, 2), card(10, 3)];
+        let board = [card(11, 2), card(1, 0), card(2, 1), card(4, 2), card(5, 3)];
+        let (mut hi, mut lo, mut shares) = ([0; 2], [0; 2], [0.; 2]);
+        hilo_showdowns(hands.as_ptr(), board.as_ptr(), 1, 2, hi.as_mut_ptr(), lo.as_mut_ptr(), shares.as_mut_ptr());
+        assert!(hi[1] < hi[0]);
+        assert_eq!(lo, [low_table::LOW_RANKS[0b0010_1111] as i32, NO_LOW]);
+        assert_eq!(shares, [0.5, 0.5]);
+    }
+
+    /// Random Omaha showdowns per second, high only against high and low.
+    /// cargo test --release -- --ignored --nocapture bench_hilo
+    #[test]
+    #[ignore]
+    fn bench_hilo() {
+        let showdowns = random_showdowns(1000000);
+        for &hilo in [false, true].iter() {
+            let start = Instant::now();
+            let mut checksum = 0i64;
+            for &(hand, board) in showdowns.iter() {
+                checksum += best_rank_w_board_info(hand, &BoardInfo::new(&board)) as i64;
+                if hilo {
+                    checksum += best_low_w_board_info(hand, &LowBoard::new(&board)) as i64;
+                }
+            }
+            let elapsed = start.elapsed();
+            let seconds = elapsed.as_secs() as f64 + elapsed.subsec_nanos() as f64 * 1e-9;
+            println!("{:<8} {} showdowns {:.3}s {:.0} hands/s checksum {}", if hilo { "hi/lo" } else { "hi" },
+                     showdowns.len(), seconds, showdowns.len() as f64 / seconds, checksum);
+        }
+    }
+}
@@ -0,0 +1,16 @@
+// Hash functions of the CARD_PRODUCTS perfect hash. Shared by build.rs, which builds the
+// displacement table, and rank.rs, which looks products up in it.
+
+pub const BUCKET_BITS: u32 = 11;
+pub const SLOT_BITS: u32 = 13;
+
+pub fn hash1(key: u32) -> usize {
+    (key.wrapping_mul(0x9E3779B1) >> (32 - BUCKET_BITS)) as usize
+}
+
+pub fn hash2(key: u32) -> usize {
+    let mut x = key ^ (key >> 15);
+    x = x.wrapping_mul(0x85EBCA6B);
+    x ^= x >> 13;
+    x as usize
+}
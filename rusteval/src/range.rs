@@ -0,0 +1,212 @@
+extern crate libc;
+
+use std::slice;
+use std::sync::Arc;
+use std::thread;
+use sim::{BoardInfo, best_rank_w_board_info, holdem_best_rank_w_board};
+use equity::{n_runouts, n_cores, distinct_cards, BAD_HAND_WIDTH, BAD_BOARD_LENGTH, BAD_CARDS, BAD_OWNERS};
+use rng::SplitMix;
+use tables;
+use self::libc::{c_long, c_int, c_double, c_ulonglong};
+
+/// Pairwise equity of the hands of range a against the hands of range b (n_a and n_b hands of cards_per_player
+/// cards, row major) given n_board (0-5) known board cards, summed per owner: hand i of a belongs to id
+/// owners_a[i] (0..n_ids_a), hand j of b to owners_b[j] (0..n_ids_b).
+/// Runouts are enumerated when there are at most iterations of them, otherwise iterations runouts are sampled
+/// from the (seed, stream) generator. Each runout ranks every hand once, then compares all pairs.
+/// Pairs sharing a card and hands blocked by the runout are skipped.
+/// Writes the (n_ids_a,n_ids_b) summed pot shares of the a hands (1 win, 0.5 tie) and the number of hand pairs
+/// times runouts compared. Runouts are split over n_threads threads (0 for one per core). Tallies are kept in
+/// integers, so results don't depend on the thread count.
+/// Returns the number of runouts, or a negative equity error code when the hand width or the board length is
+/// invalid, when a hand or the board holds an invalid or repeated card, or when an owner is out of range.
+#[no_mangle]
+pub extern fn range_equity(hands_a: *const c_long, owners_a: *const c_int, n_a: c_int, n_ids_a: c_int,
+                           hands_b: *const c_long, owners_b: *const c_int, n_b: c_int, n_ids_b: c_int, cards_per_player: c_int,
+                           board: *const c_long, n_board: c_int, iterations: c_int, n_threads: c_int, seed: c_ulonglong,
+                           stream: c_ulonglong, shares: *mut c_double, counts: *mut c_double) -> c_int {
+    if cards_per_player != 2 && cards_per_player != 4 {
+        return BAD_HAND_WIDTH;
+    }
+    if n_board < 0 || n_board > 5 {
+        return BAD_BOARD_LENGTH;
+    }
+    let (n_a, n_b, cards_per_player, n_board) = (n_a.max(0) as usize, n_b.max(0) as usize, cards_per_player as usize, n_board as usize);
+    let (n_ids_a, n_ids_b) = (n_ids_a.max(0) as usize, n_ids_b.max(0) as usize);
+    let known = unsafe { slice::from_raw_parts(board, n_board) };
+    let a = unsafe { slice::from_raw_parts(hands_a, n_a * cards_per_player) };
+    let b = unsafe { slice::from_raw_parts(hands_b, n_b * cards_per_player) };
+    if !distinct_cards(known) || !a.chunks(cards_per_player).chain(b.chunks(cards_per_player)).all(distinct_cards) {
+        return BAD_CARDS;
+    }
+    let owners_a = unsafe { slice::from_raw_parts(owners_a, n_a) };
+    let owners_b = unsafe { slice::from_raw_parts(owners_b, n_b) };
+    if owners_a.iter().any(|owner| *owner < 0 || *owner as usize >= n_ids_a) || owners_b.iter().any(|owner| *owner < 0 || *owner as usize >= n_ids_b) {
+        return BAD_OWNERS;
+    }
+    let ranges = Arc::new(Ranges {
+        a: Range::new(a, owners_a, cards_per_player),
+        b: Range::new(b, owners_b, cards_per_player),
+        n_ids_b: n_ids_b,
+        n_ids: n_ids_a * n_ids_b,
+        cards_per_player: cards_per_player,
+        boards: runouts(known, iterations.max(1) as u64, seed, stream),
+    });
+    let n_boards = ranges.boards.len();
+
+    let n_threads = if n_threads > 0 { n_threads as usize } else { n_cores() }.min(n_boards);
+    let handles: Vec<_> = (0..n_threads).map(|i| {
+        let ranges = ranges.clone();
+        let (start, end) = (n_boards * i / n_threads, n_boards * (i + 1) / n_threads);
+        thread::spawn(move || ranges.compare(start, end))
+    }).collect();
+    let mut half_shares = vec![0u64; ranges.n_ids];
+    let mut pairs = vec![0u64; ranges.n_ids];
+    for handle in handles {
+        let (thread_shares, thread_pairs) = handle.join().unwrap();
+        for k in 0..ranges.n_ids {
+            half_shares[k] += thread_shares[k];
+            pairs[k] += thread_pairs[k];
+        }
+    }
+    let shares = unsafe { slice::from_raw_parts_mut(shares, ranges.n_ids) };
+    let counts = unsafe { slice::from_raw_parts_mut(counts, ranges.n_ids) };
+    for k in 0..ranges.n_ids {
+        shares[k] = half_shares[k] as f64 / 2.;
+        counts[k] = pairs[k] as f64;
+    }
+    n_boards as c_int
+}
+
+struct Range {
+    hands: Vec<c_long>,
+    masks: Vec<u64>,
+    owners: Vec<usize>,
+}
+
+impl Range {
+    fn new(hands: &[c_long], owners: &[c_int], cards_per_player: usize) -> Range {
+        Range {
+            hands: hands.to_vec(),
+            masks: hands.chunks(cards_per_player).map(card_mask).collect(),
+            owners: owners.iter().map(|owner| *owner as usize).collect(),
+        }
+    }
+}
+
+struct Ranges {
+    a: Range,
+    b: Range,
+    n_ids_b: usize,
+    n_ids: usize,
+    cards_per_player: usize,
+    boards: Vec<[c_long; 5]>,
+}
+
+impl Ranges {
+    /// Owner summed shares (in half pots) and pair counts over runouts start..end, (n_ids_a,n_ids_b) row major
+    fn compare(&self, start: usize, end: usize) -> (Vec<u64>, Vec<u64>) {
+        let mut shares = vec![0u64; self.n_ids];
+        let mut pairs = vec![0u64; self.n_ids];
+        let mut ranks_a = vec![0i32; self.a.masks.len()];
+        // (rank, mask, owner) of the b hands the runout doesn't block
+        let mut live_b: Vec<(i32, u64, usize)> = Vec::with_capacity(self.b.masks.len());
+        for board in self.boards[start..end].iter() {
+            let board_mask = card_mask(board);
+            let info = if self.cards_per_player == 4 { Some(BoardInfo::new(board)) } else { None };
+            self.rank_hands(&self.a, board, board_mask, &info, &mut ranks_a);
+            live_b.clear();
+            for j in 0..self.b.masks.len() {
+                let rank = self.rank(&self.b, j, board, board_mask, &info);
+                if rank >= 0 {
+                    live_b.push((rank, self.b.masks[j], self.b.owners[j]));
+                }
+            }
+            for (i, rank_a) in ranks_a.iter().enumerate() {
+                if *rank_a < 0 {
+                    continue;
+                }
+                let (mask_a, row) = (self.a.masks[i], self.a.owners[i] * self.n_ids_b);
+                for &(rank_b, mask_b, owner_b) in live_b.iter() {
+                    if mask_a & mask_b != 0 {
+                        continue;
+                    }
+                    pairs[row + owner_b] += 1;
+                    shares[row + owner_b] += if *rank_a < rank_b { 2 } else if *rank_a == rank_b { 1 } else { 0 };
+                }
+            }
+        }
+        (shares, pairs)
+    }
+
+    fn rank_hands(&self, range: &Range, board: &[c_long; 5], board_mask: u64, info: &Option<BoardInfo>, ranks: &mut [i32]) {
+        for (i, rank) in ranks.iter_mut().enumerate() {
+            *rank = self.rank(range, i, board, board_mask, info);
+        }
+    }
+
+    /// Rank of hand i of range on board, -1 when it holds one of the board cards
+    fn rank(&self, range: &Range, i: usize, board: &[c_long; 5], board_mask: u64, info: &Option<BoardInfo>) -> i32 {
+        let hand = &range.hands[i * self.cards_per_player..(i + 1) * self.cards_per_player];
+        if range.masks[i] & board_mask != 0 {
+            -1
+        } else if let Some(ref info) = *info {
+            best_rank_w_board_info([hand[0], hand[1], hand[2], hand[3]], info)
+        } else {
+            holdem_best_rank_w_board([hand[0], hand[1]], *board)
+        }
+    }
+}
+
+/// One bit per card, rank * 4 + suit
+fn card_mask(cards: &[c_long]) -> u64 {
+    cards.iter().fold(0, |mask, card| mask | 1 << (((card >> 8) & 0xF) * 4 + ((card >> 12) & 0xF).trailing_zeros() as c_long))
+}
+
+/// Every completion of the known board from the rest of the deck when there are at most iterations of them,
+/// otherwise iterations sampled completions, runout i drawn from position i of the (seed, stream) generator
+fn runouts(known: &[c_long], iterations: u64, seed: u64, stream: u64) -> Vec<[c_long; 5]> {
+    let n_board = known.len();
+    let missing = 5 - n_board;
+    let mut remaining: Vec<c_long> = tables::DECK.iter().map(|card| *card as c_long).filter(|card| !known.contains(card)).collect();
+    let mut board = [0; 5];
+    board[..n_board].copy_from_slice(known);
+    let mut boards = Vec::new();
+    if n_runouts(remaining.len() as u64, missing as u64) <= iterations {
+        let n = remaining.len();
+        let mut index: Vec<usize> = (0..missing).collect();
+        loop {
+            for (k, i) in index.iter().enumerate() {
+                board[n_board + k] = remaining[*i];
+            }
+            boards.push(board);
+            let mut k = missing;
+            while k > 0 && index[k - 1] == n - missing + k - 1 {
+                k -= 1;
+            }
+            if k == 0 {
+                return boards;
+            }
+            index[k - 1] += 1;
+            for j in k..missing {
+                index[j] = index[j - 1] + 1;
+            }
+        }
+    }
+    let n = remaining.len() as u64;
+    let mut swaps = [0usize; 5];
+    for runout in 0..iterations {
+        let mut rng = SplitMix::at(seed, stream, runout * missing as u64);
+        for k in 0..missing {
+            let j = k + rng.below(n - k as u64) as usize;
+            remaining.swap(k, j);
+            swaps[k] = j;
+            board[n_board + k] = remaining[k];
+        }
+        boards.push(board);
+        for k in (0..missing).rev() {
+            remaining.swap(k, swaps[k]);
+        }
+    }
+    boards
+}
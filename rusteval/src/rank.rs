@@ -1,7 +1,13 @@
 extern crate libc;
 
-use self::libc::{c_long, c_int};
+use self::libc::{c_long, c_int, c_short};
 use tables;
+use product_hash::{hash1, hash2};
+
+// PRODUCT_DISPLACEMENTS, PRODUCT_KEYS and PRODUCT_HASH_RANKS, generated by build.rs
+mod product_table {
+    include!(concat!(env!("OUT_DIR"), "/product_hash_table.rs"));
+}
 
 #[no_mangle]
 pub extern fn rank(a: c_long, b: c_long, c: c_long, d: c_long, e: c_long) -> c_int {
@@ -14,8 +20,23 @@ pub extern fn rank(a: c_long, b: c_long, c: c_long, d: c_long, e: c_long) -> c_i
     if tables::UNIQUE5[distinct_index] != 0 {
         return tables::UNIQUE5[distinct_index] as c_int;
     }
-    // don't have 5 different cards, so search final table
+    // don't have 5 different cards, so look up the prime product
     let product = ((a & 0xFF) * (b & 0xFF) * (c & 0xFF) * (d & 0xFF) * (e & 0xFF)) as i32;
+    product_rank(product)
+}
+
+/// Constant time lookup of a paired hand's prime product in the perfect hash built from CARD_PRODUCTS
+pub fn product_rank(product: i32) -> c_int {
+    let key = product as u32;
+    let slot = (hash2(key) ^ product_table::PRODUCT_DISPLACEMENTS[hash1(key)] as usize) & product_table::PRODUCT_SLOT_MASK;
+    if product_table::PRODUCT_KEYS[slot] != product {
+        panic!("couldn't find {} in CARD_PRODUCTS", product);
+    }
+    product_table::PRODUCT_HASH_RANKS[slot] as c_int
+}
+
+/// Binary search over CARD_PRODUCTS, the lookup product_rank replaced. Kept for the benchmark and tests
+pub fn search_product_rank(product: i32) -> c_int {
     let mut start = 0;
     let mut end = tables::CARD_PRODUCTS.len() - 1;
     let mut guess = end / 2;
@@ -33,6 +54,82 @@ pub extern fn rank(a: c_long, b: c_long, c: c_long, d: c_long, e: c_long) -> c_i
     panic!("couldn't find {} in CARD_PRODUCTS", product);
 }
 
+/// Lengths of FLUSHES, UNIQUE5 and CARD_PRODUCTS (PRODUCT_RANKS has the same length), written into sizes
+#[no_mangle]
+pub extern fn rank_table_sizes(sizes: *mut c_int) {
+    let sizes = unsafe { ::std::slice::from_raw_parts_mut(sizes, 3) };
+    sizes.copy_from_slice(&[tables::FLUSHES.len() as c_int, tables::UNIQUE5.len() as c_int, tables::CARD_PRODUCTS.len() as c_int]);
+}
+
+/// Copies the tables rank() looks hands up in, so callers can rank with the same tables outside rust.
+/// Buffers are sized by rank_table_sizes
+#[no_mangle]
+pub extern fn rank_tables(flushes: *mut c_short, unique5: *mut c_short, products: *mut c_int, product_ranks: *mut c_short) {
+    unsafe {
+        ::std::slice::from_raw_parts_mut(flushes, tables::FLUSHES.len()).copy_from_slice(tables::FLUSHES);
+        ::std::slice::from_raw_parts_mut(unique5, tables::UNIQUE5.len()).copy_from_slice(tables::UNIQUE5);
+        ::std::slice::from_raw_parts_mut(products, tables::CARD_PRODUCTS.len()).copy_from_slice(tables::CARD_PRODUCTS);
+        ::std::slice::from_raw_parts_mut(product_ranks, tables::PRODUCT_RANKS.len()).copy_from_slice(tables::PRODUCT_RANKS);
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::time::Instant;
+
+    #[test]
+    fn product_rank_matches_search() {
+        for product in tables::CARD_PRODUCTS.iter() {
+            assert_eq!(product_rank(*product), search_product_rank(*product));
+        }
+    }
+
+    fn rank_with_search(a: c_long, b: c_long, c: c_long, d: c_long, e: c_long) -> c_int {
+        let distinct_index = ((a | b | c | d | e) >> 16) as usize;
+        if a & b & c & d & e & 0xF000 != 0 {
+            return tables::FLUSHES[distinct_index] as c_int;
+        }
+        if tables::UNIQUE5[distinct_index] != 0 {
+            return tables::UNIQUE5[distinct_index] as c_int;
+        }
+        search_product_rank(prime_lookup(a, b, c, d, e) as i32)
+    }
+
+    fn rank_all_hands<F: Fn(c_long, c_long, c_long, c_long, c_long) -> c_int>(name: &str, f: F) -> u64 {
+        let deck = tables::DECK;
+        let start = Instant::now();
+        let mut n = 0u64;
+        let mut checksum = 0u64;
+        for a in 0..48 {
+            for b in a + 1..49 {
+                for c in b + 1..50 {
+                    for d in c + 1..51 {
+                        for e in d + 1..52 {
+                            checksum += f(deck[a] as c_long, deck[b] as c_long, deck[c] as c_long, deck[d] as c_long, deck[e] as c_long) as u64;
+                            n += 1;
+                        }
+                    }
+                }
+            }
+        }
+        let elapsed = start.elapsed();
+        let seconds = elapsed.as_secs() as f64 + elapsed.subsec_nanos() as f64 * 1e-9;
+        println!("{:<14} {} hands {:.3}s {:.0} ranks/s", name, n, seconds, n as f64 / seconds);
+        checksum
+    }
+
+    /// Ranks per second over all 5 card hands, before and after the perfect hash.
+    /// cargo test --release -- --ignored --nocapture bench_rank
+    #[test]
+    #[ignore]
+    fn bench_rank() {
+        let before = rank_all_hands("binary search", rank_with_search);
+        let after = rank_all_hands("perfect hash", |a, b, c, d, e| rank(a, b, c, d, e));
+        assert_eq!(before, after);
+    }
+}
+
 pub fn flush_lookup(a: c_long, b: c_long, c: c_long, d: c_long, e: c_long) -> c_long {
     // check flush
     match a & b & c & d & e & 0xF000 {
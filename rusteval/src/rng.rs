@@ -0,0 +1,52 @@
+// Small seeded generator for the simulations.
+//
+// SplitMix64 is counter based: draw i of a stream is mix(key + i * GAMMA), with the key derived from
+// (seed, stream). Any position can be jumped to directly, so threads can each take a range of a
+// simulation and still produce exactly the numbers a single thread would.
+
+const GAMMA: u64 = 0x9E3779B97F4A7C15;
+
+fn mix(mut z: u64) -> u64 {
+    z = (z ^ (z >> 30)).wrapping_mul(0xBF58476D1CE4E5B9);
+    z = (z ^ (z >> 27)).wrapping_mul(0x94D049BB133111EB);
+    z ^ (z >> 31)
+}
+
+pub struct SplitMix {
+    state: u64,
+}
+
+impl SplitMix {
+    pub fn new(seed: u64, stream: u64) -> SplitMix {
+        SplitMix::at(seed, stream, 0)
+    }
+
+    /// Generator positioned at draw position of the (seed, stream) sequence
+    pub fn at(seed: u64, stream: u64, position: u64) -> SplitMix {
+        let key = mix(seed ^ mix(stream.wrapping_add(GAMMA)));
+        SplitMix { state: key.wrapping_add(position.wrapping_mul(GAMMA)) }
+    }
+
+    pub fn next_u64(&mut self) -> u64 {
+        self.state = self.state.wrapping_add(GAMMA);
+        mix(self.state)
+    }
+
+    /// Uniform in 0..n
+    pub fn below(&mut self, n: u64) -> u64 {
+        ((self.next_u64() >> 32) * n) >> 32
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn jump_matches_sequence() {
+        let mut rng = SplitMix::new(7, 3);
+        let draws: Vec<u64> = (0..10).map(|_| rng.next_u64()).collect();
+        assert_eq!(SplitMix::at(7, 3, 6).next_u64(), draws[6]);
+        assert!(SplitMix::new(7, 4).next_u64() != draws[0]);
+    }
+}
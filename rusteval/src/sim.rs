@@ -1,14 +1,18 @@
 extern crate libc;
 extern crate rand;
 
-use rank::rank;
-use self::libc::{c_long, c_float, c_int};
+use std::slice;
+use rank::{rank, product_rank};
+use tables;
+use rng::SplitMix;
+use self::libc::{c_long, c_float, c_int, c_ulonglong};
 use self::rand::distributions::{IndependentSample, Range};
 
 #[no_mangle]
 pub extern fn winner(hand1: *const [c_long; 4], hand2: *const [c_long; 4], board: *const [c_long; 5]) -> c_int {
-    let rank1 = unsafe { best_rank_w_board(*hand1, *board) };
-    let rank2 = unsafe { best_rank_w_board(*hand2, *board) };
+    let board = BoardInfo::new(unsafe { &*board });
+    let rank1 = unsafe { best_rank_w_board_info(*hand1, &board) };
+    let rank2 = unsafe { best_rank_w_board_info(*hand2, &board) };
     if rank1 < rank2 {
         1
     } else if rank1 > rank2 {
@@ -18,10 +22,19 @@ pub extern fn winner(hand1: *const [c_long; 4], hand2: *const [c_long; 4], board
     }
 }
 
+/// Unseeded, the generator is seeded once per call from the thread rng
 #[no_mangle]
 pub extern fn hand_vs_hand(hand1: *const [c_long; 4], hand2: *const [c_long; 4], deck: *const [c_long; 44], iterations: c_int) -> c_float {
+    let seed = Range::new(0, usize::max_value()).ind_sample(&mut rand::thread_rng()) as u64;
     let mut deck_copy = unsafe { *deck };
-    unsafe { run_hand_vs_hand(*hand1, *hand2, &mut deck_copy, iterations) }
+    unsafe { run_hand_vs_hand(*hand1, *hand2, &mut deck_copy, iterations, &mut SplitMix::new(seed, 0)) }
+}
+
+/// hand_vs_hand drawing from stream of seed, reproducible
+#[no_mangle]
+pub extern fn seeded_hand_vs_hand(hand1: *const [c_long; 4], hand2: *const [c_long; 4], deck: *const [c_long; 44], iterations: c_int, seed: c_ulonglong, stream: c_ulonglong) -> c_float {
+    let mut deck_copy = unsafe { *deck };
+    unsafe { run_hand_vs_hand(*hand1, *hand2, &mut deck_copy, iterations, &mut SplitMix::new(seed, stream)) }
 }
 
 #[no_mangle]
@@ -34,6 +47,28 @@ pub extern fn holdem_hand_with_board_rank(hand: *const [c_long; 2], board: *cons
     unsafe { holdem_best_rank_w_board(*hand, *board) }
 }
 
+/// Ranks n_hands 4 card hands (n_hands * 4 cards, row major) against one board, writing into ranks
+#[no_mangle]
+pub extern fn hands_with_board_rank(hands: *const c_long, n_hands: c_int, board: *const [c_long; 5], ranks: *mut c_int) {
+    let board = BoardInfo::new(unsafe { &*board });
+    let hands = unsafe { slice::from_raw_parts(hands as *const [c_long; 4], n_hands as usize) };
+    let ranks = unsafe { slice::from_raw_parts_mut(ranks, n_hands as usize) };
+    for (hand, rank) in hands.iter().zip(ranks.iter_mut()) {
+        *rank = best_rank_w_board_info(*hand, &board);
+    }
+}
+
+/// Ranks n_hands 2 card hands (n_hands * 2 cards, row major) against one board, writing into ranks
+#[no_mangle]
+pub extern fn holdem_hands_with_board_rank(hands: *const c_long, n_hands: c_int, board: *const [c_long; 5], ranks: *mut c_int) {
+    let board = unsafe { *board };
+    let hands = unsafe { slice::from_raw_parts(hands as *const [c_long; 2], n_hands as usize) };
+    let ranks = unsafe { slice::from_raw_parts_mut(ranks, n_hands as usize) };
+    for (hand, rank) in hands.iter().zip(ranks.iter_mut()) {
+        *rank = holdem_best_rank_w_board(*hand, board);
+    }
+}
+
 #[no_mangle]
 pub extern fn holdem_winner(hand1: *const [c_long; 2], hand2: *const [c_long; 2], board: *const [c_long; 5]) -> c_int {
     let rank1 = unsafe { holdem_best_rank_w_board(*hand1, *board) };
@@ -47,12 +82,70 @@ pub extern fn holdem_winner(hand1: *const [c_long; 2], hand2: *const [c_long; 2]
     }
 }
 
-fn run_hand_vs_hand(hand1: [c_long; 4], hand2: [c_long; 4], deck: &mut [c_long; 44], iterations: c_int) -> c_float {
+/// Ranks n 4 card hands each against its own board. hands (n,4) and boards (n,5) row major, writes into ranks
+#[no_mangle]
+pub extern fn hand_board_ranks(hands: *const c_long, boards: *const c_long, n: c_int, ranks: *mut c_int) {
+    let hands = unsafe { slice::from_raw_parts(hands as *const [c_long; 4], n as usize) };
+    let boards = unsafe { slice::from_raw_parts(boards as *const [c_long; 5], n as usize) };
+    let ranks = unsafe { slice::from_raw_parts_mut(ranks, n as usize) };
+    for ((hand, board), rank) in hands.iter().zip(boards.iter()).zip(ranks.iter_mut()) {
+        *rank = best_rank_w_board(*hand, *board);
+    }
+}
+
+/// Hold'em version of hand_board_ranks, hands (n,2)
+#[no_mangle]
+pub extern fn holdem_hand_board_ranks(hands: *const c_long, boards: *const c_long, n: c_int, ranks: *mut c_int) {
+    let hands = unsafe { slice::from_raw_parts(hands as *const [c_long; 2], n as usize) };
+    let boards = unsafe { slice::from_raw_parts(boards as *const [c_long; 5], n as usize) };
+    let ranks = unsafe { slice::from_raw_parts_mut(ranks, n as usize) };
+    for ((hand, board), rank) in hands.iter().zip(boards.iter()).zip(ranks.iter_mut()) {
+        *rank = holdem_best_rank_w_board(*hand, *board);
+    }
+}
+
+/// winner for n rows of 4 card hands1, hands2 (n,4) and boards (n,5), writes 1, -1 or 0 into results
+#[no_mangle]
+pub extern fn winners(hands1: *const c_long, hands2: *const c_long, boards: *const c_long, n: c_int, results: *mut c_int) {
+    let hands1 = unsafe { slice::from_raw_parts(hands1 as *const [c_long; 4], n as usize) };
+    let hands2 = unsafe { slice::from_raw_parts(hands2 as *const [c_long; 4], n as usize) };
+    let boards = unsafe { slice::from_raw_parts(boards as *const [c_long; 5], n as usize) };
+    let results = unsafe { slice::from_raw_parts_mut(results, n as usize) };
+    for i in 0..n as usize {
+        let board = BoardInfo::new(&boards[i]);
+        results[i] = compare_ranks(best_rank_w_board_info(hands1[i], &board), best_rank_w_board_info(hands2[i], &board));
+    }
+}
+
+/// Hold'em version of winners, hands (n,2)
+#[no_mangle]
+pub extern fn holdem_winners(hands1: *const c_long, hands2: *const c_long, boards: *const c_long, n: c_int, results: *mut c_int) {
+    let hands1 = unsafe { slice::from_raw_parts(hands1 as *const [c_long; 2], n as usize) };
+    let hands2 = unsafe { slice::from_raw_parts(hands2 as *const [c_long; 2], n as usize) };
+    let boards = unsafe { slice::from_raw_parts(boards as *const [c_long; 5], n as usize) };
+    let results = unsafe { slice::from_raw_parts_mut(results, n as usize) };
+    for i in 0..n as usize {
+        results[i] = compare_ranks(holdem_best_rank_w_board(hands1[i], boards[i]), holdem_best_rank_w_board(hands2[i], boards[i]));
+    }
+}
+
+fn compare_ranks(rank1: i32, rank2: i32) -> c_int {
+    if rank1 < rank2 {
+        1
+    } else if rank1 > rank2 {
+        -1
+    } else {
+        0
+    }
+}
+
+fn run_hand_vs_hand(hand1: [c_long; 4], hand2: [c_long; 4], deck: &mut [c_long; 44], iterations: c_int, rng: &mut SplitMix) -> c_float {
     let mut wins = 0;
     for _ in 0..iterations {
-        shuffle_5(deck);
-        let rank1 = best_rank(hand1, deck);
-        let rank2 = best_rank(hand2, deck);
+        shuffle_5(deck, rng);
+        let board = BoardInfo::new(&deck[..5]);
+        let rank1 = best_rank_w_board_info(hand1, &board);
+        let rank2 = best_rank_w_board_info(hand2, &board);
         if rank1 < rank2 {
             wins += 1;
         }
@@ -60,7 +153,7 @@ fn run_hand_vs_hand(hand1: [c_long; 4], hand2: [c_long; 4], deck: &mut [c_long;
     wins as c_float / iterations as c_float
 }
 
-fn holdem_best_rank_w_board(hand: [c_long; 2], board: [c_long; 5]) -> i32 {
+pub fn holdem_best_rank_w_board(hand: [c_long; 2], board: [c_long; 5]) -> i32 {
     let mut cur_rank: i32 = 0xFFFF;
     for bi in 0..10 {
         let bc = [(0,1,2),(0,1,3),(0,1,4),(0,2,3),(0,2,4),(0,3,4),(1,2,3),(1,2,4),(1,3,4),(2,3,4)][bi];
@@ -85,28 +178,55 @@ fn holdem_best_rank_w_board(hand: [c_long; 2], board: [c_long; 5]) -> i32 {
     cur_rank
 }
 
-fn best_rank_w_board(hand: [c_long; 4], board: [c_long; 5]) -> i32 {
-    let mut cur_rank: i32 = 0xFFFF;
-    for hi in 0..6 {
-        let hc = [(0,1),(0,2),(0,3),(1,2),(1,3),(2,3)][hi];
-        for bi in 0..10 {
-            let bc = [(0,1,2),(0,1,3),(0,1,4),(0,2,3),(0,2,4),(0,3,4),(1,2,3),(1,2,4),(1,3,4),(2,3,4)][bi];
-            let new_rank = rank(hand[hc.0], hand[hc.1], board[bc.0], board[bc.1], board[bc.2]);
-            if new_rank < cur_rank {
-                cur_rank = new_rank;
-            }
+pub const HAND_COMBOS: [(usize, usize); 6] = [(0,1),(0,2),(0,3),(1,2),(1,3),(2,3)];
+pub const BOARD_COMBOS: [(usize, usize, usize); 10] = [(0,1,2),(0,1,3),(0,1,4),(0,2,3),(0,2,4),(0,3,4),(1,2,3),(1,2,4),(1,3,4),(2,3,4)];
+
+/// Board side of the Omaha evaluation. Rank bits, prime product and common suit bits of the 10 three card
+/// board combinations, computed once per board and shared by every hand ranked against it.
+pub struct BoardInfo {
+    bits: [c_long; 10],
+    products: [c_long; 10],
+    suits: [c_long; 10],
+    flush_possible: bool,
+}
+
+impl BoardInfo {
+    pub fn new(board: &[c_long]) -> BoardInfo {
+        let mut info = BoardInfo { bits: [0; 10], products: [0; 10], suits: [0; 10], flush_possible: false };
+        for (bi, bc) in BOARD_COMBOS.iter().enumerate() {
+            let (c, d, e) = (board[bc.0], board[bc.1], board[bc.2]);
+            info.bits[bi] = (c | d | e) >> 16;
+            info.products[bi] = (c & 0xFF) * (d & 0xFF) * (e & 0xFF);
+            info.suits[bi] = c & d & e & 0xF000;
         }
+        // a flush needs three board cards of one suit
+        info.flush_possible = info.suits.iter().any(|suits| *suits != 0);
+        info
     }
-    cur_rank
 }
 
-fn best_rank(hand: [c_long; 4], deck: &mut [c_long; 44]) -> i32 {
+fn best_rank_w_board(hand: [c_long; 4], board: [c_long; 5]) -> i32 {
+    best_rank_w_board_info(hand, &BoardInfo::new(&board))
+}
+
+/// Same result as ranking all 60 hand/board combinations with rank(), with the board work done up front
+/// and the flush check skipped when the board can't make one
+pub fn best_rank_w_board_info(hand: [c_long; 4], board: &BoardInfo) -> i32 {
     let mut cur_rank: i32 = 0xFFFF;
-    for hi in 0..6 {
-        let hc = [(0,1),(0,2),(0,3),(1,2),(1,3),(2,3)][hi];
+    for hc in HAND_COMBOS.iter() {
+        let (a, b) = (hand[hc.0], hand[hc.1]);
+        let hand_bits = (a | b) >> 16;
+        let hand_product = (a & 0xFF) * (b & 0xFF);
+        let hand_suits = if board.flush_possible { a & b & 0xF000 } else { 0 };
         for bi in 0..10 {
-            let bc = [(0,1,2),(0,1,3),(0,1,4),(0,2,3),(0,2,4),(0,3,4),(1,2,3),(1,2,4),(1,3,4),(2,3,4)][bi];
-            let new_rank = rank(hand[hc.0], hand[hc.1], deck[bc.0], deck[bc.1], deck[bc.2]);
+            let distinct_index = (hand_bits | board.bits[bi]) as usize;
+            let new_rank = if hand_suits & board.suits[bi] != 0 {
+                tables::FLUSHES[distinct_index] as i32
+            } else if tables::UNIQUE5[distinct_index] != 0 {
+                tables::UNIQUE5[distinct_index] as i32
+            } else {
+                product_rank((hand_product * board.products[bi]) as i32)
+            };
             if new_rank < cur_rank {
                 cur_rank = new_rank;
             }
@@ -115,14 +235,81 @@ fn best_rank(hand: [c_long; 4], deck: &mut [c_long; 44]) -> i32 {
     cur_rank
 }
 
-fn shuffle_5(deck: &mut [c_long; 44]) {
-    let mut rng = rand::thread_rng();
+fn shuffle_5(deck: &mut [c_long; 44], rng: &mut SplitMix) {
     let mut x: c_long;
 
     for start in 0..5 {
-        let i = Range::new(start, 44).ind_sample(&mut rng);
+        let i = start + rng.below((44 - start) as u64) as usize;
         x = deck[start];
         deck[start] = deck[i];
         deck[i] = x;
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::time::Instant;
+
+    /// All 60 combinations through rank(), the evaluation best_rank_w_board_info replaced
+    fn best_rank_w_board_combos(hand: [c_long; 4], board: [c_long; 5]) -> i32 {
+        let mut cur_rank: i32 = 0xFFFF;
+        for hc in HAND_COMBOS.iter() {
+            for bc in BOARD_COMBOS.iter() {
+                let new_rank = rank(hand[hc.0], hand[hc.1], board[bc.0], board[bc.1], board[bc.2]);
+                if new_rank < cur_rank {
+                    cur_rank = new_rank;
+                }
+            }
+        }
+        cur_rank
+    }
+
+    /// n random (hand, board) showdowns drawn without replacement from the deck with a xorshift generator
+    fn random_showdowns(n: usize) -> Vec<([c_long; 4], [c_long; 5])> {
+        let mut state: u64 = 0x2545F4914F6CDD1D;
+        let mut showdowns = Vec::with_capacity(n);
+        for _ in 0..n {
+            let mut deck: Vec<c_long> = tables::DECK.iter().map(|card| *card as c_long).collect();
+            for i in 0..9 {
+                state ^= state << 13;
+                state ^= state >> 7;
+                state ^= state << 17;
+                let j = i + (state % (52 - i as u64)) as usize;
+                deck.swap(i, j);
+            }
+            showdowns.push(([deck[0], deck[1], deck[2], deck[3]], [deck[4], deck[5], deck[6], deck[7], deck[8]]));
+        }
+        showdowns
+    }
+
+    #[test]
+    fn best_rank_matches_combos() {
+        for (hand, board) in random_showdowns(20000) {
+            assert_eq!(best_rank_w_board(hand, board), best_rank_w_board_combos(hand, board));
+        }
+    }
+
+    fn rank_showdowns<F: Fn([c_long; 4], [c_long; 5]) -> i32>(name: &str, showdowns: &[([c_long; 4], [c_long; 5])], f: F) -> i64 {
+        let start = Instant::now();
+        let mut checksum = 0i64;
+        for &(hand, board) in showdowns.iter() {
+            checksum += f(hand, board) as i64;
+        }
+        let elapsed = start.elapsed();
+        let seconds = elapsed.as_secs() as f64 + elapsed.subsec_nanos() as f64 * 1e-9;
+        println!("{:<14} {} showdowns {:.3}s {:.0} hands/s", name, showdowns.len(), seconds, showdowns.len() as f64 / seconds);
+        checksum
+    }
+
+    /// Random Omaha showdowns per second, all 60 combinations through rank() against the board aware path.
+    /// cargo test --release -- --ignored --nocapture bench_best_rank
+    #[test]
+    #[ignore]
+    fn bench_best_rank() {
+        let showdowns = random_showdowns(1000000);
+        let before = rank_showdowns("rank combos", &showdowns, best_rank_w_board_combos);
+        let after = rank_showdowns("board aware", &showdowns, best_rank_w_board);
+        assert_eq!(before, after);
+    }
+}